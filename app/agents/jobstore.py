@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,   -- sha256 of the brief bytes
+    brief_name    TEXT NOT NULL,
+    body          TEXT NOT NULL,      -- the exact brief content this job runs
+    state         TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    error         TEXT,
+    campaign_id   TEXT,
+    variants      INTEGER,
+    priority      INTEGER NOT NULL DEFAULT 0,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    started_at    REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+"""
+# Columns added after the first release; older databases get them on open
+_MIGRATIONS = {
+    "priority": "ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+    "started_at": "ALTER TABLE jobs ADD COLUMN started_at REAL",
+}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class Job:
+    id: str
+    brief_name: str
+    body: str
+    state: str
+    attempts: int
+    lease_owner: Optional[str]
+    campaign_id: Optional[str] = None
+    priority: int = 0
+    created_at: float = 0.0
+
+
+class JobStore:
+    """Durable brief queue in SQLite (WAL), keyed by brief content hash.
+
+    Enqueueing the same bytes twice is a no-op, so restarts and re-saves never pay
+    for a brief twice, while an edited brief (new hash) becomes a new job. Workers
+    ``claim`` a job under a lease they keep alive with ``heartbeat``; a job whose
+    lease runs out (crashed worker) is claimable again until ``max_attempts``.
+    """
+
+    def __init__(self, path: Path, lease_s: float = 60.0, max_attempts: int = 3) -> None:
+        self.path = Path(path)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            have = {r["name"] for r in db.execute("PRAGMA table_info(jobs)")}
+            for col, ddl in _MIGRATIONS.items():
+                if col not in have:
+                    db.execute(ddl)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # Short-lived connections: safe from any thread (heartbeats run on their own)
+        db = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    def enqueue(self, brief_path: Path, campaign_id: Optional[str] = None, priority: int = 0) -> Optional[str]:
+        """Queue the brief's current content; returns the job id, or None if already known."""
+        data = Path(brief_path).read_bytes()
+        job_id = content_hash(data)
+        now = time.time()
+        with self._conn() as db:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO jobs"
+                " (id, brief_name, body, state, max_attempts, campaign_id, priority, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    Path(brief_path).name,
+                    data.decode("utf-8"),
+                    QUEUED,
+                    self.max_attempts,
+                    campaign_id,
+                    priority,
+                    now,
+                    now,
+                ),
+            )
+            return job_id if cur.rowcount else None
+
+    def claim(self, owner: str, max_per_campaign: int = 0) -> Optional[Job]:
+        """Take the most urgent queued job (or one whose lease expired) for ``owner``.
+
+        Higher ``priority`` first, then oldest. With ``max_per_campaign`` set, campaigns
+        that already have that many live jobs are skipped.
+        """
+        now = time.time()
+        with self._conn() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # A worker that died on the last attempt leaves a lease nobody may retry
+                db.execute(
+                    "UPDATE jobs SET state = ?, lease_owner = NULL, error = 'lease expired on final attempt',"
+                    " updated_at = ? WHERE state = ? AND lease_expires < ? AND attempts >= max_attempts",
+                    (FAILED, now, RUNNING, now),
+                )
+                cap, args = "", [QUEUED, RUNNING, now]
+                if max_per_campaign > 0:
+                    cap = (
+                        " AND COALESCE(campaign_id, '') NOT IN (SELECT COALESCE(campaign_id, '') FROM jobs"
+                        " WHERE state = ? AND lease_expires >= ? GROUP BY campaign_id HAVING COUNT(*) >= ?)"
+                    )
+                    args += [RUNNING, now, max_per_campaign]
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE attempts < max_attempts AND"
+                    " (state = ? OR (state = ? AND lease_expires < ?))" + cap +
+                    " ORDER BY priority DESC, created_at LIMIT 1",
+                    args,
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?,"
+                    " updated_at = ?, started_at = ? WHERE id = ?",
+                    (RUNNING, owner, now + self.lease_s, now, now, row["id"]),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return Job(
+            row["id"],
+            row["brief_name"],
+            row["body"],
+            RUNNING,
+            row["attempts"] + 1,
+            owner,
+            campaign_id=row["campaign_id"],
+            priority=row["priority"],
+            created_at=row["created_at"],
+        )
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        with self._conn() as db:
+            cur = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND state = ?",
+                (time.time() + self.lease_s, time.time(), job_id, owner, RUNNING),
+            )
+            return bool(cur.rowcount)
+
+    @contextmanager
+    def leased(self, job: Job) -> Iterator[None]:
+        """Keep ``job``'s lease alive on a background thread while the body runs."""
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.lease_s / 3):
+                self.heartbeat(job.id, job.lease_owner or "")
+
+        t = threading.Thread(target=beat, name=f"lease-{job.id[:8]}", daemon=True)
+        t.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            t.join()
+
+    def complete(self, job_id: str, owner: str, campaign_id: str, variants: int) -> None:
+        with self._conn() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, error = NULL,"
+                " campaign_id = ?, variants = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (DONE, campaign_id, variants, time.time(), job_id, owner),
+            )
+
+    def fail(self, job_id: str, owner: str, error: str) -> str:
+        """Record a failed attempt; the job goes back to the queue until attempts run out."""
+        with self._conn() as db:
+            db.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+                " lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (FAILED, QUEUED, error[:2000], time.time(), job_id, owner),
+            )
+            row = db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["state"] if row else FAILED
+
+    def release_dead_owners(self) -> int:
+        """Requeue jobs held by processes on this host that no longer exist (after a crash)."""
+        host = socket.gethostname()
+        released = 0
+        with self._conn() as db:
+            rows = db.execute("SELECT id, lease_owner FROM jobs WHERE state = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                owner_host, _, pid = (row["lease_owner"] or "").rpartition(":")
+                if owner_host != host or not pid.isdigit() or _pid_alive(int(pid)):
+                    continue
+                db.execute(
+                    "UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                    " WHERE id = ? AND lease_owner = ?",
+                    (QUEUED, time.time(), row["id"], row["lease_owner"]),
+                )
+                released += 1
+        return released
+
+    def counts(self) -> Dict[str, int]:
+        with self._conn() as db:
+            rows = db.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        out = {s: 0 for s in (QUEUED, RUNNING, DONE, FAILED)}
+        out.update({r["state"]: r["n"] for r in rows})
+        return out
+
+    def jobs(self, state: Optional[str] = None) -> List[Dict[str, object]]:
+        query = "SELECT id, brief_name, state, attempts, lease_owner, error, campaign_id, priority, variants FROM jobs"
+        args: tuple = ()
+        if state:
+            query, args = query + " WHERE state = ?", (state,)
+        with self._conn() as db:
+            return [dict(r) for r in db.execute(query + " ORDER BY created_at", args).fetchall()]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.agents.jobstore import _pid_alive, default_owner
+
+
+@dataclass
+class Lease:
+    unit: str
+    owner: str
+    attempt: int
+    lost: bool = False  # set when a heartbeat finds someone else holds the unit now
+
+
+class LeaseDir:
+    """Work-unit leases as plain files on a shared (NFS) directory; no other service needed.
+
+    SQLite locking is not trustworthy over NFS, so each unit is claimed by hard-linking a
+    freshly written file to ``<unit>.lease``: ``link(2)`` is atomic on NFS and fails for
+    everyone but one worker. The holder keeps the lease alive by touching it. Clocks on
+    different hosts never get compared: a lease counts as expired once this process has
+    watched its mtime stand still for ``lease_s``. Expired leases are reclaimed by renaming
+    them aside (also atomic, so exactly one reclaimer wins) and claiming again.
+
+    Outcomes are files too: ``<unit>.done`` (result JSON), ``<unit>.fail-<n>`` per failed
+    attempt and ``<unit>.stale-*`` per reclaimed lease; a unit is given up on once those
+    add up to ``max_attempts``.
+    """
+
+    def __init__(self, root: Path, lease_s: float = 60.0, max_attempts: int = 3, owner: Optional[str] = None) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.owner = owner or default_owner()
+        # unit -> (lease mtime_ns, monotonic time we first saw that mtime)
+        self._observed: Dict[str, Tuple[int, float]] = {}
+
+    def _path(self, unit: str, suffix: str) -> Path:
+        return self.root / f"{unit}.{suffix}"
+
+    def is_done(self, unit: str) -> bool:
+        return self._path(unit, "done").exists()
+
+    def result(self, unit: str) -> Optional[Dict]:
+        try:
+            return json.loads(self._path(unit, "done").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def attempts(self, unit: str) -> int:
+        return sum(1 for _ in self.root.glob(f"{unit}.fail-*")) + sum(1 for _ in self.root.glob(f"{unit}.stale-*"))
+
+    def is_failed(self, unit: str) -> bool:
+        return not self.is_done(unit) and self.attempts(unit) >= self.max_attempts
+
+    def holder(self, unit: str) -> Optional[str]:
+        try:
+            return json.loads(self._path(unit, "lease").read_text(encoding="utf-8")).get("owner")
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path: Path, data: Dict) -> None:
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _expired(self, unit: str, lease: Path) -> bool:
+        try:
+            mtime = lease.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._observed.pop(unit, None)
+            return False
+        # A dead process on this host cannot heartbeat; no need to wait out the lease
+        host, _, pid = (self.holder(unit) or "").rpartition(":")
+        if host == socket.gethostname() and pid.isdigit() and not _pid_alive(int(pid)):
+            return True
+        now = time.monotonic()
+        seen = self._observed.get(unit)
+        if seen is None or seen[0] != mtime:
+            self._observed[unit] = (mtime, now)
+            return False
+        return now - seen[1] >= self.lease_s
+
+    def claim(self, unit: str) -> Optional[Lease]:
+        """Try to take ``unit``; None if it is done, given up on, or leased by a live worker."""
+        if self.is_done(unit):
+            return None
+        attempt = self.attempts(unit) + 1
+        if attempt > self.max_attempts:
+            return None
+        lease = self._path(unit, "lease")
+        tmp = self.root / f".{unit}.{uuid.uuid4().hex}"
+        try:
+            if not self._link(tmp, lease, attempt):
+                if not self._expired(unit, lease) or not self._reclaim(unit, lease):
+                    return None
+                attempt = self.attempts(unit) + 1  # the reclaimed lease counts as an attempt
+                if attempt > self.max_attempts or not self._link(tmp, lease, attempt):
+                    return None
+        finally:
+            tmp.unlink(missing_ok=True)
+        if self.is_done(unit):  # finished by someone else between our check and the link
+            self._release(unit)
+            return None
+        return Lease(unit=unit, owner=self.owner, attempt=attempt)
+
+    def _link(self, tmp: Path, lease: Path, attempt: int) -> bool:
+        tmp.write_text(json.dumps({"owner": self.owner, "attempt": attempt, "claimed_at": time.time()}))
+        try:
+            os.link(tmp, lease)
+        except FileExistsError:
+            # NFS may lose the reply to a link that did succeed: the link count tells
+            return tmp.stat().st_nlink == 2
+        return True
+
+    def _reclaim(self, unit: str, lease: Path) -> bool:
+        try:
+            os.rename(lease, self._path(unit, f"stale-{uuid.uuid4().hex[:12]}"))
+        except FileNotFoundError:
+            return False  # another worker reclaimed (or the holder released) first
+        self._observed.pop(unit, None)
+        return True
+
+    def heartbeat(self, lease: Lease) -> bool:
+        # Touching a lease that changed hands in between only extends the new holder's lease
+        if self.holder(lease.unit) != lease.owner:
+            lease.lost = True
+            return False
+        try:
+            os.utime(self._path(lease.unit, "lease"))
+        except FileNotFoundError:
+            lease.lost = True
+            return False
+        return True
+
+    @contextmanager
+    def held(self, lease: Lease) -> Iterator[Lease]:
+        """Heartbeat ``lease`` on a background thread while the body runs."""
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.lease_s / 3):
+                self.heartbeat(lease)
+
+        t = threading.Thread(target=beat, name=f"lease-{lease.unit[:12]}", daemon=True)
+        t.start()
+        try:
+            yield lease
+        finally:
+            stop.set()
+            t.join()
+
+    def _release(self, unit: str) -> None:
+        if self.holder(unit) == self.owner:
+            self._path(unit, "lease").unlink(missing_ok=True)
+
+    def complete(self, lease: Lease, result: Dict) -> None:
+        self._write_atomic(self._path(lease.unit, "done"), {**result, "owner": lease.owner, "attempt": lease.attempt})
+        self._release(lease.unit)
+
+    def fail(self, lease: Lease, error: str) -> None:
+        self._write_atomic(
+            self._path(lease.unit, f"fail-{lease.attempt}-{uuid.uuid4().hex[:8]}"),
+            {"owner": lease.owner, "error": error[:2000]},
+        )
+        self._release(lease.unit)
+
+    def leases(self) -> List[Dict[str, object]]:
+        out = []
+        for p in sorted(self.root.glob("*.lease")):
+            try:
+                data = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            out.append({"unit": p.name[: -len(".lease")], **data})
+        return out
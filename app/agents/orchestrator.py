@@ -1,12 +1,20 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Optional, Tuple
 
-from app.pipeline.ingest import load_brief_and_rules
+from app.agents.jobstore import Job, JobStore, default_owner
+from app.agents.scheduler import DecisionLog, FairShare, FairShareProvider, brief_priority
+from app.agents.watcher import Signature, signature, watch_briefs
+from app.models import Brief
+from app.pipeline.ingest import load_brand_rules
+from app.pipeline.adapters.base import BaseProvider
+from app.pipeline.breaker import breaker_states
 from app.pipeline.generator import select_provider
 from app.pipeline.compositor import compose_variants
 from app.pipeline.report import RunContext, RunReporter
@@ -15,58 +23,189 @@ from app.pipeline.report import RunContext, RunReporter
 @dataclass
 class OrchestratorConfig:
     briefs_dir: Path = Path("briefs")
-    poll_seconds: int = 15
+    poll_seconds: int = 15  # max wait for a brief event before the status heartbeat
+    debounce_seconds: float = 0.25
     output_dir: Path = Path("outputs")
+    workers: int = 1
+    master_render: bool = False
+    concurrency: int | None = None
+    runs_dir: Path = Path("runs")  # status.json and the jobs.db queue live here
+    lease_seconds: float = 60.0
+    max_attempts: int = 3
+    brief_workers: int = 1  # briefs running at the same time
+    max_per_campaign: int = 1  # of those, at most this many from one campaign (0 = no cap)
 
 
 class Orchestrator:
     def __init__(self, cfg: OrchestratorConfig) -> None:
         self.cfg = cfg
-        self._seen: set[str] = set()
+        # brief name -> (mtime_ns, size) when last enqueued; saves re-hashing unchanged files.
+        # Which content has actually run lives in the job store, so it survives restarts.
+        self._seen: Dict[str, Signature] = {}
+        self.jobs = JobStore(cfg.runs_dir / "jobs.db", lease_s=cfg.lease_seconds, max_attempts=cfg.max_attempts)
+        self.owner = default_owner()
+        self._status: Optional[Dict[str, Dict]] = None
+        # One provider (and its pooled HTTP client) for every brief this process handles;
+        # concurrent briefs split its request slots through a FairShare
+        self._provider: BaseProvider | None = None
+        self._share: Optional[FairShare] = None
+        self._provider_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._running: Dict[Future, Job] = {}
+        self.decisions = DecisionLog()
+
+    def _get_provider(self, rules: Dict) -> BaseProvider:
+        with self._provider_lock:
+            if self._provider is None:
+                self._provider = select_provider("auto", rules=rules)
+                self._share = FairShare(self.cfg.concurrency or self._provider.max_concurrency)
+            return self._provider
+
+    def _campaign_provider(self, rules: Dict, campaign_id: str) -> BaseProvider:
+        provider = self._get_provider(rules)
+        assert self._share is not None
+        return FairShareProvider(provider, self._share, campaign_id)
+
+    def close(self) -> None:
+        self._drain()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._provider is not None:
+            self._provider.close()
+            self._provider = None
 
     def _status_path(self) -> Path:
-        return Path("runs") / "status.json"
+        return self.cfg.runs_dir / "status.json"
 
     def _write_status(self, data: Dict) -> None:
         p = self._status_path()
         p.parent.mkdir(parents=True, exist_ok=True)
         p.write_text(json.dumps(data, indent=2))
 
-    def run_once(self) -> None:
-        briefs = sorted(self.cfg.briefs_dir.glob("*.json"))
-        status: Dict[str, Dict] = json.loads(self._status_path().read_text()) if self._status_path().exists() else {}
-        for b in briefs:
-            if b.name in self._seen:
+    def _load_status(self) -> Dict[str, Dict]:
+        # Read once; after that this process is the one writing it
+        if self._status is None:
+            p = self._status_path()
+            self._status = json.loads(p.read_text()) if p.exists() else {}
+        return self._status
+
+    def _enqueue(self, briefs: Iterable[Path]) -> None:
+        for b in sorted(briefs):
+            sig = signature(b)
+            if sig is None or self._seen.get(b.name) == sig:
                 continue
-            brief, rules = load_brief_and_rules(b)
-            provider = select_provider("auto")
-            reporter = RunReporter(RunContext(run_id=str(int(time.time())), provider=provider.name))
-            compose_variants(
-                brief,
-                rules,
-                provider,
-                brief.aspect_ratios,
-                brief.locales,
-                self.cfg.output_dir,
-                reporter,
-                max_variants=1,
-                seed=1234,
+            try:
+                body = json.loads(b.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                body = {}  # still queued: the job fails visibly instead of vanishing
+            if not isinstance(body, dict):
+                body = {}
+            self.jobs.enqueue(b, campaign_id=body.get("campaign_id"), priority=brief_priority(b, body))
+            self._seen[b.name] = sig
+
+    def _execute(self, job: Job) -> Tuple[str, Dict]:
+        with self.jobs.leased(job):
+            return self._run_job(job)
+
+    def _reap(self, status: Dict[str, Dict]) -> None:
+        for fut in [f for f in self._running if f.done()]:
+            job = self._running.pop(fut)
+            try:
+                campaign_id, entry = fut.result()
+                status[campaign_id] = entry
+            except Exception as exc:  # keep the loop alive; the job store decides on retries
+                self.jobs.fail(job.id, self.owner, f"{type(exc).__name__}: {exc}")
+
+    def _pump(self, briefs: Optional[Iterable[Path]] = None) -> None:
+        """Queue new or changed ``briefs``, collect finished jobs and start queued ones on
+        free brief workers: highest priority first, skipping campaigns at their cap."""
+        if briefs is not None:
+            self._enqueue(briefs)
+        status = self._load_status()
+        self._reap(status)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=max(1, self.cfg.brief_workers), thread_name_prefix="brief")
+        while len(self._running) < max(1, self.cfg.brief_workers):
+            job = self.jobs.claim(self.owner, max_per_campaign=self.cfg.max_per_campaign)
+            if job is None:
+                break
+            self.decisions.record(
+                job=job.id[:12],
+                brief=job.brief_name,
+                campaign=job.campaign_id,
+                priority=job.priority,
+                attempt=job.attempts,
+                running=len(self._running),
+                queue_wait_s=round(max(0.0, time.time() - job.created_at), 3),
             )
-            reporter.finalize(self.cfg.output_dir)
-            status[brief.campaign_id] = {
-                "provider": provider.name,
-                "variants": reporter._report.totals.get("variants", 0),
-            }
-            self._seen.add(b.name)
+            self._running[self._pool.submit(self._execute, job)] = job
+        # Circuit state per provider, so a tripped Firefly/OpenAI is visible without logs
+        status["providers"] = breaker_states()
+        status["queue"] = self.jobs.counts()
+        status["scheduler"] = {
+            "brief_workers": self.cfg.brief_workers,
+            "max_per_campaign": self.cfg.max_per_campaign,
+            "running": [{"brief": j.brief_name, "campaign": j.campaign_id} for j in self._running.values()],
+            "decisions": self.decisions.snapshot(),
+            "provider_share": self._share.snapshot() if self._share else {},
+        }
         self._write_status(status)
 
-    def start(self, max_iterations: int | None = None) -> None:
-        i = 0
-        while True:
-            self.run_once()
-            i += 1
-            if max_iterations is not None and i >= max_iterations:
-                break
-            time.sleep(self.cfg.poll_seconds)
+    def _drain(self) -> None:
+        while self._running:
+            wait(list(self._running), return_when=FIRST_COMPLETED)
+            self._pump()
+
+    def run_once(self, briefs: Optional[Iterable[Path]] = None) -> None:
+        """Queue ``briefs`` (default: every brief in the folder) that are new or changed,
+        then run queued jobs until the queue is empty."""
+        self._pump(self.cfg.briefs_dir.glob("*.json") if briefs is None else briefs)
+        self._drain()
 
+    def _run_job(self, job: Job) -> Tuple[str, Dict]:
+        # Run the exact bytes that were hashed, even if the file changed since
+        brief = Brief(**json.loads(job.body))
+        rules = load_brand_rules()
+        provider = self._campaign_provider(rules, brief.campaign_id)
+        # Job id in the run id: briefs finishing in the same second must not share a report
+        run_id = f"{int(time.time())}-{job.id[:8]}"
+        reporter = RunReporter(RunContext(run_id=run_id, provider=provider.name))
+        compose_variants(
+            brief,
+            rules,
+            provider,
+            brief.aspect_ratios,
+            brief.locales,
+            self.cfg.output_dir,
+            reporter,
+            max_variants=1,
+            seed=1234,
+            workers=self.cfg.workers,
+            master_render=self.cfg.master_render,
+            concurrency=self.cfg.concurrency,
+        )
+        reporter.finalize(self.cfg.output_dir)
+        variants = reporter._report.totals.get("variants", 0)
+        self.jobs.complete(job.id, self.owner, brief.campaign_id, variants)
+        return brief.campaign_id, {"provider": provider.name, "variants": variants, "job": job.id[:12]}
 
+    def start(self, max_iterations: int | None = None) -> None:
+        # Watch before the first pass so a brief dropped in meanwhile is not missed
+        watcher = watch_briefs(self.cfg.briefs_dir, debounce_s=self.cfg.debounce_seconds)
+        # Jobs a crashed predecessor on this host was holding go straight back to the queue
+        self.jobs.release_dead_owners()
+        try:
+            self._pump(self.cfg.briefs_dir.glob("*.json"))
+            i = 1
+            while max_iterations is None or i < max_iterations:
+                # Wakes as soon as a brief settles; poll_seconds only bounds the heartbeat.
+                # While briefs run, check back often so finished workers pick up new work.
+                busy = bool(self._running)
+                self._pump(watcher.wait(timeout=0.25 if busy else self.cfg.poll_seconds))
+                if not busy:
+                    i += 1
+            self._drain()
+        finally:
+            watcher.close()
+            self.close()
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.pipeline.adapters.base import BaseProvider, GenerateResult
+
+
+def brief_priority(brief_path: Path, body: Dict[str, Any]) -> int:
+    """``priority`` from a ``<brief>.meta`` JSON sidecar if present, else from the brief."""
+    sidecar = Path(str(brief_path) + ".meta")
+    if sidecar.exists():
+        try:
+            meta = json.loads(sidecar.read_text(encoding="utf-8"))
+            if "priority" in meta:
+                return int(meta["priority"])
+        except (ValueError, TypeError):
+            pass
+    try:
+        return int(body.get("priority") or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+class FairShare:
+    """Max-min fair split of provider request slots between campaigns.
+
+    Whenever a slot frees up it goes to the waiting campaign with the fewest requests
+    in flight, so a 2,000-variant campaign cannot starve a small one, yet a campaign
+    running alone still gets every slot. Waiters may sit on any thread or event loop.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self.slots = max(1, slots)
+        self.in_use = 0
+        self.in_flight: Dict[str, int] = {}
+        self.waited_s: Dict[str, float] = {}
+        self._waiters: Dict[str, Deque[Callable[[], bool]]] = {}
+        self._lock = threading.Lock()
+
+    def _grant_locked(self, tenant: str) -> None:
+        self.in_use += 1
+        self.in_flight[tenant] = self.in_flight.get(tenant, 0) + 1
+
+    def _dispatch_locked(self) -> None:
+        while self.in_use < self.slots:
+            waiting = [t for t, q in self._waiters.items() if q]
+            if not waiting:
+                return
+            tenant = min(waiting, key=lambda t: self.in_flight.get(t, 0))
+            wake = self._waiters[tenant].popleft()
+            self._grant_locked(tenant)
+            if not wake():
+                # Waiter gave up (cancelled) before it could be woken
+                self.in_use -= 1
+                self.in_flight[tenant] -= 1
+
+    def _try_now_locked(self, tenant: str) -> bool:
+        if self.in_use < self.slots and not any(self._waiters.values()):
+            self._grant_locked(tenant)
+            return True
+        return False
+
+    async def aacquire(self, tenant: str) -> None:
+        loop = asyncio.get_running_loop()
+        fut: "asyncio.Future[None]" = loop.create_future()
+        t0 = time.monotonic()
+
+        def wake() -> bool:
+            if fut.done():
+                return False
+            loop.call_soon_threadsafe(_resolve, fut, self, tenant)
+            return True
+
+        with self._lock:
+            if self._try_now_locked(tenant):
+                return
+            self._waiters.setdefault(tenant, deque()).append(wake)
+        try:
+            await fut
+        except BaseException:
+            if not self._withdraw(tenant, wake):
+                if fut.done() and not fut.cancelled():
+                    self.release(tenant)  # granted, but the caller is gone
+                else:
+                    fut.cancel()  # wake is on its way; _resolve hands the slot back
+            raise
+        with self._lock:
+            self.waited_s[tenant] = self.waited_s.get(tenant, 0.0) + time.monotonic() - t0
+
+    def acquire(self, tenant: str) -> None:
+        ev = threading.Event()
+        t0 = time.monotonic()
+
+        def wake() -> bool:
+            ev.set()
+            return True
+
+        with self._lock:
+            if self._try_now_locked(tenant):
+                return
+            self._waiters.setdefault(tenant, deque()).append(wake)
+        try:
+            ev.wait()
+        except BaseException:
+            if not self._withdraw(tenant, wake):
+                self.release(tenant)  # granted while we were being interrupted: pass it on
+            raise
+        with self._lock:
+            self.waited_s[tenant] = self.waited_s.get(tenant, 0.0) + time.monotonic() - t0
+
+    def _withdraw(self, tenant: str, wake: Callable[[], bool]) -> bool:
+        # Drop a waiter that gave up; False if it was already handed a slot
+        with self._lock:
+            queue = self._waiters.get(tenant)
+            if queue is not None and wake in queue:
+                queue.remove(wake)
+                return True
+            return False
+
+    def release(self, tenant: str) -> None:
+        with self._lock:
+            self.in_use -= 1
+            self.in_flight[tenant] -= 1
+            self._dispatch_locked()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "in_use": self.in_use,
+                "in_flight": {t: n for t, n in self.in_flight.items() if n},
+                "waiting": {t: len(q) for t, q in self._waiters.items() if q},
+                "waited_s": {t: round(v, 3) for t, v in self.waited_s.items()},
+            }
+
+
+def _resolve(fut: "asyncio.Future[None]", share: FairShare, tenant: str) -> None:
+    if fut.cancelled():
+        share.release(tenant)  # slot was granted after the caller gave up
+    else:
+        fut.set_result(None)
+
+
+class FairShareProvider(BaseProvider):
+    """One campaign's view of the shared provider; every call takes a FairShare slot."""
+
+    def __init__(self, inner: BaseProvider, share: FairShare, tenant: str) -> None:
+        self.inner = inner
+        self.share = share
+        self.tenant = tenant
+        self.name = inner.name
+        self.max_concurrency = share.slots
+
+    def health_check(self) -> bool:
+        return self.inner.health_check()
+
+    def close(self) -> None:
+        pass  # the orchestrator owns (and closes) the shared provider
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        self.share.acquire(self.tenant)
+        try:
+            return self.inner.generate_image(
+                prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+            )
+        finally:
+            self.share.release(self.tenant)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        await self.share.aacquire(self.tenant)
+        try:
+            return await self.inner.agenerate_image(
+                prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+            )
+        finally:
+            self.share.release(self.tenant)
+
+
+class DecisionLog:
+    """Recent scheduling decisions and queue waits for runs/status.json."""
+
+    def __init__(self, keep: int = 50) -> None:
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.waits: Deque[float] = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def record(self, **decision: Any) -> None:
+        with self._lock:
+            self.recent.append(decision)
+            if "queue_wait_s" in decision:
+                self.waits.append(float(decision["queue_wait_s"]))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits: List[float] = sorted(self.waits)
+            summary = {}
+            if waits:
+                summary = {
+                    "p50": round(waits[len(waits) // 2], 3),
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3),
+                    "max": round(waits[-1], 3),
+                }
+            return {"queue_wait_s": summary, "recent": list(self.recent)}
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+Signature = Tuple[int, int]  # (mtime_ns, size)
+
+# inotify(7) masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+def signature(path: Path) -> Optional[Signature]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class BriefWatcher(ABC):
+    """Hands out briefs in ``directory`` once they have been created or changed.
+
+    Subclasses feed raw change notifications into ``_touch``; a file is only handed out
+    after ``debounce_s`` without further changes, so a brief that is still being written
+    (or an editor's save-in-several-writes) is picked up once, complete.
+    """
+
+    def __init__(self, directory: Path, pattern: str = "*.json", debounce_s: float = 0.25) -> None:
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.debounce_s = debounce_s
+        self._pending: Dict[str, float] = {}
+
+    def _wanted(self, name: str) -> bool:
+        # Skip dotfiles and editor/atomic-write temp names
+        return not name.startswith(".") and fnmatch.fnmatch(name, self.pattern)
+
+    def _touch(self, name: str) -> None:
+        if self._wanted(name):
+            self._pending[name] = time.monotonic()
+
+    @abstractmethod
+    def _poll(self, timeout: float) -> None:
+        """Wait up to ``timeout`` for change notifications and feed them to ``_touch``."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "BriefWatcher":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def wait(self, timeout: float) -> List[Path]:
+        """Block until at least one brief settles (or ``timeout``); return settled paths."""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            ready = sorted(n for n, t in self._pending.items() if now - t >= self.debounce_s)
+            for n in ready:
+                del self._pending[n]
+            paths = [self.directory / n for n in ready if (self.directory / n).exists()]
+            if paths:
+                return paths
+            if now >= deadline:
+                return []
+            wake = deadline
+            if self._pending:
+                wake = min(wake, min(self._pending.values()) + self.debounce_s)
+            self._poll(max(0.0, wake - now))
+
+
+class InotifyWatcher(BriefWatcher):
+    """Linux inotify through libc (ctypes): no rescans, wakes as soon as a file lands."""
+
+    def __init__(self, directory: Path, pattern: str = "*.json", debounce_s: float = 0.25) -> None:
+        super().__init__(directory, pattern, debounce_s)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(str(self.directory)), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f"inotify_add_watch failed for {self.directory}")
+
+    def _poll(self, timeout: float) -> None:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        offset = 0
+        while offset + _EVENT.size <= len(buf):
+            _wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+            name = buf[offset + _EVENT.size : offset + _EVENT.size + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Kernel dropped events: fall back to one full listing
+                for p in self.directory.glob(self.pattern):
+                    self._touch(p.name)
+            elif name and not mask & (IN_DELETE | IN_MOVED_FROM):
+                self._touch(name)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class ScanWatcher(BriefWatcher):
+    """Portable fallback: an mtime/size index refreshed by ``os.scandir``.
+
+    Per-file stats are only redone when the directory's own mtime moves (create,
+    delete, rename, i.e. atomic writes) or every ``full_scan_s`` to catch in-place edits,
+    so an idle folder with thousands of briefs costs one stat per ``interval_s``.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        pattern: str = "*.json",
+        debounce_s: float = 0.25,
+        interval_s: float = 0.2,
+        full_scan_s: float = 5.0,
+    ) -> None:
+        super().__init__(directory, pattern, debounce_s)
+        self.interval_s = interval_s
+        self.full_scan_s = full_scan_s
+        self._index: Dict[str, Signature] = {}
+        self._dir_mtime = -1
+        self._full_at = 0.0
+        self._scan(report=False)
+
+    def _scan(self, report: bool = True) -> None:
+        index: Dict[str, Signature] = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not self._wanted(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                index[entry.name] = (st.st_mtime_ns, st.st_size)
+                if report and self._index.get(entry.name) != index[entry.name]:
+                    self._touch(entry.name)
+        self._index = index
+        self._full_at = time.monotonic()
+
+    def _poll(self, timeout: float) -> None:
+        time.sleep(min(timeout, self.interval_s))
+        try:
+            dir_mtime = self.directory.stat().st_mtime_ns
+        except OSError:
+            return
+        if dir_mtime != self._dir_mtime or time.monotonic() - self._full_at >= self.full_scan_s or self._pending:
+            self._dir_mtime = dir_mtime
+            self._scan()
+
+
+def watch_briefs(directory: Path, pattern: str = "*.json", debounce_s: float = 0.25) -> BriefWatcher:
+    """inotify on Linux; mtime scanning elsewhere or when ``CAPE_WATCHER=scan``."""
+    if sys.platform.startswith("linux") and os.getenv("CAPE_WATCHER", "auto").lower() != "scan":
+        try:
+            return InotifyWatcher(directory, pattern, debounce_s)
+        except (OSError, AttributeError):
+            pass  # no inotify (old libc, limits exhausted, odd filesystem)
+    return ScanWatcher(directory, pattern, debounce_s)
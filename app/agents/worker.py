@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.agents.jobstore import content_hash
+from app.agents.leases import Lease, LeaseDir
+from app.agents.watcher import Signature, signature
+from app.models import Brief
+from app.pipeline.adapters.base import BaseProvider
+from app.pipeline.compositor import _ratio_dirname, compose_variants
+from app.pipeline.generator import select_provider
+from app.pipeline.ingest import load_brand_rules
+from app.pipeline.report import RunContext, RunReporter
+
+
+@dataclass
+class WorkerConfig:
+    briefs_dir: Path = Path("briefs")
+    output_dir: Path = Path("outputs")
+    runs_dir: Path = Path("runs")  # leases live in runs/leases; share it between hosts
+    provider: str = "auto"
+    shard: bool = False  # one unit per product x ratio instead of one per brief
+    lease_seconds: float = 60.0
+    max_attempts: int = 3
+    poll_seconds: float = 5.0
+    workers: int = 1
+    master_render: bool = False
+    concurrency: int | None = None
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    id: str  # file-name safe, unique per brief content (and shard)
+    brief_name: str
+    body: str
+    product_id: Optional[str] = None
+    ratio: Optional[str] = None
+
+
+def _safe(part: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", part)
+
+
+def work_units(brief_name: str, data: bytes, shard: bool = False) -> List[WorkUnit]:
+    """Units for one brief's bytes; ids change whenever the content does."""
+    body = data.decode("utf-8")
+    base = f"{_safe(Path(brief_name).stem)}-{content_hash(data)[:16]}"
+    if shard:
+        try:
+            brief = Brief(**json.loads(body))
+        except Exception:
+            brief = None  # run unsharded so the error is recorded against the brief
+        if brief is not None:
+            return [
+                WorkUnit(f"{base}-{_safe(p.id)}-{_ratio_dirname(r)}", brief_name, body, p.id, r)
+                for p in brief.products
+                for r in brief.aspect_ratios
+            ]
+    return [WorkUnit(base, brief_name, body)]
+
+
+class Worker:
+    """One node of a multi-host render farm sharing ``briefs/``, ``outputs/`` and ``runs/``.
+
+    Every worker lists the briefs folder, splits briefs into work units and claims them
+    through a LeaseDir, so any number of processes on any number of hosts can run side
+    by side and a unit is rendered once; a dead worker's units are picked up when its
+    lease expires.
+    """
+
+    def __init__(self, cfg: WorkerConfig) -> None:
+        self.cfg = cfg
+        self.leases = LeaseDir(cfg.runs_dir / "leases", lease_s=cfg.lease_seconds, max_attempts=cfg.max_attempts)
+        self.owner = self.leases.owner
+        # brief name -> (signature, units) so unchanged briefs are not re-read every pass
+        self._units: Dict[str, Tuple[Signature, List[WorkUnit]]] = {}
+        self._provider: BaseProvider | None = None
+        self._rules: Optional[Dict] = None
+        self.processed = 0
+        self.current: Optional[str] = None
+
+    def close(self) -> None:
+        if self._provider is not None:
+            self._provider.close()
+            self._provider = None
+
+    def units(self) -> List[WorkUnit]:
+        out: List[WorkUnit] = []
+        known: Dict[str, Tuple[Signature, List[WorkUnit]]] = {}
+        for b in sorted(self.cfg.briefs_dir.glob("*.json")):
+            sig = signature(b)
+            if sig is None:
+                continue
+            cached = self._units.get(b.name)
+            if cached is None or cached[0] != sig:
+                try:
+                    cached = (sig, work_units(b.name, b.read_bytes(), self.cfg.shard))
+                except OSError:
+                    continue
+            known[b.name] = cached
+            out.extend(cached[1])
+        self._units = known
+        return out
+
+    def outstanding(self) -> List[WorkUnit]:
+        return [u for u in self.units() if not self.leases.is_done(u.id) and not self.leases.is_failed(u.id)]
+
+    def run_once(self) -> int:
+        """Claim and run every unit nobody else holds; returns how many this pass ran."""
+        ran = 0
+        for unit in self.outstanding():
+            lease = self.leases.claim(unit.id)
+            if lease is None:
+                continue
+            self._run_leased(unit, lease)
+            ran += 1
+        self._write_status()
+        return ran
+
+    def _run_leased(self, unit: WorkUnit, lease: Lease) -> None:
+        self.current = unit.id
+        self._write_status()
+        with self.leases.held(lease):
+            try:
+                result = self._run_unit(unit)
+            except Exception as exc:  # keep the worker alive; attempts are counted on disk
+                self.leases.fail(lease, f"{type(exc).__name__}: {exc}")
+            else:
+                # Outputs are deterministic, so a unit whose lease was lost meanwhile is
+                # still recorded; the worker that took it over rewrites the same files.
+                self.leases.complete(lease, {**result, "lease_lost": lease.lost})
+        self.current = None
+        self.processed += 1
+
+    def _get_provider(self, rules: Dict) -> BaseProvider:
+        if self._provider is None:
+            self._provider = select_provider(self.cfg.provider, rules=rules)
+        return self._provider
+
+    def _run_unit(self, unit: WorkUnit) -> Dict:
+        brief = Brief(**json.loads(unit.body))
+        ratios = brief.aspect_ratios
+        if unit.product_id is not None:
+            brief = brief.model_copy(update={"products": [p for p in brief.products if p.id == unit.product_id]})
+            ratios = [unit.ratio]
+        if self._rules is None:
+            self._rules = load_brand_rules()
+        provider = self._get_provider(self._rules)
+        reporter = RunReporter(RunContext(run_id=f"{int(time.time())}-{unit.id}", provider=provider.name))
+        compose_variants(
+            brief,
+            self._rules,
+            provider,
+            ratios,
+            brief.locales,
+            self.cfg.output_dir,
+            reporter,
+            max_variants=1,
+            seed=1234,
+            workers=self.cfg.workers,
+            master_render=self.cfg.master_render,
+            concurrency=self.cfg.concurrency,
+        )
+        reporter.finalize(self.cfg.output_dir)
+        return {
+            "brief": unit.brief_name,
+            "campaign_id": brief.campaign_id,
+            "product": unit.product_id,
+            "ratio": unit.ratio,
+            "provider": provider.name,
+            "variants": reporter._report.totals.get("variants", 0),
+        }
+
+    def _write_status(self) -> None:
+        p = self.cfg.runs_dir / "workers" / f"{_safe(self.owner)}.json"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{p.name}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"owner": self.owner, "updated_at": time.time(), "processed": self.processed, "current": self.current},
+                indent=2,
+            )
+        )
+        tmp.replace(p)
+
+    def start(self, max_iterations: int | None = None, until_idle: bool = False) -> None:
+        """Poll for work. With ``until_idle``, return once every unit is done or given up on
+        (units leased by others are waited for, and taken over if their worker dies)."""
+        i = 0
+        try:
+            while max_iterations is None or i < max_iterations:
+                ran = self.run_once()
+                i += 1
+                if until_idle and not self.outstanding():
+                    break
+                if not ran:
+                    # Short naps while someone else's lease is pending, so expiry is noticed promptly
+                    time.sleep(min(self.cfg.poll_seconds, self.cfg.lease_seconds / 3))
+        finally:
+            self.close()
@@ -3,10 +3,11 @@ import json
 import os
 import subprocess
 import time
-import glob
 import pathlib
 from typing import Any, Dict
 
+from app.pipeline.report import MANIFEST_DIR
+
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 
@@ -80,6 +81,20 @@ def _read_metrics_from_report() -> Dict[str, Dict[str, Any]]:
         return {}
 
 
+def _latest_post(out: pathlib.Path) -> str:
+    """Post written by the newest run, read from its output manifest (no tree walk)."""
+    manifests = sorted(out.joinpath(MANIFEST_DIR).glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for m in manifests:
+        try:
+            variants = json.loads(m.read_text(encoding="utf-8")).get("variants", [])
+        except Exception:
+            continue
+        for v in reversed(variants):
+            if v.get("post"):
+                return str(out / v["post"])
+    return ""
+
+
 def runner(
     brief: str = "briefs/sample_brief.json",
     out: str = "outputs",
@@ -102,6 +117,16 @@ def runner(
             seed=seed,
             overlay_style=layout,
             log_json=True,
+            workers=1,
+            cache=True,
+            master_render=False,
+            concurrency=None,
+            deadline=None,
+            hedge=None,
+            resume=None,
+            incremental=False,
+            output_layout=None,
+            encode=None,
         )
     except Exception:
         # Fallback to subprocess if direct call fails unexpectedly
@@ -132,13 +157,7 @@ def runner(
     # give filesystem a moment and then pull latest artifact
     time.sleep(0.2)
     metrics_by_path = _read_metrics_from_report()
-    # find candidate image by latest post.png in outputs
-    candidates = sorted(
-        glob.glob(f"{out}/**/post.png", recursive=True),
-        key=os.path.getmtime,
-        reverse=True,
-    )
-    asset_path = candidates[0] if candidates else ""
+    asset_path = _latest_post(pathlib.Path(out))
     prov_path = asset_path + ".prov.json" if asset_path else ""
     metrics = metrics_by_path.get(asset_path, {})
     return {
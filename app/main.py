@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -13,15 +14,15 @@ app = typer.Typer(add_completion=False, no_args_is_help=True)
 
 @app.command()
 def generate(
-    brief: str = typer.Option(
-        ..., "--brief", "-b", help="Path to brief JSON/YAML"
+    brief: Optional[str] = typer.Option(
+        None, "--brief", "-b", help="Path to brief JSON/YAML (required unless --resume)"
     ),
     out: str = typer.Option("outputs", "--out", "-o", help="Output directory"),
     provider: str = typer.Option(
         "auto",
         "--provider",
         "-p",
-        help="Provider: auto|firefly|openai|mock",
+        help="Provider: auto|firefly|openai|mock|sim",
         case_sensitive=False,
     ),
     ratios: str = typer.Option(
@@ -39,6 +40,42 @@ def generate(
     log_json: bool = typer.Option(
         False, "--log-json", "-j", help="Write JSON logs to runs/<ts>/run.log"
     ),
+    workers: int = typer.Option(
+        1, "--workers", "-w", min=1, help="Processes used for resize/overlay/encode (1 = in-process)"
+    ),
+    cache: bool = typer.Option(
+        True, "--cache/--no-cache", help="Reuse identical provider generations from .cache/generations"
+    ),
+    master_render: bool = typer.Option(
+        False, "--master-render", help="One oversized hero per product/locale/seed, cropped to every ratio"
+    ),
+    concurrency: Optional[int] = typer.Option(
+        None, "--concurrency", "-c", min=1, help="Provider requests in flight (default: per-provider limit)"
+    ),
+    deadline: Optional[float] = typer.Option(
+        None, "--deadline", min=1, help="Seconds the generation step should finish in (auto splits across providers)"
+    ),
+    hedge: Optional[bool] = typer.Option(
+        None, "--hedge/--no-hedge", help="Duplicate straggling provider calls (default: hedging.enabled in brand rules)"
+    ),
+    resume: Optional[str] = typer.Option(
+        None, "--resume", help="Finish an interrupted run: same settings, only missing or damaged variants are made"
+    ),
+    incremental: bool = typer.Option(
+        False, "--incremental", help="Only re-render variants whose inputs changed since the last build in --out"
+    ),
+    output_layout: Optional[str] = typer.Option(
+        None,
+        "--output-layout",
+        help="legacy (<product>/<ratio>/post.png, last locale wins) or sharded (one folder per variant); "
+        "default CAPE_OUTPUT_LAYOUT or legacy",
+    ),
+    encode: Optional[List[str]] = typer.Option(
+        None,
+        "--encode",
+        help="Output format, e.g. webp:quality=90, jpeg:quality=85, png:compress_level=1; "
+        "prefix hero= or post= for one channel (default: output.encoders in brand rules, else png)",
+    ),
 ):
     """Generate creatives from a campaign brief.
 
@@ -55,23 +92,82 @@ def generate(
     from app.pipeline.generator import select_provider
     from app.pipeline.report import RunContext, RunReporter
     from app.pipeline.utils import ensure_run_dirs, now_ts
-    from app.pipeline.compositor import compose_variants
+    from app.pipeline.compositor import compose_variants, resolve_output_layout
     from app.pipeline.legal import scan_legal
     from app.pipeline.compliance import score_compliance
+    from app.pipeline.journal import RunJournal, sha256_file
+    from app.pipeline.incremental import BuildManifest
+    from app.pipeline.encoders import output_encoders
 
     from app.logging_config import configure_logging
 
+    if resume:
+        settings_path = Path("runs") / resume / "run.json"
+        if not settings_path.exists():
+            typer.secho(f"error: no run settings at {settings_path}", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        saved = json.loads(settings_path.read_text(encoding="utf-8"))
+        # Everything that shapes the outputs comes from the original run
+        brief, out, provider = saved["brief"], saved["out"], saved["provider"]
+        ratios, locales = saved["ratios"], saved["locales"]
+        max_variants, seed = saved["max_variants"], saved["seed"]
+        overlay_style, master_render = saved["overlay_style"], saved["master_render"]
+        incremental = saved.get("incremental", False)
+        output_layout = saved.get("output_layout")
+        encode = saved.get("encode")
+        run_id = resume
+    elif brief is None:
+        typer.secho("error: --brief is required (or --resume <run_id>)", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    else:
+        run_id = now_ts()
+
+    try:
+        output_layout = resolve_output_layout(output_layout)
+    except ValueError as exc:
+        typer.secho(f"error: {exc}", fg=typer.colors.RED)
+        raise typer.Exit(1)
     ratios_list = [r.strip() for r in ratios.split(",") if r.strip()]
     locales_list = [l.strip() for l in locales.split(",") if l.strip()]
 
-    run_id = now_ts()
     run_dir, log_path = ensure_run_dirs(run_id, json_logs=log_json)
     configure_logging(json_logs=log_json, log_file=log_path)
 
     brief_path = Path(brief)
     out_path = Path(out)
     brief_model, brand_rules = load_brief_and_rules(brief_path)
-    provider_impl = select_provider(provider)
+    try:
+        encoders = output_encoders(brand_rules, encode)
+    except ValueError as exc:
+        typer.secho(f"error: {exc}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    inputs = {
+        "brief_sha256": sha256_file(brief_path),
+        "rules_sha256": hashlib.sha256(json.dumps(brand_rules, sort_keys=True, default=str).encode()).hexdigest(),
+    }
+    if resume:
+        if any(saved.get(k) != v for k, v in inputs.items()):
+            typer.secho(f"error: brief or brand rules changed since run {run_id}; start a new run", fg=typer.colors.RED)
+            raise typer.Exit(1)
+    else:
+        settings = {
+            "brief": str(brief_path),
+            "out": str(out_path),
+            "provider": provider,
+            "ratios": ratios,
+            "locales": locales,
+            "max_variants": max_variants,
+            "seed": seed,
+            "overlay_style": overlay_style,
+            "master_render": master_render,
+            "incremental": incremental,
+            "output_layout": output_layout,
+            "encode": encode,
+            **inputs,
+        }
+        (run_dir / "run.json").write_text(json.dumps(settings, indent=2), encoding="utf-8")
+    journal = RunJournal(run_dir)
+    provider_impl = select_provider(provider, use_cache=cache, rules=brand_rules, hedge=hedge)
 
     reporter = RunReporter(RunContext(run_id=run_id, provider=provider_impl.name))
     try:
@@ -86,6 +182,15 @@ def generate(
             max_variants=max_variants,
             seed=seed,
             overlay_style=overlay_style,
+            workers=workers,
+            master_render=master_render,
+            concurrency=concurrency,
+            deadline_s=deadline,
+            journal=journal,
+            manifest=BuildManifest(out_path),
+            incremental=incremental,
+            layout=output_layout,
+            encoders=encoders,
         )
 
         # After generation, run scans and finalize report
@@ -99,15 +204,41 @@ def generate(
         # tiny rename; reads a bit casual but fine
         flagz = getattr(reporter, "legal_flags", [])
         flag_note = f" ({flagz[0]})" if flagz else ""
+        reused = sum(int(reporter.stats.get(k, {}).get("reused", 0)) for k in ("resume", "incremental"))
+        reuse_note = f" ({reused} reused)" if reused else ""
         typer.echo(
-            f"Run {run_id}: {actual}/{expected} variants, avg compliance {int(avg)}, legal flags {len(flagz)}{flag_note}"
+            f"Run {run_id}: {actual}/{expected} variants{reuse_note}, avg compliance {int(avg)}, "
+            f"legal flags {len(flagz)}{flag_note}"
         )
     except Exception as exc:
         # keep errors small and plain; print and exit with code 1
         typer.secho(f"error: {exc}", fg=typer.colors.RED)
         raise typer.Exit(1)
     finally:
+        journal.close()
         reporter.save(run_dir)
+        provider_impl.close()
+
+
+@app.command()
+def rescore(
+    run_id: str = typer.Option(..., "--run-id", help="Run under runs/ to re-score from disk"),
+):
+    """Re-score an existing run against the current brand rules (re-reads every post.png)."""
+    from app.pipeline.ingest import load_brand_rules
+    from app.pipeline.report import RunReporter
+    from app.pipeline.compliance import score_compliance
+
+    run_dir = Path("runs") / run_id
+    reporter = RunReporter.load(run_dir)
+    summary = score_compliance(None, load_brand_rules(), reporter, rescore=True)
+    # Refresh the output manifest in the tree the run wrote to; runs without saved
+    # settings (orchestrator, UI) only get their report rewritten
+    settings_path = run_dir / "run.json"
+    out_root = Path(json.loads(settings_path.read_text(encoding="utf-8"))["out"]) if settings_path.exists() else None
+    reporter.finalize(out_root)
+    reporter.save(run_dir)
+    typer.echo(f"Run {run_id}: avg compliance {summary['avg']}, min {summary['min']}")
 
 
 @app.command()
@@ -116,15 +247,67 @@ def orchestrate(
     poll_seconds: int = typer.Option(15),
     out: Path = typer.Option(Path("outputs")),
     iterations: int = typer.Option(1, help="Loop iterations before exit (for local runs)"),
+    workers: int = typer.Option(1, min=1, help="Render processes per brief"),
+    master_render: bool = typer.Option(False, "--master-render", help="Crop every ratio from one hero per product"),
+    concurrency: Optional[int] = typer.Option(
+        None, min=1, help="Provider requests in flight, shared fairly between running briefs"
+    ),
+    brief_workers: int = typer.Option(1, min=1, help="Briefs processed at the same time"),
+    max_per_campaign: int = typer.Option(1, min=0, help="Concurrent briefs per campaign (0 = no cap)"),
 ):
     """Run the agentic orchestrator to watch briefs and trigger the pipeline."""
     from app.agents.orchestrator import Orchestrator, OrchestratorConfig
 
-    cfg = OrchestratorConfig(briefs_dir=briefs_dir, poll_seconds=poll_seconds, output_dir=out)
+    cfg = OrchestratorConfig(
+        briefs_dir=briefs_dir,
+        poll_seconds=poll_seconds,
+        output_dir=out,
+        workers=workers,
+        master_render=master_render,
+        concurrency=concurrency,
+        brief_workers=brief_workers,
+        max_per_campaign=max_per_campaign,
+    )
     orch = Orchestrator(cfg)
     orch.start(max_iterations=iterations)
 
 
+@app.command()
+def worker(
+    briefs_dir: Path = typer.Option(Path("briefs")),
+    out: Path = typer.Option(Path("outputs")),
+    runs_dir: Path = typer.Option(Path("runs"), help="Shared runs folder; leases go in runs/leases"),
+    provider: str = typer.Option("auto", "--provider", "-p", help="Provider: auto|firefly|openai|mock|sim"),
+    shard: bool = typer.Option(False, "--shard", help="Split briefs into product x ratio work units"),
+    lease_seconds: float = typer.Option(60.0, min=1, help="Lease lifetime without a heartbeat"),
+    max_attempts: int = typer.Option(3, min=1),
+    poll_seconds: float = typer.Option(5.0, min=0.1),
+    until_idle: bool = typer.Option(False, "--until-idle", help="Exit once every unit is done or failed"),
+    iterations: Optional[int] = typer.Option(None, min=1, help="Passes over the briefs before exit"),
+    workers: int = typer.Option(1, min=1, help="Render processes per unit"),
+    concurrency: Optional[int] = typer.Option(None, min=1, help="Provider requests in flight per unit"),
+):
+    """Claim and render work units from a shared briefs folder (run one per host)."""
+    from app.agents.worker import Worker, WorkerConfig
+
+    cfg = WorkerConfig(
+        briefs_dir=briefs_dir,
+        output_dir=out,
+        runs_dir=runs_dir,
+        provider=provider.lower(),
+        shard=shard,
+        lease_seconds=lease_seconds,
+        max_attempts=max_attempts,
+        poll_seconds=poll_seconds,
+        workers=workers,
+        concurrency=concurrency,
+    )
+    node = Worker(cfg)
+    typer.echo(f"Worker {node.owner} watching {briefs_dir}")
+    node.start(max_iterations=iterations, until_idle=until_idle)
+    typer.echo(f"Worker {node.owner} ran {node.processed} unit(s)")
+
+
 @app.command()
 def explore() -> None:
     """Launch the CAPE Explorer UI (Streamlit)."""
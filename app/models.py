@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field, HttpUrl, ValidationError, model_validator
 
@@ -29,6 +29,7 @@ class Brief(BaseModel):
     call_to_action: Dict[str, str]
     brand_palette: BrandPalette
     products: List[Product]
+    priority: int = 0  # orchestrator: higher runs first (a <brief>.meta sidecar can override)
 
     @model_validator(mode="after")
     def validate_required_locales(self) -> "Brief":
@@ -51,10 +52,16 @@ class VariantResult(BaseModel):
     product_id: str
     ratio: str
     locale: str
+    variant_index: int = 0
     seed: Optional[int] = None
     path_post: str
     path_hero: Optional[str] = None
     provider: str
+    # Set in master-render mode: id of the oversized hero this ratio was cropped from
+    master: Optional[str] = None
+    compliance_score: Optional[float] = None
+    # Left on disk by an earlier build (generate --incremental) instead of rendered again
+    reused: bool = False
 
 
 class RunReport(BaseModel):
@@ -64,5 +71,10 @@ class RunReport(BaseModel):
     variants: List[VariantResult]
     compliance: Dict[str, float] = Field(default_factory=dict)
     legal_flags: List[str] = Field(default_factory=list)
+    # One entry per match: {"term", "locale", "field", "start", "end"}
+    legal_hits: List[Dict[str, Any]] = Field(default_factory=list)
+    # Variants that could not be produced: {"product", "ratio", "locale", "reason"}
+    shortfalls: List[Dict[str, str]] = Field(default_factory=list)
+    stats: Dict[str, Dict[str, float]] = Field(default_factory=dict)
 
 
@@ -1,13 +1,49 @@
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
 from PIL import Image
 
 
+T = TypeVar("T")
+
+
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
 class ProviderError(Exception):
-    pass
+    def __init__(
+        self,
+        message: str = "",
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: Optional[bool] = None,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        # Throttling / transient 5xx / network errors are worth retrying; config errors are not
+        self.retryable = retryable if retryable is not None else status in _RETRYABLE_STATUS
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        from datetime import datetime, timezone
+
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
 
 
 @dataclass
@@ -16,13 +52,43 @@ class GenerateResult:
     metadata: Dict[str, Any]
 
 
+@dataclass
+class GenerateRequest:
+    prompt: str
+    size: Tuple[int, int]
+    seed: Optional[int] = None
+    style_ref: Optional[bytes] = None
+    negative_prompt: Optional[str] = None
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine from sync code, even if this thread already has a loop (Streamlit)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)  # type: ignore[arg-type]
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()  # type: ignore[arg-type]
+
+
 class BaseProvider(ABC):
     name: str = "base"
+    # Default in-flight cap for generate_images; callers can override per call
+    max_concurrency: int = 4
 
     @abstractmethod
     def health_check(self) -> bool:
         ...
 
+    def close(self) -> None:
+        """Release pooled clients. Safe to call more than once; no-op for local adapters."""
+
+    def __enter__(self) -> "BaseProvider":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
     @abstractmethod
     def generate_image(
         self,
@@ -34,4 +100,50 @@ class BaseProvider(ABC):
     ) -> GenerateResult:
         ...
 
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        # Emulated for sync-only adapters: run the blocking call on a worker thread.
+        # Adapters with a native async client override this.
+        return await asyncio.to_thread(
+            self.generate_image,
+            prompt=prompt,
+            size=size,
+            seed=seed,
+            style_ref=style_ref,
+            negative_prompt=negative_prompt,
+        )
+
+    async def agenerate_images(
+        self,
+        requests: Sequence[GenerateRequest],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[GenerateResult, BaseException]]:
+        """Generate many images with at most ``concurrency`` in flight; results keep request order."""
+        sem = asyncio.Semaphore(max(1, concurrency or self.max_concurrency))
 
+        async def one(r: GenerateRequest) -> GenerateResult:
+            async with sem:
+                return await self.agenerate_image(
+                    prompt=r.prompt,
+                    size=r.size,
+                    seed=r.seed,
+                    style_ref=r.style_ref,
+                    negative_prompt=r.negative_prompt,
+                )
+
+        return await asyncio.gather(*(one(r) for r in requests), return_exceptions=return_exceptions)
+
+    def generate_images(
+        self,
+        requests: Sequence[GenerateRequest],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[GenerateResult, BaseException]]:
+        return run_sync(self.agenerate_images(requests, concurrency=concurrency, return_exceptions=return_exceptions))
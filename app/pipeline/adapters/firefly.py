@@ -1,26 +1,97 @@
 from __future__ import annotations
 
-import asyncio
+import io
+import math
 import os
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 from PIL import Image
 
-from .base import BaseProvider, GenerateResult, ProviderError
+from .base import BaseProvider, GenerateResult, ProviderError, parse_retry_after
+from .http import HttpPool, PoolConfig
+
+
+DEFAULT_BASE_URL = "https://firefly-api.adobe.io"
+# Output sizes Firefly v3 accepts; we ask for the one closest to the requested aspect
+# and let the compositor crop.
+_SIZES: Tuple[Tuple[int, int], ...] = ((2048, 2048), (2304, 1792), (1792, 2304), (2688, 1536))
+
+
+def _closest_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    want = math.log(size[0] / size[1])
+    return min(_SIZES, key=lambda s: abs(math.log(s[0] / s[1]) - want))
 
 
 class FireflyProvider(BaseProvider):
     name = "firefly"
+    max_concurrency = 4
 
-    def __init__(self, api_key: str, workspace_id: str | None = None) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        workspace_id: str | None = None,
+        base_url: str | None = None,
+        access_token: str | None = None,
+        pool: Optional[PoolConfig] = None,
+    ) -> None:
         self.api_key = api_key
         self.workspace_id = workspace_id
+        self.access_token = access_token or os.getenv("FIREFLY_ACCESS_TOKEN")
+        self._http = HttpPool(pool, base_url=base_url or os.getenv("FIREFLY_BASE_URL", DEFAULT_BASE_URL))
 
     def health_check(self) -> bool:
         return bool(self.api_key)
 
-    async def _generate_async(
+    def close(self) -> None:
+        self._http.close()
+
+    def _auth_headers(self) -> Dict[str, str]:
+        # Sent per request, not on the client: image downloads go to presigned URLs
+        # that reject an extra Authorization header.
+        headers = {"x-api-key": self.api_key, "Accept": "application/json"}
+        if self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        return headers
+
+    def _body(
+        self, prompt: str, size: Tuple[int, int], seed: Optional[int], negative_prompt: Optional[str]
+    ) -> Tuple[Dict[str, Any], Tuple[int, int]]:
+        w, h = _closest_size(size)
+        body: Dict[str, Any] = {"prompt": prompt, "numVariations": 1, "size": {"width": w, "height": h}}
+        if seed is not None:
+            body["seeds"] = [int(seed)]
+        if negative_prompt:
+            body["negativePrompt"] = negative_prompt
+        return body, (w, h)
+
+    @staticmethod
+    def _check(resp: httpx.Response) -> None:
+        if resp.status_code >= 400:
+            raise ProviderError(
+                f"Firefly HTTP {resp.status_code}: {resp.text[:200]}",
+                status=resp.status_code,
+                retry_after=parse_retry_after(resp.headers.get("retry-after")),
+            )
+
+    @staticmethod
+    def _image_url(data: Dict[str, Any]) -> str:
+        try:
+            return data["outputs"][0]["image"]["url"]
+        except (KeyError, IndexError, TypeError):
+            raise ProviderError("Firefly response missing outputs[0].image.url")
+
+    def _result(self, payload: bytes, seed: Optional[int], wh: Tuple[int, int]) -> GenerateResult:
+        try:
+            img = Image.open(io.BytesIO(payload)).convert("RGB")
+        except Exception as e:
+            raise ProviderError(f"Failed to decode Firefly image: {e}")
+        return GenerateResult(
+            image=img,
+            metadata={"provider": self.name, "seed": seed, "size": {"width": wh[0], "height": wh[1]}},
+        )
+
+    def generate_image(
         self,
         prompt: str,
         size: Tuple[int, int],
@@ -28,14 +99,18 @@ class FireflyProvider(BaseProvider):
         style_ref: Optional[bytes] = None,
         negative_prompt: Optional[str] = None,
     ) -> GenerateResult:
-        # Placeholder async structure for Firefly v3; requires real endpoint wiring.
-        # Intentionally not performing network calls in this repository.
-        raise ProviderError(
-            "FireflyProvider called without concrete API integration in this local build. "
-            "Use provider=mock for offline runs."
-        )
+        body, wh = self._body(prompt, size, seed, negative_prompt)
+        client = self._http.client
+        try:
+            resp = client.post("/v3/images/generate", json=body, headers=self._auth_headers())
+            self._check(resp)
+            img = client.get(self._image_url(resp.json()))
+            self._check(img)
+        except httpx.HTTPError as e:
+            raise ProviderError(f"Firefly request failed: {e}", retryable=True)
+        return self._result(img.content, seed, wh)
 
-    def generate_image(
+    async def agenerate_image(
         self,
         prompt: str,
         size: Tuple[int, int],
@@ -43,20 +118,17 @@ class FireflyProvider(BaseProvider):
         style_ref: Optional[bytes] = None,
         negative_prompt: Optional[str] = None,
     ) -> GenerateResult:
-        try:
-            return asyncio.run(
-                self._generate_async(
-                    prompt=prompt,
-                    size=size,
-                    seed=seed,
-                    style_ref=style_ref,
-                    negative_prompt=negative_prompt,
-                )
-            )
-        except RuntimeError:
-            # Event loop already running (e.g., Streamlit). Provide a clear error.
-            raise ProviderError(
-                "Firefly async generation requires integration; not supported in UI loop."
-            )
+        body, wh = self._body(prompt, size, seed, negative_prompt)
 
+        async def call() -> bytes:
+            client = self._http.aclient
+            try:
+                resp = await client.post("/v3/images/generate", json=body, headers=self._auth_headers())
+                self._check(resp)
+                img = await client.get(self._image_url(resp.json()))
+                self._check(img)
+            except httpx.HTTPError as e:
+                raise ProviderError(f"Firefly request failed: {e}", retryable=True)
+            return img.content
 
+        return self._result(await self._http.arun(call()), seed, wh)
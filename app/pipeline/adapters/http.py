@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Dict, Optional, TypeVar
+
+import httpx
+
+
+T = TypeVar("T")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 16
+    max_keepalive: int = 8
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    timeout: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        return cls(
+            max_connections=int(_env_float("CAPE_HTTP_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive=int(_env_float("CAPE_HTTP_MAX_KEEPALIVE", cls.max_keepalive)),
+            keepalive_expiry=_env_float("CAPE_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry),
+            connect_timeout=_env_float("CAPE_HTTP_CONNECT_TIMEOUT", cls.connect_timeout),
+            timeout=_env_float("CAPE_HTTP_TIMEOUT", cls.timeout),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+class HttpPool:
+    """Keep-alive HTTP clients that live as long as the provider that owns them.
+
+    The sync ``client`` is a plain pooled httpx.Client. The async client is pinned to a
+    private event loop on a daemon thread: an AsyncClient's connections belong to the
+    loop that opened them, and callers here come from fresh ``asyncio.run`` loops
+    (CLI), Streamlit's loop, or none at all. ``arun`` hops onto that loop, so every
+    caller shares the same pool.
+    """
+
+    def __init__(
+        self,
+        config: Optional[PoolConfig] = None,
+        base_url: str = "",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.config = config or PoolConfig.from_env()
+        self.base_url = base_url
+        self.headers = dict(headers or {})
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    base_url=self.base_url,
+                    headers=self.headers,
+                    limits=self.config.limits(),
+                    timeout=self.config.timeouts(),
+                )
+            return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        # Only valid on the pool's own loop (inside a coroutine passed to arun)
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=self.config.limits(),
+                timeout=self.config.timeouts(),
+            )
+        return self._aclient
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                t = threading.Thread(target=loop.run_forever, name="cape-http", daemon=True)
+                t.start()
+                self._loop, self._thread = loop, t
+            return self._loop
+
+    async def arun(self, coro: Awaitable[T]) -> T:
+        loop = self._ensure_loop()
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            return await coro
+        fut = asyncio.run_coroutine_threadsafe(coro, loop)  # type: ignore[arg-type]
+        return await asyncio.wrap_future(fut)
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if client is not None:
+            client.close()
+        if loop is not None:
+            if self._aclient is not None:
+                asyncio.run_coroutine_threadsafe(self._aclient.aclose(), loop).result(timeout=5)
+                self._aclient = None
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=5)
+            loop.close()
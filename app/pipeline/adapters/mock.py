@@ -52,3 +52,15 @@ class MockProvider(BaseProvider):
         )
 
 
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        # Emulated: mock renders are instant, so run inline rather than on threads
+        # (the shared FreeType font is not meant to be drawn from several threads).
+        return self.generate_image(prompt, size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt)
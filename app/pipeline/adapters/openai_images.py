@@ -1,60 +1,84 @@
 from __future__ import annotations
 
+import base64
+import io
 import os
-from typing import Optional, Tuple
+from typing import Any, Optional, Tuple
 
 from PIL import Image
 
-from .base import BaseProvider, GenerateResult, ProviderError
-import io
-import base64
-import os
+from .base import BaseProvider, GenerateResult, ProviderError, parse_retry_after
+from .http import HttpPool, PoolConfig
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
+    AsyncOpenAI = None  # type: ignore
+
+
+def _closest_supported_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    w, h = size
+    if w >= h * 1.2:
+        return 1536, 1024
+    if h >= w * 1.2:
+        return 1024, 1536
+    return 1024, 1024
+
+
+def _as_provider_error(e: Exception) -> ProviderError:
+    # SDK errors carry the HTTP status and response; connection errors have neither
+    status = getattr(e, "status_code", None)
+    response = getattr(e, "response", None)
+    retry_after = parse_retry_after(response.headers.get("retry-after")) if response is not None else None
+    retryable = None if status is not None else type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+    return ProviderError(str(e), status=status, retry_after=retry_after, retryable=retryable)
 
 
 class OpenAIImagesProvider(BaseProvider):
     name = "openai"
+    max_concurrency = 4
 
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, base_url: str | None = None, pool: Optional[PoolConfig] = None) -> None:
         self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        # One pooled transport per provider; the SDK clients below are thin wrappers on it
+        self._http = HttpPool(pool)
+        self._client: Any = None
+        self._aclient: Any = None
 
     def health_check(self) -> bool:
         return bool(self.api_key)
 
-    def generate_image(
-        self,
-        prompt: str,
-        size: Tuple[int, int],
-        seed: Optional[int] = None,
-        style_ref: Optional[bytes] = None,
-        negative_prompt: Optional[str] = None,
-    ) -> GenerateResult:
+    def close(self) -> None:
+        self._client = None
+        self._aclient = None
+        self._http.close()
+
+    def _sync_client(self) -> Any:
+        if self._client is None:
+            # SDK retries off: RateLimitedProvider owns the retry policy
+            self._client = OpenAI(
+                api_key=self._api_key(), base_url=self.base_url, http_client=self._http.client, max_retries=0
+            )
+        return self._client
+
+    def _async_client(self) -> Any:
+        # Called on the pool's loop only (see HttpPool.arun)
+        if self._aclient is None:
+            self._aclient = AsyncOpenAI(
+                api_key=self._api_key(), base_url=self.base_url, http_client=self._http.aclient, max_retries=0
+            )
+        return self._aclient
+
+    def _api_key(self) -> str:
         if OpenAI is None:
             raise ProviderError("openai package not installed")
         api_key = self.api_key or os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ProviderError("OPENAI_API_KEY not set")
+        return api_key
 
-        client = OpenAI(api_key=api_key)
-        # OpenAI image API expects square sizes like 256|512|1024
-        # Pick the smaller side for cost; compositor will resize/crop later
-        target = min(size[0], size[1])
-        target = 1024 if target >= 1024 else 512 if target >= 512 else 256
-
-        # Seed support may vary; include it if available via extra headers/params later
-        prompt_text = prompt
-        try:
-            resp = client.images.generate(
-                model="gpt-image-1",
-                prompt=prompt_text,
-                size=f"{target}x{target}",
-            )
-        except Exception as e:  # pragma: no cover
-            raise ProviderError(str(e))
-
+    def _decode(self, resp: Any, tw: int, th: int) -> GenerateResult:
         # Decode base64 image
         try:
             b64 = resp.data[0].b64_json  # type: ignore[attr-defined]
@@ -63,6 +87,44 @@ class OpenAIImagesProvider(BaseProvider):
         except Exception as e:  # pragma: no cover
             raise ProviderError(f"Failed to decode OpenAI image: {e}")
 
-        return GenerateResult(image=img, metadata={"size": target})
+        return GenerateResult(image=img, metadata={"size": {"width": tw, "height": th}})
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        client = self._sync_client()
+        # gpt-image-1 only does 1024x1024, 1536x1024 and 1024x1536; keep the requested
+        # orientation so the compositor crops less. Compositor will resize/crop later.
+        tw, th = _closest_supported_size(size)
+
+        # Seed support may vary; include it if available via extra headers/params later
+        try:
+            resp = client.images.generate(model="gpt-image-1", prompt=prompt, size=f"{tw}x{th}")
+        except Exception as e:  # pragma: no cover
+            raise _as_provider_error(e)
+        return self._decode(resp, tw, th)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        # Native async path so generate_images keeps several requests in flight
+        tw, th = _closest_supported_size(size)
 
+        async def call() -> Any:
+            client = self._async_client()
+            try:
+                return await client.images.generate(model="gpt-image-1", prompt=prompt, size=f"{tw}x{th}")
+            except Exception as e:  # pragma: no cover
+                raise _as_provider_error(e)
 
+        return self._decode(await self._http.arun(call()), tw, th)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .base import GenerateResult, ProviderError
+from .firefly import _closest_size as _firefly_size
+from .mock import MockProvider
+from .openai_images import _closest_supported_size as _openai_size
+from ..runscope import current_scope
+
+
+_PROFILES = {"firefly": _firefly_size, "openai": _openai_size}
+
+
+@dataclass(frozen=True)
+class SimConfig:
+    latency: str = "fixed"  # fixed | lognormal | trace
+    latency_s: float = 0.0  # fixed delay, or the median for lognormal
+    sigma: float = 0.6  # lognormal spread; 0.6 gives a p99 around 4x the median
+    trace: str = ""  # file of recorded latencies (seconds), JSON list or one per line
+    error_rate: float = 0.0  # injected 5xx
+    throttle_rate: float = 0.0  # injected 429 with Retry-After
+    retry_after_s: float = 1.0
+    profile: str = ""  # firefly | openai: return that provider's sizes and PNG payloads
+    texture: bool = False  # procedural texture instead of a flat fill (CPU-heavy)
+
+    @classmethod
+    def from_env(cls) -> "SimConfig":
+        def f(name: str, default: float) -> float:
+            try:
+                return float(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+
+        return cls(
+            latency=os.getenv("CAPE_SIM_LATENCY", cls.latency).lower(),
+            latency_s=f("CAPE_SIM_LATENCY_S", cls.latency_s),
+            sigma=f("CAPE_SIM_SIGMA", cls.sigma),
+            trace=os.getenv("CAPE_SIM_TRACE", cls.trace),
+            error_rate=f("CAPE_SIM_ERROR_RATE", cls.error_rate),
+            throttle_rate=f("CAPE_SIM_THROTTLE_RATE", cls.throttle_rate),
+            retry_after_s=f("CAPE_SIM_RETRY_AFTER", cls.retry_after_s),
+            profile=os.getenv("CAPE_SIM_PROFILE", cls.profile).lower(),
+            texture=os.getenv("CAPE_SIM_TEXTURE", "0").lower() in ("1", "true", "yes"),
+        )
+
+
+def _load_trace(path: str) -> List[float]:
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return [float(x) for x in json.loads(text)]
+    return [float(line) for line in text.splitlines() if line.strip()]
+
+
+def _texture(size: Tuple[int, int], seed: int) -> Image.Image:
+    # A few seeded sine gratings plus value noise: real-ish colour spread for compliance
+    # scoring and real entropy for the PNG encoder, at a real CPU cost.
+    w, h = size
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    xx /= w
+    yy /= h
+    out = np.zeros((h, w, 3), dtype=np.float32)
+    for c in range(3):
+        for _ in range(4):
+            fx, fy, phase = rng.uniform(1, 12), rng.uniform(1, 12), rng.uniform(0, 2 * math.pi)
+            out[..., c] += np.sin(2 * math.pi * (fx * xx + fy * yy) + phase)
+    coarse = rng.random((h // 32 + 2, w // 32 + 2, 3), dtype=np.float32)
+    noise = np.asarray(
+        Image.fromarray((coarse * 255).astype(np.uint8)).resize((w, h), Image.BICUBIC), dtype=np.float32
+    )
+    out = (out / 8.0 + 0.5) * 160.0 + noise * 0.35 + rng.normal(0, 6, (h, w, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(out, 0, 255).astype(np.uint8), "RGB")
+
+
+def _key(prompt: str, size: Tuple[int, int], seed: Optional[int]) -> str:
+    return hashlib.sha256(f"{prompt}|{size[0]}x{size[1]}|{seed}".encode("utf-8")).hexdigest()
+
+
+class SimProvider(MockProvider):
+    """MockProvider with provider-like behaviour, for load and soak tests (``--provider sim``).
+
+    Each call draws its latency and injected failures from an RNG keyed on (prompt, size,
+    seed, attempt), so a run replays identically for the same seed while a retry of a
+    failed call still gets a fresh roll; pixels depend on the request alone. Attempt
+    counts live in the run scope, so a cached instance replays each run from attempt 0.
+    Configured via ``CAPE_SIM_*`` env vars.
+    """
+
+    name = "sim"
+    max_concurrency = 8
+
+    def __init__(self, config: Optional[SimConfig] = None) -> None:
+        super().__init__()
+        self.config = config or SimConfig.from_env()
+        self._trace = _load_trace(self.config.trace) if self.config.latency == "trace" and self.config.trace else []
+        self._lock = threading.Lock()
+
+    def _rng(self, key: str) -> random.Random:
+        attempts: Dict[str, int] = current_scope().get(f"sim_attempts:{id(self)}", dict)
+        with self._lock:
+            attempt = attempts.get(key, 0)
+            attempts[key] = attempt + 1
+        return random.Random(f"{key}:{attempt}")
+
+    def _delay(self, rnd: random.Random) -> float:
+        cfg = self.config
+        if cfg.latency == "lognormal" and cfg.latency_s > 0:
+            return rnd.lognormvariate(math.log(cfg.latency_s), cfg.sigma)
+        if cfg.latency == "trace" and self._trace:
+            return self._trace[rnd.randrange(len(self._trace))]
+        return cfg.latency_s
+
+    def _fault(self, rnd: random.Random) -> Optional[ProviderError]:
+        roll = rnd.random()
+        if roll < self.config.throttle_rate:
+            return ProviderError("sim: injected 429", status=429, retry_after=self.config.retry_after_s)
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return ProviderError("sim: injected 503", status=503)
+        return None
+
+    def _render(self, prompt: str, size: Tuple[int, int], seed: Optional[int], key: str) -> GenerateResult:
+        cfg = self.config
+        out_size = _PROFILES[cfg.profile](size) if cfg.profile in _PROFILES else size
+        if cfg.texture:
+            # Pixels depend on the request only, never on which attempt succeeded
+            img = _texture(out_size, int(key[:8], 16))
+            ImageDraw.Draw(img).multiline_text(
+                (24, 24), f"{prompt[:60]}\nseed={seed}", fill=(255, 255, 255), font=self.font, spacing=6
+            )
+            res = GenerateResult(image=img, metadata={"provider": self.name, "seed": seed, "prompt": prompt})
+        else:
+            res = super().generate_image(prompt, out_size, seed=seed)
+        res.metadata["provider"] = self.name
+        res.metadata["size"] = {"width": out_size[0], "height": out_size[1]}
+        if cfg.profile in _PROFILES:
+            # Real adapters download and decode a PNG; pay the same bytes and decode cost
+            buf = io.BytesIO()
+            res.image.save(buf, format="PNG")
+            res.metadata["payload_bytes"] = buf.tell()
+            buf.seek(0)
+            res.image = Image.open(buf).convert("RGB")
+        return res
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        key = _key(prompt, size, seed)
+        rnd = self._rng(key)
+        delay, fault = self._delay(rnd), self._fault(rnd)
+        if delay > 0:
+            time.sleep(delay)
+        if fault is not None:
+            raise fault
+        res = self._render(prompt, size, seed, key)
+        res.metadata["sim_latency_s"] = round(delay, 4)
+        return res
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        # Latency overlaps like real network I/O; pixels are drawn inline because the
+        # shared FreeType font is not meant to be used from several threads
+        key = _key(prompt, size, seed)
+        rnd = self._rng(key)
+        delay, fault = self._delay(rnd), self._fault(rnd)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fault is not None:
+            raise fault
+        res = self._render(prompt, size, seed, key)
+        res.metadata["sim_latency_s"] = round(delay, 4)
+        return res
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+
+from .adapters.base import BaseProvider, GenerateRequest, GenerateResult, ProviderError
+from .ratelimit import config_from_mapping
+
+
+log = structlog.get_logger()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class BreakerConfig:
+    failure_threshold: int = 3  # consecutive failures before the circuit opens
+    latency_slo_s: float = 90.0  # a successful call slower than this still counts as a failure
+    cooldown_s: float = 30.0  # how long an open circuit waits before letting a probe through
+    half_open_probes: int = 1
+
+    @classmethod
+    def from_rules(cls, rules: Optional[Dict], provider_name: str) -> "BreakerConfig":
+        """Read ``providers.default.breaker`` then ``providers.<name>.breaker`` from brand rules."""
+        section = (rules or {}).get("providers", {}) or {}
+        merged = {
+            **((section.get("default") or {}).get("breaker") or {}),
+            **((section.get(provider_name) or {}).get("breaker") or {}),
+        }
+        return config_from_mapping(cls, merged)
+
+
+class CircuitOpenError(ProviderError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} circuit open", retry_after=retry_in, retryable=False)
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` bad calls in a row; open -> half-open
+    after ``cooldown_s``; one good probe closes it again, a bad one re-opens it."""
+
+    def __init__(self, name: str, config: BreakerConfig) -> None:
+        self.name = name
+        self.config = config
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.last_error: Optional[str] = None
+        self.last_latency_s: Optional[float] = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.config.cooldown_s - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_in() > 0:
+                    return False
+                self.state, self.probes = HALF_OPEN, 0
+            if self.state == HALF_OPEN:
+                if self.probes >= self.config.half_open_probes:
+                    return False
+                self.probes += 1
+            return True
+
+    def abandon(self) -> None:
+        """A call let through by allow() ended without a verdict (cancelled): hand its
+        probe slot back, or a half-open circuit would refuse every call from now on."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == OPEN and self.retry_in() > 0
+
+    def record_success(self, latency_s: float) -> None:
+        if latency_s > self.config.latency_slo_s:
+            self.record_failure(f"latency {latency_s:.1f}s over SLO {self.config.latency_slo_s:.0f}s", latency_s)
+            return
+        with self._lock:
+            self.last_latency_s = latency_s
+            self.failures = 0
+            if self.state != CLOSED:
+                log.info("circuit_closed", provider=self.name)
+            self.state = CLOSED
+
+    def record_failure(self, reason: str, latency_s: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            if latency_s is not None:
+                self.last_latency_s = latency_s
+            if self.state == HALF_OPEN or self.failures >= self.config.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    log.warning("circuit_open", provider=self.name, failures=self.failures, reason=reason)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.state
+            if state == OPEN and self.retry_in() <= 0:
+                state = HALF_OPEN  # next call will probe
+            return {
+                "state": state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "retry_in_s": round(self.retry_in(), 1) if state == OPEN else 0.0,
+                "last_error": self.last_error,
+                "last_latency_s": None if self.last_latency_s is None else round(self.last_latency_s, 3),
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(name: str, config: BreakerConfig) -> CircuitBreaker:
+    # One breaker per provider per process, so every brief/run sees the same health
+    with _BREAKERS_LOCK:
+        cur = _BREAKERS.get(name)
+        if cur is None or cur.config != config:
+            cur = _BREAKERS[name] = CircuitBreaker(name, config)
+        return cur
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+class CircuitBreakerProvider(BaseProvider):
+    """Fail fast while a provider's circuit is open instead of waiting out its timeout.
+
+    Wraps the rate-limited provider, so one "call" here is the whole retry sequence: a
+    provider that is still throttling after its retries counts as a failure. Limiter
+    wait and backoff are taken out of the latency before it is checked against the SLO.
+    """
+
+    def __init__(self, inner: BaseProvider, config: Optional[BreakerConfig] = None) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.max_concurrency = inner.max_concurrency
+        self.breaker = breaker_for(inner.name, config or BreakerConfig())
+
+    def health_check(self) -> bool:
+        return not self.breaker.is_open() and self.inner.health_check()
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _admit(self) -> float:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+        return time.monotonic()
+
+    def _done(self, t0: float, res: GenerateResult) -> GenerateResult:
+        waited_ms = float(res.metadata.get("limiter_wait_ms", 0.0)) + float(res.metadata.get("backoff_ms", 0.0))
+        self.breaker.record_success(max(0.0, time.monotonic() - t0 - waited_ms / 1000.0))
+        return res
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        t0 = self._admit()
+        try:
+            res = self.inner.generate_image(
+                prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+            )
+        except Exception as e:
+            self.breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        except BaseException:
+            # Cancelled (e.g. the losing side of a hedge) or interrupted: no verdict
+            self.breaker.abandon()
+            raise
+        return self._done(t0, res)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        t0 = self._admit()
+        try:
+            res = await self.inner.agenerate_image(
+                prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+            )
+        except Exception as e:
+            self.breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        except BaseException:
+            # Cancelled (e.g. the losing side of a hedge) or interrupted: no verdict
+            self.breaker.abandon()
+            raise
+        return self._done(t0, res)
+
+
+class FailoverProvider(BaseProvider):
+    """Try each provider in order (Firefly -> OpenAI -> Mock) until one succeeds.
+
+    Results say which provider actually produced them (``metadata["provider"]``) and
+    which were skipped on the way (``metadata["failover_from"]``).
+    """
+
+    def __init__(self, chain: List[BaseProvider]) -> None:
+        if not chain:
+            raise ValueError("FailoverProvider needs at least one provider")
+        self.chain = chain
+        self.name = chain[0].name
+        self.max_concurrency = chain[0].max_concurrency
+
+    def health_check(self) -> bool:
+        return any(p.health_check() for p in self.chain)
+
+    def close(self) -> None:
+        for p in self.chain:
+            p.close()
+
+    @staticmethod
+    def _tag(res: GenerateResult, p: BaseProvider, skipped: List[str]) -> GenerateResult:
+        meta = {**res.metadata, "provider": res.metadata.get("provider", p.name)}
+        if skipped:
+            meta["failover_from"] = skipped
+        return GenerateResult(image=res.image, metadata=meta)
+
+    def _skip(self, p: BaseProvider, e: ProviderError, skipped: List[str]) -> None:
+        skipped.append(p.name)
+        if not isinstance(e, CircuitOpenError):
+            log.warning("provider_failover", provider=p.name, error=str(e))
+
+    def _order(self) -> List[BaseProvider]:
+        # Routing policies override this; the last entry is the provider of last resort
+        return self.chain
+
+    def _call(self, p: BaseProvider, req: GenerateRequest) -> GenerateResult:
+        return p.generate_image(
+            prompt=req.prompt, size=req.size, seed=req.seed, style_ref=req.style_ref, negative_prompt=req.negative_prompt
+        )
+
+    async def _acall(self, p: BaseProvider, req: GenerateRequest) -> GenerateResult:
+        return await p.agenerate_image(
+            prompt=req.prompt, size=req.size, seed=req.seed, style_ref=req.style_ref, negative_prompt=req.negative_prompt
+        )
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        req = GenerateRequest(prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt)
+        order = self._order()
+        skipped: List[str] = []
+        for p in order[:-1]:
+            try:
+                res = self._call(p, req)
+            except ProviderError as e:
+                self._skip(p, e, skipped)
+                continue
+            return self._tag(res, p, skipped)
+        return self._tag(self._call(order[-1], req), order[-1], skipped)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        req = GenerateRequest(prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt)
+        order = self._order()
+        skipped: List[str] = []
+        for p in order[:-1]:
+            try:
+                res = await self._acall(p, req)
+            except ProviderError as e:
+                self._skip(p, e, skipped)
+                continue
+            return self._tag(res, p, skipped)
+        return self._tag(await self._acall(order[-1], req), order[-1], skipped)
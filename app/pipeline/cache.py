@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from .adapters.base import BaseProvider, GenerateResult
+
+
+DEFAULT_CACHE_DIR = Path(".cache") / "generations"
+DEFAULT_CACHE_MB = 2048
+# Metadata describing one provider call rather than the image; not cached
+PER_CALL_METADATA = frozenset({"limiter_wait_ms", "backoff_ms", "retries", "failover_from", "hedged", "hedge_won"})
+
+
+def generation_key(
+    provider: str,
+    prompt: str,
+    size: Tuple[int, int],
+    seed: Optional[int],
+    negative_prompt: Optional[str] = None,
+    style_ref: Optional[bytes] = None,
+) -> str:
+    payload = {
+        "provider": provider,
+        "prompt": prompt,
+        "size": [int(size[0]), int(size[1])],
+        "seed": seed,
+        "negative_prompt": negative_prompt,
+        "style_ref": hashlib.sha256(style_ref).hexdigest() if style_ref else None,
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class GenerationCache:
+    """Content-addressed store of decoded provider heroes.
+
+    Layout is ``<root>/<key[:2]>/<key>.png`` plus a ``.json`` with the provider metadata.
+    File mtime doubles as the LRU clock: hits touch the file, eviction drops the oldest
+    until the total is under ``max_bytes``. Writes go through a temp file + rename so
+    the CLI, orchestrator and Explorer can share one directory.
+    """
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        d = self.root / key[:2]
+        return d / f"{key}.png", d / f"{key}.json"
+
+    def get(self, key: str) -> Optional[GenerateResult]:
+        img_path, meta_path = self._paths(key)
+        try:
+            with Image.open(img_path) as im:
+                im.load()
+                img = im.copy()
+            meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(img_path)
+        except OSError:
+            pass
+        return GenerateResult(image=img, metadata=meta)
+
+    def put(self, key: str, result: GenerateResult) -> None:
+        img_path, meta_path = self._paths(key)
+        img_path.parent.mkdir(parents=True, exist_ok=True)
+        tag = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_img = img_path.with_name(f"{img_path.name}.{tag}")
+        tmp_meta = meta_path.with_name(f"{meta_path.name}.{tag}")
+        try:
+            result.image.save(tmp_img, format="PNG")
+            tmp_meta.write_text(json.dumps(result.metadata, default=str, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_meta, meta_path)
+            os.replace(tmp_img, img_path)
+        except OSError:
+            # Cache is best-effort; a full disk should not fail the run
+            for t in (tmp_img, tmp_meta):
+                t.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total += img_path.stat().st_size
+        self._evict()
+
+    def _scan(self) -> list[Tuple[float, int, Path]]:
+        entries = []
+        for p in self.root.glob("*/*.png"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._total is not None and self._total <= self.max_bytes:
+                return
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                entries.sort()
+                for _, size, p in entries:
+                    if total <= self.max_bytes:
+                        break
+                    p.unlink(missing_ok=True)
+                    p.with_suffix(".json").unlink(missing_ok=True)
+                    total -= size
+            self._total = total
+
+
+def default_cache() -> Optional[GenerationCache]:
+    if os.getenv("CAPE_GEN_CACHE", "1").lower() in ("0", "false", "off"):
+        return None
+    root = Path(os.getenv("CAPE_GEN_CACHE_DIR", str(DEFAULT_CACHE_DIR)))
+    try:
+        max_mb = int(os.getenv("CAPE_GEN_CACHE_MB", str(DEFAULT_CACHE_MB)))
+    except ValueError:
+        max_mb = DEFAULT_CACHE_MB
+    return GenerationCache(root, max_bytes=max_mb * 1024 * 1024)
+
+
+class CachedProvider(BaseProvider):
+    """Serve repeat generations from a GenerationCache, otherwise call through."""
+
+    def __init__(self, inner: BaseProvider, cache: GenerationCache) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+        self.max_concurrency = inner.max_concurrency
+
+    def health_check(self) -> bool:
+        return self.inner.health_check()
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        key = generation_key(self.inner.name, prompt, size, seed, negative_prompt, style_ref)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return GenerateResult(image=hit.image, metadata={**hit.metadata, "cache": "hit"})
+        res = self.inner.generate_image(
+            prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+        )
+        return self._store(key, res)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        key = generation_key(self.inner.name, prompt, size, seed, negative_prompt, style_ref)
+        # PNG decode/encode and disk I/O; keep them off the event loop so other fetches overlap
+        hit = await asyncio.to_thread(self.cache.get, key)
+        if hit is not None:
+            return GenerateResult(image=hit.image, metadata={**hit.metadata, "cache": "hit"})
+        res = await self.inner.agenerate_image(
+            prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+        )
+        return await asyncio.to_thread(self._store, key, res)
+
+    def _store(self, key: str, res: GenerateResult) -> GenerateResult:
+        # What it took to make this one (waits, retries, failovers) is not part of the image;
+        # replaying it on every hit would count the first call's quota use again
+        kept = {k: v for k, v in res.metadata.items() if k not in PER_CALL_METADATA}
+        self.cache.put(key, GenerateResult(image=res.image, metadata=kept))
+        meta: Dict[str, Any] = {**res.metadata, "cache": "miss"}
+        return GenerateResult(image=res.image, metadata=meta)
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from __future__ import annotations
-
 import json
 from colorsys import rgb_to_hsv
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from PIL import Image
 
 from app.models import Brief
@@ -17,72 +17,152 @@ def _hex_to_rgb(hex_str: str) -> Tuple[int, int, int]:
     return tuple(int(s[i : i + 2], 16) for i in (0, 2, 4))  # type: ignore[return-value]
 
 
-def _pct_primary_coverage(img: Image.Image, primary_hex: str, tol: Dict[str, float]) -> float:
-    # Downscale for speed
-    small = img.convert("RGB").resize((min(200, img.width), int(img.height * (min(200, img.width) / img.width))), Image.BILINEAR)
-    # heads-up: HSV buckets are a little blunt — gradients can slip thru
-    target_rgb = _hex_to_rgb(primary_hex)
-    tr, tg, tb = target_rgb
+def _rgb_to_hsv_array(rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized colorsys.rgb_to_hsv over an (..., 3) uint8 array.
+
+    Same branch order as colorsys (red, then green, then blue as max channel), so values
+    agree with the scalar version to float64 precision. Hue is returned in degrees.
+    """
+    x = rgb.astype(np.float64) / 255.0
+    r, g, b = x[..., 0], x[..., 1], x[..., 2]
+    maxc = x.max(axis=-1)
+    minc = x.min(axis=-1)
+    delta = maxc - minc
+    grey = delta == 0
+    safe_delta = np.where(grey, 1.0, delta)
+    s = np.where(maxc > 0, delta / np.where(maxc > 0, maxc, 1.0), 0.0)
+    rc = (maxc - r) / safe_delta
+    gc = (maxc - g) / safe_delta
+    bc = (maxc - b) / safe_delta
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(grey, 0.0, (h / 6.0) % 1.0)
+    return h * 360.0, s, maxc
+
+
+def _pct_primary_coverage(
+    img: Image.Image,
+    primary_hex: str,
+    tol: Dict[str, float],
+    full_res: bool = False,
+    feather: float = 0.0,
+) -> float:
+    """Percent of pixels within the HSV tolerance window around the primary colour.
+
+    ``feather`` softens the window edge: a pixel that misses by up to ``feather`` times
+    the tolerance on any axis still counts, linearly less the further out it is. With
+    ``feather=0`` (the default) this is exactly the old hard mask; brands opt in with
+    ``brand.hsv_feather``. A feather can only raise the result, by at most the share of
+    pixels sitting in that outer band, which is where shaded gradients of the brand
+    colour used to fall out of the count.
+    """
+    if full_res:
+        small = img.convert("RGB")
+    else:
+        # Downscale for speed
+        small = img.convert("RGB").resize((min(200, img.width), int(img.height * (min(200, img.width) / img.width))), Image.BILINEAR)
+    tr, tg, tb = _hex_to_rgb(primary_hex)
     th, ts, tv = rgb_to_hsv(tr / 255.0, tg / 255.0, tb / 255.0)
     th = th * 360.0
     htol = float(tol.get("h", 10))
     stol = float(tol.get("s", 35)) / 100.0
     vtol = float(tol.get("v", 35)) / 100.0
 
-    def in_tol(r: int, g: int, b: int) -> bool:
-        h, s, v = rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
-        h = h * 360.0
-        # Hue wrap-around
-        dh = min(abs(h - th), 360.0 - abs(h - th))
-        return (dh <= htol) and (abs(s - ts) <= stol) and (abs(v - tv) <= vtol)
+    h, s, v = _rgb_to_hsv_array(np.asarray(small))
+    # Hue wrap-around
+    dh = np.abs(h - th)
+    dh = np.minimum(dh, 360.0 - dh)
+    ds = np.abs(s - ts)
+    dv = np.abs(v - tv)
+    if feather <= 0:
+        mask = (dh <= htol) & (ds <= stol) & (dv <= vtol)
+        return float(mask.mean() * 100.0) if mask.size else 0.0
 
-    pixels = list(small.getdata())
-    matches = sum(1 for (r, g, b) in pixels if in_tol(r, g, b))
-    return (matches / max(1, len(pixels))) * 100.0
+    def weight(d: np.ndarray, t: float) -> np.ndarray:
+        # 1 inside the window, ramps to 0 at (1 + feather) * t
+        band = max(t * feather, 1e-9)
+        return np.clip(1.0 - (d - t) / band, 0.0, 1.0)
 
+    w = np.minimum(np.minimum(weight(dh, htol), weight(ds, stol)), weight(dv, vtol))
+    return float(w.mean() * 100.0) if w.size else 0.0
 
-def score_compliance(brief: Brief, brand_rules: Dict, reporter) -> Dict[str, float]:
-    brand_cfg = brand_rules.get("brand", {})
-    logo_min = float(brand_cfg.get("logo_area_pct_min", 3))
-    logo_max = float(brand_cfg.get("logo_area_pct_max", 6))
-    primary_hex = brand_cfg.get("primary_hex", "#000000")
-    hsv_tol = brand_cfg.get("hsv_tolerance", {"h": 10, "s": 35, "v": 35})
 
-    per_variant_scores: List[float] = []
-    for v in getattr(reporter, "variants", []):
-        # Load provenance
-        prov_path = Path(str(v.path_post) + ".prov.json")
-        logo_pct = None
-        if prov_path.exists():
-            try:
-                prov = json.loads(prov_path.read_text(encoding="utf-8"))
-                logo_pct = prov.get("logo_area_pct")
-            except Exception:
-                pass
-
-        score = 100.0
-        if logo_pct is not None:
-            if logo_pct < logo_min:
-                score -= min(20.0, (logo_min - logo_pct) * 4)
-            if logo_pct > logo_max:
-                score -= min(20.0, (logo_pct - logo_max) * 4)
-
-        # Primary color coverage heuristic
+@dataclass(frozen=True)
+class ComplianceConfig:
+    logo_min: float
+    logo_max: float
+    primary_hex: str
+    hsv_tol: Dict[str, float]
+    hsv_feather: float
+    full_res: bool
+
+
+def compliance_config(brand_rules: Dict) -> ComplianceConfig:
+    brand_cfg = brand_rules.get("brand", {})
+    return ComplianceConfig(
+        logo_min=float(brand_cfg.get("logo_area_pct_min", 3)),
+        logo_max=float(brand_cfg.get("logo_area_pct_max", 6)),
+        primary_hex=brand_cfg.get("primary_hex", "#000000"),
+        hsv_tol=dict(brand_cfg.get("hsv_tolerance", {"h": 10, "s": 35, "v": 35})),
+        hsv_feather=float(brand_cfg.get("hsv_feather", 0.0)),
+        full_res=bool(brand_rules.get("compliance", {}).get("full_resolution", False)),
+    )
+
+
+def score_variant(img: Optional[Image.Image], logo_pct: Optional[float], cfg: ComplianceConfig) -> float:
+    """Score one post (0-100) from its pixels and logo area; img=None skips the palette check."""
+    score = 100.0
+    if logo_pct is not None:
+        if logo_pct < cfg.logo_min:
+            score -= min(20.0, (cfg.logo_min - logo_pct) * 4)
+        if logo_pct > cfg.logo_max:
+            score -= min(20.0, (logo_pct - cfg.logo_max) * 4)
+
+    # Primary color coverage heuristic
+    if img is not None:
         try:
-            with Image.open(v.path_post) as im:
-                pct = _pct_primary_coverage(im, primary_hex, hsv_tol)
+            pct = _pct_primary_coverage(img, cfg.primary_hex, cfg.hsv_tol, full_res=cfg.full_res, feather=cfg.hsv_feather)
             # Penalize if primary color coverage extremely low (<3%)
             if pct < 3.0:
                 score -= 10.0
         except Exception:
             pass
+    return max(0.0, min(100.0, score))
+
+
+def _score_from_disk(path_post: str, cfg: ComplianceConfig) -> float:
+    # Post-hoc path: re-read the sidecar and PNG. Used for old runs or when the
+    # compositor was asked not to score inline.
+    prov_path = Path(str(path_post) + ".prov.json")
+    logo_pct = None
+    if prov_path.exists():
+        try:
+            prov = json.loads(prov_path.read_text(encoding="utf-8"))
+            logo_pct = prov.get("logo_area_pct")
+        except Exception:
+            pass
+    try:
+        with Image.open(path_post) as im:
+            return score_variant(im, logo_pct, cfg)
+    except Exception:
+        return score_variant(None, logo_pct, cfg)
+
+
+def score_compliance(brief: Optional[Brief], brand_rules: Dict, reporter, rescore: bool = False) -> Dict[str, float]:
+    """Summarize per-variant compliance into avg/min on the reporter.
 
-        per_variant_scores.append(max(0.0, min(100.0, score)))
+    Variants scored inline by compose_variants keep their score unless ``rescore`` is set,
+    in which case every post is re-read from disk (e.g. after changing brand rules).
+    """
+    cfg = compliance_config(brand_rules)
+
+    per_variant_scores: List[float] = []
+    for v in getattr(reporter, "variants", []):
+        if v.compliance_score is None or rescore:
+            v.compliance_score = _score_from_disk(v.path_post, cfg)
+        per_variant_scores.append(v.compliance_score)
 
     avg = sum(per_variant_scores) / max(1, len(per_variant_scores))
     mn = min(per_variant_scores) if per_variant_scores else 0.0
     summary = {"avg": round(avg, 2), "min": round(mn, 2)}
     reporter.set_compliance(summary)
     return summary
-
-
@@ -1,46 +1,87 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
 from dataclasses import dataclass
+from functools import lru_cache, partial
+import hashlib
+import json
+import multiprocessing
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 from app.models import Brief, Product, VariantResult
-from .adapters.base import BaseProvider
+from .adapters.base import BaseProvider, GenerateRequest, ProviderError
+from .cache import PER_CALL_METADATA
+from .compliance import ComplianceConfig, compliance_config, score_variant
 from .generator import build_prompt
+from .legal import scan_variant
+from .incremental import BuildManifest
+from .journal import RunJournal, sha256_file, variant_key
+from .runscope import run_scope
+from .encoders import Encoder, output_encoders
+from .stages import ImageBudget, OrderedSink, PipelineAborted, WriterPool, inflight_limit, stage_stats
 from .utils import write_json
 
 
+# Bump when a rendering change should invalidate every --incremental build manifest
+_RENDER_VERSION = 2
+# Env vars that change pixels or copy (prompt hints, overlay/UI overrides, simulated provider)
+_OUTPUT_ENV_PREFIXES = ("CAPE_UI_", "CAPE_OVERLAY_", "CAPE_EXTRA_", "CAPE_SIM_")
+
+# legacy: <campaign>/<product>/<ratio>/post.png, shared by every locale and variant
+# (the last one written wins); sharded: one hash-sharded folder per variant
+OUTPUT_LAYOUTS = ("legacy", "sharded")
+# Background file writes: threads, and how many finished variants may wait for them
+_WRITE_THREADS = 2
+_MAX_PENDING_WRITES = 8
+
 RATIO_TO_SIZE: Dict[str, Tuple[int, int]] = {
     "1:1": (1024, 1024),
     "9:16": (1080, 1920),
     "16:9": (1920, 1080),
 }
 
+def _master_size(ratios: Iterable[str]) -> Tuple[int, int]:
+    # Smallest canvas every requested ratio can be cover-cropped from without upscaling:
+    # for 9:16 + 16:9 that is 1920x1920.
+    sizes = [RATIO_TO_SIZE[r] for r in ratios if r in RATIO_TO_SIZE] or [RATIO_TO_SIZE["1:1"]]
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
 def _ratio_dirname(ratio: str) -> str:
     # Filesystem-safe directory name for aspect ratios (Windows disallows ':')
     # could cache this, but not worth the mental overhead honestly
     return ratio.replace(":", "x")
 
 
-def _relative_luminance(rgb: Tuple[int, int, int]) -> float:
-    # sRGB to relative luminance
-    def channel(c: int) -> float:
-        v = c / 255.0
-        return v / 12.92 if v <= 0.03928 else ((v + 0.055) / 1.055) ** 2.4
-
-    r, g, b = rgb
-    return 0.2126 * channel(r) + 0.7152 * channel(g) + 0.0722 * channel(b)
+# sRGB channel value -> linear light, for WCAG relative luminance
+_SRGB_TO_LINEAR = np.array(
+    [v / 12.92 if v <= 0.03928 else ((v + 0.055) / 1.055) ** 2.4 for v in (i / 255.0 for i in range(256))],
+    dtype=np.float32,
+)
+_LUMA = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+# Text colour is judged against the brightest/darkest few percent under the text, not
+# the average: a light sky behind half a headline still breaks white text
+_CONTRAST_PERCENTILE = 5.0
 
 
-def _contrast_ratio(c1: Tuple[int, int, int], c2: Tuple[int, int, int]) -> float:
-    l1 = _relative_luminance(c1)
-    l2 = _relative_luminance(c2)
-    lighter = max(l1, l2)
-    darker = min(l1, l2)
-    return (lighter + 0.05) / (darker + 0.05)
+def _luminance_range(region: Image.Image) -> Tuple[float, float]:
+    """Low/high percentile of relative luminance over a region (black if it is empty)."""
+    rgb = np.asarray(region.convert("RGB"))
+    if rgb.size == 0:
+        return 0.0, 0.0
+    lum = _SRGB_TO_LINEAR[rgb] @ _LUMA
+    lo, hi = np.percentile(lum, (_CONTRAST_PERCENTILE, 100.0 - _CONTRAST_PERCENTILE))
+    return float(lo), float(hi)
 
 
 def _compute_logo_size(canvas: Tuple[int, int], logo_img: Image.Image, area_pct: float) -> Tuple[int, int]:
@@ -62,64 +103,451 @@ def _cover_resize(img: Image.Image, target_size: Tuple[int, int]) -> Image.Image
     return resized.crop((left, top, left + tw, top + th))
 
 
-def _draw_text_block(
-    canvas: Image.Image,
-    text_lines: List[str],
-    font: ImageFont.FreeTypeFont,
-    min_contrast: float,
-    padding: int = 32,
-) -> None:
-    draw = ImageDraw.Draw(canvas, "RGBA")
-    # yep this is a bit naive but gets decent placements without getting fancy
-    # Measure text block
-    widths: List[int] = []
-    heights: List[int] = []
-    for line in text_lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        widths.append(bbox[2] - bbox[0])
-        heights.append(bbox[3] - bbox[1])
-    text_w = max(widths) if widths else 0
-    text_h = sum(heights) + (len(text_lines) - 1) * 8
-
-    x = padding
-    y = canvas.height - padding - text_h - 16
-
-    # Sample background under text area to estimate contrast
-    crop = canvas.crop((x, y, min(canvas.width - padding, x + text_w + 16), y + text_h + 16)).convert("RGB")
-    pixels = list(crop.getdata()) or [(0, 0, 0)]
-    avg = tuple(int(sum(channel) / len(channel)) for channel in zip(*pixels))
-    white = (255, 255, 255)
-    black = (0, 0, 0)
-    white_ratio = _contrast_ratio(white, avg)
-    black_ratio = _contrast_ratio(black, avg)
-    text_color = white if white_ratio >= black_ratio else black
-    best_ratio = max(white_ratio, black_ratio)
-    if best_ratio < min_contrast:
-        # Draw translucent dark backdrop to lift contrast and use white text
-        draw.rectangle((x - 12, y - 12, x + text_w + 24, y + text_h + 24), fill=(0, 0, 0, 180))
-        text_color = white
-    # Draw lines
-    line_y = y
-    for line in text_lines:
-        draw.text((x, line_y), line, fill=text_color, font=font)
-        bbox = draw.textbbox((0, 0), line, font=font)
-        line_h = bbox[3] - bbox[1]
-        line_y += line_h + 8
+Box = Tuple[int, int, int, int]
+
 
+@dataclass(frozen=True)
+class _OverlayPlan:
+    """Where one layout's text and backdrop go on the post.
 
-def _measure_text_block(canvas: Image.Image, text_lines: List[str], font: ImageFont.FreeTypeFont) -> Tuple[int, int, List[int]]:
-    draw = ImageDraw.Draw(canvas)
+    The same for every hero with this canvas size, copy, font and overlay style, so
+    the text is measured and rasterized (into a coverage mask) once per layout, not
+    once per variant.
+    """
+
+    text_origin: Tuple[int, int]  # top-left of the text mask on the post
+    text_size: Tuple[int, int]
+    lines: Tuple[Tuple[int, int, str], ...]  # (x, y, text), relative to text_origin
+    # strip/card backdrop (inclusive box, as ImageDraw takes it); for the banner it is
+    # only drawn when neither black nor white text is legible over the hero
+    backdrop: Box
+    rounded: bool = False
+    banner: bool = False
+    sample_box: Optional[Box] = None  # banner: region whose colours pick the text colour
+
+
+def _text_metrics(lines: Tuple[str, ...], font: ImageFont.FreeTypeFont) -> Tuple[int, int, List[int]]:
+    draw = ImageDraw.Draw(Image.new("L", (1, 1)))
     widths: List[int] = []
     heights: List[int] = []
-    for line in text_lines:
+    for line in lines:
         bbox = draw.textbbox((0, 0), line, font=font)
         widths.append(bbox[2] - bbox[0])
         heights.append(bbox[3] - bbox[1])
     text_w = max(widths) if widths else 0
-    text_h = sum(heights) + (len(text_lines) - 1) * 8
+    text_h = sum(heights) + (len(lines) - 1) * 8
     return text_w, text_h, heights
 
 
+@lru_cache(maxsize=512)
+def _overlay_plan(lines: Tuple[str, ...], font_path: str, font_size: int, size: Tuple[int, int], style: str) -> _OverlayPlan:
+    font = _load_font(font_path, font_size)
+    width, height = size
+    text_w, text_h, heights = _text_metrics(lines, font)
+    sample_box = None
+    if style == "bottom-strip":
+        # Semi-transparent strip across the bottom with white text
+        padding = 24
+        strip_h = text_h + 2 * padding
+        backdrop = (0, height - strip_h, width, height)
+        text_x, line_y = padding, height - strip_h + padding
+    elif style == "center-card":
+        # Rounded card centered with white text
+        padding = 24
+        card_w = min(width - 2 * padding, text_w + 2 * padding + 24)
+        card_h = text_h + 2 * padding
+        x = (width - card_w) // 2
+        y = (height - card_h) // 2
+        backdrop = (x, y, x + card_w, y + card_h)
+        text_x, line_y = x + padding, y + padding
+    else:
+        # Default banner-style that adapts to contrast
+        # yep this is a bit naive but gets decent placements without getting fancy
+        padding = 32
+        text_x = padding
+        line_y = height - padding - text_h - 16
+        sample_box = (text_x, line_y, min(width - padding, text_x + text_w + 16), line_y + text_h + 16)
+        backdrop = (text_x - 12, line_y - 12, text_x + text_w + 24, line_y + text_h + 24)
+
+    placed: List[Tuple[int, int, str]] = []
+    draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+    # The mask spans every inked pixel (glyphs can overhang their advance box)
+    x0, y0, x1, y1 = width, height, 0, 0
+    for i, line in enumerate(lines):
+        placed.append((text_x, line_y, line))
+        bx0, by0, bx1, by1 = draw.textbbox((text_x, line_y), line, font=font)
+        x0, y0, x1, y1 = min(x0, bx0 - 2), min(y0, by0 - 2), max(x1, bx1 + 2), max(y1, by1 + 2)
+        line_y += (heights[i] if i < len(heights) else 32) + 8
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = max(x0 + 1, min(width, x1)), max(y0 + 1, min(height, y1))
+    return _OverlayPlan(
+        text_origin=(x0, y0),
+        text_size=(x1 - x0, y1 - y0),
+        lines=tuple((x - x0, y - y0, t) for x, y, t in placed),
+        backdrop=backdrop,
+        rounded=style == "center-card",
+        banner=sample_box is not None,
+        sample_box=sample_box,
+    )
+
+
+def _text_mask(plan: _OverlayPlan, font: ImageFont.FreeTypeFont) -> Image.Image:
+    # Glyph coverage; pasting a colour through it is what ImageDraw.text does per line
+    mask = Image.new("L", plan.text_size, 0)
+    draw = ImageDraw.Draw(mask)
+    for x, y, line in plan.lines:
+        draw.text((x, y), line, fill=255, font=font)
+    return mask
+
+
+def _backdrop_mask(plan: _OverlayPlan) -> Image.Image:
+    x0, y0, x1, y1 = plan.backdrop
+    mask = Image.new("L", (x1 - x0 + 1, y1 - y0 + 1), 0)
+    draw = ImageDraw.Draw(mask)
+    shape = (0, 0, x1 - x0, y1 - y0)
+    try:
+        draw.rounded_rectangle(shape, radius=16, fill=255)
+    except Exception:
+        draw.rectangle(shape, fill=255)
+    return mask
+
+
+def _paste_backdrop(post: Image.Image, plan: _OverlayPlan, mask: Optional[Image.Image]) -> None:
+    # ImageDraw on an RGBA image replaces pixels (no blending); so does paste
+    x0, y0, x1, y1 = plan.backdrop
+    if mask is None:
+        box = (max(0, x0), max(0, y0), min(post.width, x1 + 1), min(post.height, y1 + 1))
+        if box[0] < box[2] and box[1] < box[3]:
+            post.paste((0, 0, 0, 180), box)
+    else:
+        post.paste((0, 0, 0, 180), (x0, y0), mask)
+
+
+def _banner_color(post: Image.Image, plan: _OverlayPlan, min_contrast: float) -> Tuple[Tuple[int, int, int], bool, float]:
+    """Text colour for the banner over this hero, whether it needs a dark backdrop, and
+    the worst-case contrast ratio of the text that gets drawn."""
+    assert plan.sample_box is not None
+    lo, hi = _luminance_range(post.crop(plan.sample_box))
+    white_ratio = 1.05 / (hi + 0.05)  # white text vs the brightest background
+    black_ratio = (lo + 0.05) / 0.05  # black text vs the darkest background
+    if max(white_ratio, black_ratio) < min_contrast:
+        # Translucent dark backdrop and white text (the backdrop replaces the pixels)
+        return (255, 255, 255), True, 21.0
+    if white_ratio >= black_ratio:
+        return (255, 255, 255), False, white_ratio
+    return (0, 0, 0), False, black_ratio
+
+
+class _ImageLRU:
+    """Byte-bounded LRU for decoded/resized images, one instance per process."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Any, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        # The orchestrator renders several briefs on threads in one process
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cost(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get_or_create(self, key: Any, factory: Callable[[], Image.Image]) -> Tuple[Image.Image, bool]:
+        with self._lock:
+            img = self._items.get(key)
+            if img is not None:
+                self._items.move_to_end(key)
+                return img, True
+        # Built outside the lock; two threads racing on one key just both decode it
+        img = factory()
+        cost = self._cost(img)
+        with self._lock:
+            if cost <= self.max_bytes and key not in self._items:
+                self._items[key] = img
+                self._bytes += cost
+                while self._bytes > self.max_bytes:
+                    _, old = self._items.popitem(last=False)
+                    self._bytes -= self._cost(old)
+        return img, False
+
+
+def _env_mb(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default))) * 1024 * 1024
+    except ValueError:
+        return default * 1024 * 1024
+
+
+# Sized so a handful of 4K product shots plus their three cover crops stay resident
+_SOURCE_CACHE = _ImageLRU(_env_mb("CAPE_SOURCE_CACHE_MB", 256))
+_COVER_CACHE = _ImageLRU(_env_mb("CAPE_COVER_CACHE_MB", 128))
+_LOGO_CACHE = _ImageLRU(16 * 1024 * 1024)
+# Text/card masks are one byte per pixel of the text block, so hundreds fit
+_OVERLAY_CACHE = _ImageLRU(_env_mb("CAPE_TEXT_CACHE_MB", 64))
+
+
+@dataclass(frozen=True)
+class _OverlaySpec:
+    font_path: str
+    font_size: int
+    logo_path: Optional[str]
+    logo_mtime: float
+    area_pct: float
+    min_contrast: float
+    overlay_style: str
+
+
+@dataclass
+class _RenderJob:
+    product_id: str
+    ratio: str
+    locale: str
+    variant_index: int
+    size: Tuple[int, int]
+    hero_src: Optional[Image.Image]
+    lines: List[str]
+    spec: _OverlaySpec
+    master: Optional[str] = None
+    # base_asset products ship the path instead of pixels; the worker decodes through
+    # its own LRU so a 4K photo is decoded once per process, not once per variant
+    source_path: Optional[str] = None
+    source_mtime: float = 0.0
+    # When set, the worker scores the post while it still has the pixels
+    compliance: Optional[ComplianceConfig] = None
+    # Which provider actually made the hero (differs from the selected one after failover)
+    provider: Optional[str] = None
+    # Hash of everything this variant is built from (build manifest key, sharded folder name)
+    inputs: str = ""
+    hero_encoder: Encoder = Encoder()
+    post_encoder: Encoder = Encoder()
+
+
+@dataclass
+class _Composited:
+    hero: Image.Image
+    post: Image.Image
+    logo_area_pct: float
+    cache_events: Dict[str, int]
+    contrast_ratio: Optional[float] = None  # text vs the worst-case background under it
+
+
+@dataclass
+class _Rendered:
+    hero_data: bytes
+    post_data: bytes
+    logo_area_pct: float
+    cache_events: Dict[str, int]
+    compliance_score: Optional[float] = None
+    hero_sha256: str = ""
+    post_sha256: str = ""
+    encode_s: Tuple[float, float] = (0.0, 0.0)  # hero, post
+    contrast_ratio: Optional[float] = None
+
+
+@lru_cache(maxsize=8)
+def _load_font(font_path: str, font_size: int):
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4)
+def _load_logo(logo_path: str, mtime: float) -> Image.Image:
+    # mtime is part of the key so a re-uploaded logo at the same path is picked up
+    return Image.open(logo_path).convert("RGBA")
+
+
+def _overlay_spec(brand_rules: Dict, overlay_style: str) -> _OverlaySpec:
+    font_path = brand_rules.get("overlay", {}).get("text_font", "assets/fonts/NotoSans-Regular.ttf")
+    # Allow UI to control font size via env; clamp to sane bounds
+    try:
+        env_size = int(os.getenv("CAPE_OVERLAY_FONT_SIZE", "48"))
+        font_size = max(12, min(400, env_size))
+    except Exception:
+        font_size = 48
+    logo_path = brand_rules.get("brand", {}).get("logo_path", "assets/logos/brand_logo.png")
+    has_logo = Path(logo_path).exists()
+    area_pct = (brand_rules.get("brand", {}).get("logo_area_pct_min", 3)
+                + brand_rules.get("brand", {}).get("logo_area_pct_max", 6)) / 2
+    return _OverlaySpec(
+        font_path=font_path,
+        font_size=font_size,
+        logo_path=logo_path if has_logo else None,
+        logo_mtime=Path(logo_path).stat().st_mtime if has_logo else 0.0,
+        area_pct=area_pct,
+        min_contrast=float(brand_rules.get("overlay", {}).get("min_contrast_ratio", 4.5)),
+        overlay_style=overlay_style,
+    )
+
+
+def _composite_variant(job: _RenderJob) -> _Composited:
+    """Cover-resize, overlay and logo for one variant (the compositing stage).
+
+    Runs on a worker thread or inside a worker process, so it only touches its
+    arguments and the per-process font/logo caches.
+    """
+    spec = job.spec
+    size = job.size
+    events: Dict[str, int] = {}
+
+    def note(cache: str, hit: bool) -> None:
+        k = f"{cache}_{'hit' if hit else 'miss'}"
+        events[k] = events.get(k, 0) + 1
+
+    font = _load_font(spec.font_path, spec.font_size)
+    if job.source_path is not None:
+        path, mtime = job.source_path, job.source_mtime
+
+        def decode() -> Image.Image:
+            src, hit = _SOURCE_CACHE.get_or_create((path, mtime), lambda: Image.open(path).convert("RGB"))
+            note("source", hit)
+            return _cover_resize(src, size)
+
+        hero, hit = _COVER_CACHE.get_or_create((path, mtime, size), decode)
+        note("cover", hit)
+    else:
+        hero = _cover_resize(job.hero_src, size)
+
+    # Compose post by adding overlays and logo. Text and backdrop come from masks made
+    # once per layout; only the banner's colour (and backdrop) depends on the hero.
+    post = hero.convert("RGBA")  # a new image; the hero itself is kept as is
+    lines = tuple(job.lines)
+    layout_key = (spec.font_path, spec.font_size, spec.overlay_style, size, lines)
+    plan = _overlay_plan(lines, spec.font_path, spec.font_size, size, spec.overlay_style)
+    # White on the opaque black strip/card: 21:1
+    color, backdrop, contrast = (255, 255, 255), not plan.banner, 21.0
+    if plan.banner:
+        color, backdrop, contrast = _banner_color(post, plan, spec.min_contrast)
+    if backdrop:
+        shape = None
+        if plan.rounded:
+            shape, hit = _OVERLAY_CACHE.get_or_create(layout_key + ("card",), lambda: _backdrop_mask(plan))
+            note("overlay", hit)
+        _paste_backdrop(post, plan, shape)
+    mask, hit = _OVERLAY_CACHE.get_or_create(layout_key + ("text",), lambda: _text_mask(plan, font))
+    note("overlay", hit)
+    post.paste(color + (255,), plan.text_origin, mask)
+
+    logo_area_pct_calc = spec.area_pct
+    if spec.logo_path is not None:
+        logo_img = _load_logo(spec.logo_path, spec.logo_mtime)
+        lw, lh = _compute_logo_size(size, logo_img, spec.area_pct)
+        logo_rs, hit = _LOGO_CACHE.get_or_create(
+            (spec.logo_path, spec.logo_mtime, size, spec.area_pct),
+            lambda: logo_img.resize((lw, lh), Image.LANCZOS),
+        )
+        note("logo", hit)
+        margin = max(16, min(size) // 40)
+        post.alpha_composite(logo_rs, dest=(size[0] - lw - margin, size[1] - lh - margin))
+        logo_area_pct_calc = (lw * lh) / (size[0] * size[1]) * 100.0
+
+    return _Composited(
+        hero=hero,
+        post=post.convert("RGB"),
+        logo_area_pct=logo_area_pct_calc,
+        cache_events=events,
+        contrast_ratio=contrast,
+    )
+
+
+def _finish_variant(job: _RenderJob, comp: _Composited) -> _Rendered:
+    """Compliance scoring and encoding (the encode stage; runs on a thread pool,
+    where Pillow's encoders and the numpy scoring release the GIL)."""
+    score = None
+    if job.compliance is not None:
+        score = score_variant(comp.post, comp.logo_area_pct, job.compliance)
+    t0 = time.perf_counter()
+    hero_data = job.hero_encoder.encode(comp.hero)
+    t1 = time.perf_counter()
+    post_data = job.post_encoder.encode(comp.post)
+    t2 = time.perf_counter()
+    return _Rendered(
+        hero_data=hero_data,
+        post_data=post_data,
+        logo_area_pct=comp.logo_area_pct,
+        cache_events=comp.cache_events,
+        compliance_score=score,
+        hero_sha256=hashlib.sha256(hero_data).hexdigest(),
+        post_sha256=hashlib.sha256(post_data).hexdigest(),
+        encode_s=(t1 - t0, t2 - t1),
+        contrast_ratio=comp.contrast_ratio,
+    )
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # A crash mid-write leaves the old file (or none), never a truncated image
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _render_variant(job: _RenderJob) -> _Rendered:
+    return _finish_variant(job, _composite_variant(job))
+
+
+def _record_generation(reporter, gen: Any, provider: BaseProvider, master_render: bool) -> None:
+    reporter.bump("generation", "provider_calls")
+    if isinstance(gen, ProviderError):
+        reporter.bump("generation", "failed")
+        reporter.bump("provider_limits", "retries", getattr(gen, "retries", 0))
+        return
+    if master_render:
+        reporter.bump("generation", "masters")
+    meta = gen.metadata
+    if "cache" in meta:
+        reporter.bump("generation_cache", meta["cache"])
+    if meta.get("cache") == "hit":
+        # No provider call was made (entries written before per-call fields were
+        # stripped may still carry the original call's numbers)
+        meta = {k: v for k, v in meta.items() if k not in PER_CALL_METADATA}
+    for stat in ("limiter_wait_ms", "backoff_ms", "retries"):
+        if stat in meta:
+            reporter.bump("provider_limits", stat, meta[stat])
+    for skipped in meta.get("failover_from", ()):
+        reporter.bump("failover", skipped)
+    reporter.bump("generation_by_provider", meta.get("provider", provider.name))
+    if meta.get("hedged"):
+        reporter.bump("hedging", "hedges")
+        reporter.bump("hedging", "wins", int(bool(meta.get("hedge_won"))))
+
+
+@dataclass
+class _Hero:
+    """One hero image and the variants cut from it; the unit the image budget counts."""
+
+    request: Optional[GenerateRequest]  # None for base_asset products: nothing to fetch
+    jobs: List[Tuple[int, _RenderJob]]  # (plan position, job)
+    tokens: int = 0
+    left: int = 0
+
+
+@dataclass
+class _Outcome:
+    job: _RenderJob
+    hero: Optional[_Hero]
+    rendered: Optional[_Rendered] = None
+    shortfall: Optional[str] = None
+    # GenerateResult / ProviderError to report, carried by the hero's first variant
+    generation: Any = None
+    # Entry for a variant already on disk: from the run journal ("journal", an earlier
+    # attempt at this run) or the build manifest ("build", unchanged inputs)
+    reused: Optional[Dict[str, Any]] = None
+    reused_from: str = ""
+
+
+class _Tally:
+    """Forwards stat bumps to the reporter and remembers them for the run journal."""
+
+    def __init__(self, reporter) -> None:
+        self.reporter = reporter
+        self.bumps: List[Tuple[str, str, float]] = []
+
+    def bump(self, section: str, key: str, n: float = 1) -> None:
+        self.reporter.bump(section, key, n)
+        self.bumps.append((section, key, n))
+
+
 def compose_variants(
     brief: Brief,
     brand_rules: Dict,
@@ -131,121 +559,467 @@ def compose_variants(
     max_variants: int = 1,
     seed: Optional[int] = None,
     overlay_style: str = "banner",
+    workers: int = 1,
+    master_render: bool = False,
+    score_inline: bool = True,
+    concurrency: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    journal: Optional[RunJournal] = None,
+    manifest: Optional[BuildManifest] = None,
+    incremental: bool = False,
+    layout: Optional[str] = None,
+    encoders: Optional[Dict[str, Encoder]] = None,
 ) -> None:
-    font_path = brand_rules.get("overlay", {}).get("text_font", "assets/fonts/NotoSans-Regular.ttf")
-    # Allow UI to control font size via env; clamp to sane bounds
-    try:
-        env_size = int(os.getenv("CAPE_OVERLAY_FONT_SIZE", "48"))
-        font_size = max(12, min(400, env_size))
-    except Exception:
-        font_size = 48
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except Exception:
-        font = ImageFont.load_default()
-    logo_path = brand_rules.get("brand", {}).get("logo_path", "assets/logos/brand_logo.png")
-    logo_img = Image.open(logo_path).convert("RGBA") if Path(logo_path).exists() else None
-    min_contrast = float(brand_rules.get("overlay", {}).get("min_contrast_ratio", 4.5))
+    layout = resolve_output_layout(layout)
+    encoders = encoders or output_encoders(brand_rules)
+    spec = _overlay_spec(brand_rules, overlay_style)
+    score_cfg = compliance_config(brand_rules) if score_inline else None
+    ratios = list(ratios)
+    locales = list(locales)
+    master_size = _master_size(ratios)
 
-    for product in brief.products:
-        for ratio in ratios:
-            if ratio not in RATIO_TO_SIZE:
-                continue
-            size = RATIO_TO_SIZE[ratio]
-            for loc in locales:
-                for variant_index in range(max_variants):
-                    # Create hero: reuse base_asset if available else generate
-                    if product.base_asset and Path(product.base_asset).exists():
-                        hero_src = Image.open(product.base_asset).convert("RGB")
-                    else:
-                        prompt = build_prompt(brief, product, loc)
-                        gen = provider.generate_image(prompt=prompt, size=size, seed=(seed or 1234) + variant_index)
-                        hero_src = gen.image.convert("RGB")
-                    hero = _cover_resize(hero_src, size)
-
-                    # Compose post by adding overlays and logo
-                    post = hero.copy().convert("RGBA")
-                    # Allow UI overrides for headline/CTA via env
-                    headline_override = os.getenv("CAPE_UI_HEADLINE")
-                    cta_override = os.getenv("CAPE_UI_CTA")
-                    headline = headline_override or (brief.message.get(loc) or next(iter(brief.message.values())))
-                    cta_text = cta_override or (brief.call_to_action.get(loc) or next(iter(brief.call_to_action.values())))
-                    lines = [headline, f"{cta_text}"]
-                    if overlay_style == "bottom-strip":
-                        # Semi-transparent strip across the bottom with white text
-                        padding = 24
-                        text_w, text_h, heights = _measure_text_block(post, lines, font)
-                        strip_h = text_h + 2 * padding
-                        draw = ImageDraw.Draw(post, "RGBA")
-                        draw.rectangle((0, post.height - strip_h, post.width, post.height), fill=(0, 0, 0, 180))
-                        text_x = padding
-                        line_y = post.height - strip_h + padding
-                        for i, line in enumerate(lines):
-                            draw.text((text_x, line_y), line, fill=(255, 255, 255), font=font)
-                            line_h = heights[i] if i < len(heights) else 32
-                            line_y += line_h + 8
-                    elif overlay_style == "center-card":
-                        # Rounded card centered with white text
-                        padding = 24
-                        text_w, text_h, heights = _measure_text_block(post, lines, font)
-                        card_w = min(post.width - 2 * padding, text_w + 2 * padding + 24)
-                        card_h = text_h + 2 * padding
-                        x = (post.width - card_w) // 2
-                        y = (post.height - card_h) // 2
-                        draw = ImageDraw.Draw(post, "RGBA")
-                        try:
-                            draw.rounded_rectangle((x, y, x + card_w, y + card_h), radius=16, fill=(0, 0, 0, 180))
-                        except Exception:
-                            draw.rectangle((x, y, x + card_w, y + card_h), fill=(0, 0, 0, 180))
-                        text_x = x + padding
-                        line_y = y + padding
-                        for i, line in enumerate(lines):
-                            draw.text((text_x, line_y), line, fill=(255, 255, 255), font=font)
-                            line_h = heights[i] if i < len(heights) else 32
-                            line_y += line_h + 8
-                    else:
-                        # Default banner-style that adapts to contrast
-                        _draw_text_block(post, lines, font, min_contrast=min_contrast)
-
-                    area_pct = (brand_rules.get("brand", {}).get("logo_area_pct_min", 3)
-                                + brand_rules.get("brand", {}).get("logo_area_pct_max", 6)) / 2
-                    logo_area_pct_calc = area_pct
-                    if logo_img is not None:
-                        lw, lh = _compute_logo_size(size, logo_img, area_pct)
-                        logo_rs = logo_img.resize((lw, lh), Image.LANCZOS)
-                        margin = max(16, min(size) // 40)
-                        post.alpha_composite(logo_rs, dest=(size[0] - lw - margin, size[1] - lh - margin))
-                        logo_area_pct_calc = (lw * lh) / (size[0] * size[1]) * 100.0
-
-                    # Save files
-                    base = out_dir / brief.campaign_id / product.id / _ratio_dirname(ratio)
-                    base.mkdir(parents=True, exist_ok=True)
-                    hero_path = base / "hero.png"
-                    post_path = base / "post.png"
-                    hero.save(hero_path, format="PNG")
-                    post.convert("RGB").save(post_path, format="PNG")
-
-                    # Provenance
-                    prov = {
-                        "provider": provider.name,
-                        "product_id": product.id,
-                        "ratio": ratio,
-                        "locale": loc,
-                        "logo_area_pct": logo_area_pct_calc,
-                    }
-                    write_json(Path(str(post_path) + ".prov.json"), prov)
-
-                    reporter.add_variant(
-                        VariantResult(
-                            campaign_id=brief.campaign_id,
+    limit = max(1, concurrency or provider.max_concurrency)
+    budget = ImageBudget(inflight_limit(limit, workers))
+    sink: OrderedSink[_Outcome] = OrderedSink()
+    writer = WriterPool(_WRITE_THREADS, _MAX_PENDING_WRITES)
+    pending: Deque[Tuple["Future[None]", Callable[[], None]]] = deque()
+    scanned: set = set()
+
+    file_sha: Dict[str, Optional[str]] = {}
+    common_inputs = _common_inputs(brand_rules, spec, provider.name, master_render, layout, encoders)
+
+    def inputs_digest(job: _RenderJob, product: Product, request: Optional[GenerateRequest]) -> str:
+        if job.source_path is not None and job.source_path not in file_sha:
+            file_sha[job.source_path] = sha256_file(Path(job.source_path))
+        payload = {
+            "common": common_inputs,
+            "campaign_id": brief.campaign_id,
+            "brand": brief.brand,
+            "product": product.model_dump(),
+            "asset": file_sha.get(job.source_path) if job.source_path else None,
+            "variant": [job.ratio, job.size, job.locale, job.variant_index, seed],
+            "lines": job.lines,
+            "master": job.master,
+            "hero": [request.prompt, request.size, request.seed] if request is not None else None,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def reusable(job: _RenderJob) -> Tuple[Optional[Dict[str, Any]], str]:
+        if journal is not None:
+            entry = journal.reusable(_job_key(job))
+            if entry is not None:
+                return entry, "journal"
+        if incremental and manifest is not None:
+            entry = manifest.reusable(_build_key(brief.campaign_id, job), job.inputs)
+            if entry is not None:
+                return entry, "build"
+        return None, ""
+
+    def plan() -> Tuple[List[_Hero], List[Tuple[int, _RenderJob, Dict[str, Any], str]]]:
+        # Every variant in serial order (heroes grouped, see below), with the
+        # request for the hero it is cut from.
+        planned: List[Tuple[_RenderJob, Optional[GenerateRequest]]] = []
+        for product in brief.products:
+            uses_asset = bool(product.base_asset and Path(product.base_asset).exists())
+            for ratio in ratios:
+                if ratio not in RATIO_TO_SIZE:
+                    continue
+                size = RATIO_TO_SIZE[ratio]
+                for loc in locales:
+                    for variant_index in range(max_variants):
+                        variant_seed = (seed or 1234) + variant_index
+                        # Allow UI overrides for headline/CTA via env
+                        headline_override = os.getenv("CAPE_UI_HEADLINE")
+                        cta_override = os.getenv("CAPE_UI_CTA")
+                        headline = headline_override or (brief.message.get(loc) or next(iter(brief.message.values())))
+                        cta_text = cta_override or (brief.call_to_action.get(loc) or next(iter(brief.call_to_action.values())))
+                        # Brief copy is covered by scan_legal; overrides only exist here
+                        if (headline_override or cta_override) and (loc, headline, cta_text) not in scanned:
+                            scanned.add((loc, headline, cta_text))
+                            scan_variant(headline, cta_text, loc, reporter)
+                        # Create hero: reuse base_asset if available else a provider generation
+                        source_path = product.base_asset if uses_asset else None
+                        request = None
+                        if not uses_asset:
+                            request = GenerateRequest(
+                                prompt=build_prompt(brief, product, loc),
+                                size=master_size if master_render else size,
+                                seed=variant_seed,
+                            )
+                        job = _RenderJob(
                             product_id=product.id,
                             ratio=ratio,
                             locale=loc,
-                            seed=seed,
-                            path_post=str(post_path),
-                            path_hero=str(hero_path),
+                            variant_index=variant_index,
+                            size=size,
+                            hero_src=None,
+                            lines=[headline, f"{cta_text}"],
+                            spec=spec,
+                            master=f"{product.id}/{loc}/{variant_seed}" if master_render and not uses_asset else None,
+                            source_path=source_path,
+                            source_mtime=Path(source_path).stat().st_mtime if source_path else 0.0,
+                            compliance=score_cfg,
                             provider=provider.name,
+                            hero_encoder=encoders["hero"],
+                            post_encoder=encoders["post"],
+                        )
+                        job.inputs = inputs_digest(job, product, request)
+                        planned.append((job, request))
+
+        # A hero can feed variants far apart in plan order: a master hero one per ratio
+        # section, any hero one per repeat of a ratio (--ratios 1:1,1:1). Its budget
+        # tokens only come back once its last variant is written, so with its variants
+        # spread out, the fetch stage could fill the budget with heroes whose later
+        # variants are still pending while the writer waits for a hero nobody could
+        # fetch. Pull each hero's variants together; per output folder the last write
+        # (and so which variant's file is left there) is unchanged.
+        first: Dict[Any, int] = {}
+        for i, (job, request) in enumerate(planned):
+            first.setdefault(_hero_key(job, request) or i, i)
+        order = sorted(range(len(planned)), key=lambda i: first[_hero_key(*planned[i]) or i])
+        planned = [planned[i] for i in order]
+
+        # Set aside variants that are already on disk (resumed run, or unchanged inputs
+        # with --incremental). Variants sharing an output directory are redone together,
+        # so the file left there is still the one the last of them writes.
+        found = [reusable(job) for job, _ in planned]
+        dirty = {_variant_dir(out_dir, brief.campaign_id, job, layout) for (job, _), (e, _) in zip(planned, found) if e is None}
+        heroes: List[_Hero] = []
+        reused: List[Tuple[int, _RenderJob, Dict[str, Any], str]] = []
+        # Heroes are shared within one product per locale/seed (and across ratios when
+        # master rendering); a hero nothing needs any more is not fetched at all
+        by_key: Dict[Any, _Hero] = {}
+        for seq, ((job, request), (entry, source)) in enumerate(zip(planned, found)):
+            if entry is not None and _variant_dir(out_dir, brief.campaign_id, job, layout) not in dirty:
+                reused.append((seq, job, entry, source))
+                continue
+            if request is None:
+                hero = _Hero(request=None, jobs=[])
+                heroes.append(hero)
+            else:
+                key = _hero_key(job, request)
+                hero = by_key.get(key)
+                if hero is None:
+                    hero = by_key[key] = _Hero(request=request, jobs=[])
+                    heroes.append(hero)
+            hero.jobs.append((seq, job))
+        for hero in heroes:
+            hero.left = len(hero.jobs)
+        return heroes, reused
+
+    def after_finish(seq: int, job: _RenderJob, hero: _Hero, gen: Any, fut: Future) -> None:
+        if fut.cancelled():
+            return
+        if fut.exception() is not None:
+            sink.fail(fut.exception())
+        else:
+            sink.put(seq, _Outcome(job, hero, rendered=fut.result(), generation=gen))
+
+    def after_composite(encode_pool: Executor, seq: int, job: _RenderJob, hero: _Hero, gen: Any, fut: Future) -> None:
+        job.hero_src = None  # the composite stage is done with the hero pixels
+        if fut.cancelled():
+            return
+        try:
+            if fut.exception() is not None:
+                raise fut.exception()  # type: ignore[misc]
+            encode_pool.submit(_finish_variant, job, fut.result()).add_done_callback(
+                partial(after_finish, seq, job, hero, gen)
+            )
+        except BaseException as exc:  # pool shut down after a failure elsewhere
+            sink.fail(exc)
+
+    def dispatch(composite_pool: Executor, encode_pool: Executor, hero: _Hero, gen: Any) -> None:
+        # A failed generation costs only the variants that needed it, not the whole run
+        if isinstance(gen, BaseException):
+            if not isinstance(gen, ProviderError):
+                sink.fail(gen)
+                return
+            for i, (seq, job) in enumerate(hero.jobs):
+                sink.put(seq, _Outcome(job, hero, shortfall=f"generation failed: {gen}", generation=gen if i == 0 else None))
+            return
+        image = gen.image.convert("RGB") if gen is not None else None
+        for i, (seq, job) in enumerate(hero.jobs):
+            if gen is not None:
+                job.hero_src = image
+                job.provider = gen.metadata.get("provider", provider.name)
+            composite_pool.submit(_composite_variant, job).add_done_callback(
+                partial(after_composite, encode_pool, seq, job, hero, gen if i == 0 else None)
+            )
+
+    def fetch(heroes: List[_Hero], composite_pool: Executor, encode_pool: Executor) -> None:
+        # Provider stage: one event loop keeps `limit` generations in flight, but only
+        # starts one once the image budget has room for everything cut from it.
+        async def run() -> None:
+            sem = asyncio.Semaphore(limit)
+
+            async def one(hero: _Hero) -> None:
+                req = hero.request
+                assert req is not None
+                try:
+                    async with sem:
+                        gen: Any = await provider.agenerate_image(
+                            prompt=req.prompt,
+                            size=req.size,
+                            seed=req.seed,
+                            style_ref=req.style_ref,
+                            negative_prompt=req.negative_prompt,
                         )
-                    )
+                except Exception as exc:
+                    gen = exc
+                dispatch(composite_pool, encode_pool, hero, gen)
+
+            tasks = []
+            for hero in heroes:
+                if sink.failed:
+                    break
+                hero.tokens = await asyncio.to_thread(budget.acquire, len(hero.jobs))
+                if hero.request is None:
+                    dispatch(composite_pool, encode_pool, hero, None)
+                else:
+                    tasks.append(asyncio.create_task(one(hero)))
+            await asyncio.gather(*tasks)
+
+        try:
+            asyncio.run(run())
+        except PipelineAborted:
+            pass
+        except BaseException as exc:
+            sink.fail(exc)
+
+    def write(job: _RenderJob, rendered: _Rendered, tally: _Tally) -> Tuple[VariantResult, "Future[None]"]:
+        # Called in job order; the writer pool keeps writes to one folder in that order,
+        # so the last variant to land on a path is the same one the serial loop would
+        # have left there.
+        base = _variant_dir(out_dir, brief.campaign_id, job, layout)
+        hero_path = base / f"hero.{job.hero_encoder.ext}"
+        post_path = base / f"post.{job.post_encoder.ext}"
+
+        # Provenance
+        prov = {
+            "provider": job.provider or provider.name,
+            "product_id": job.product_id,
+            "ratio": job.ratio,
+            "locale": job.locale,
+            "logo_area_pct": rendered.logo_area_pct,
+        }
+        if job.master:
+            prov["master"] = job.master
+        if rendered.compliance_score is not None:
+            prov["compliance_score"] = rendered.compliance_score
+        if rendered.contrast_ratio is not None:
+            prov["contrast_ratio"] = round(rendered.contrast_ratio, 2)
+            prov["contrast_ok"] = rendered.contrast_ratio >= job.spec.min_contrast
+
+        def flush() -> None:
+            base.mkdir(parents=True, exist_ok=True)
+            _write_atomic(hero_path, rendered.hero_data)
+            _write_atomic(post_path, rendered.post_data)
+            write_json(Path(str(post_path) + ".prov.json"), prov)
+
+        flushed = writer.submit(base, flush)
+        for k, n in rendered.cache_events.items():
+            tally.bump("compositor_cache", k, n)
+        for enc, data, secs in (
+            (job.hero_encoder, rendered.hero_data, rendered.encode_s[0]),
+            (job.post_encoder, rendered.post_data, rendered.encode_s[1]),
+        ):
+            tally.bump("encoding", f"{enc.format}_files")
+            tally.bump("encoding", f"{enc.format}_bytes", len(data))
+            tally.bump("encoding", f"{enc.format}_encode_s", secs)
+
+        variant = VariantResult(
+                campaign_id=brief.campaign_id,
+                product_id=job.product_id,
+                ratio=job.ratio,
+                locale=job.locale,
+                variant_index=job.variant_index,
+                seed=seed,
+                path_post=str(post_path),
+                path_hero=str(hero_path),
+                provider=job.provider or provider.name,
+                master=job.master,
+                compliance_score=rendered.compliance_score,
+            )
+        return variant, flushed
+
+    def settle(block: bool) -> None:
+        # Journal/manifest entries are only added once a variant's files are on disk
+        while pending and (block or pending[0][0].done()):
+            flushed, record = pending.popleft()
+            flushed.result()
+            record()
+
+    def reuse(job: _RenderJob, entry: Dict[str, Any], source: str) -> None:
+        if source == "journal":
+            # Same run, resumed: the report gets exactly what the first attempt recorded
+            reporter.add_variant(VariantResult(**entry["variant"]))
+            for section, key, n in entry["bumps"]:
+                reporter.bump(section, key, n)
+            reporter.bump("resume", "reused")
+            if manifest is not None:
+                files = {p: d for p, d in entry["files"].items() if p}
+                manifest.record(_build_key(brief.campaign_id, job), job.inputs, entry["variant"], files)
+            return
+        # Unchanged since an earlier run: nothing was generated or rendered this time
+        base = _variant_dir(out_dir, brief.campaign_id, job, layout)
+        paths = {
+            "path_post": str(base / f"post.{encoders['post'].ext}"),
+            "path_hero": str(base / f"hero.{encoders['hero'].ext}"),
+        }
+        reporter.add_variant(VariantResult(**{**entry["variant"], **paths, "reused": True}))
+        reporter.bump("incremental", "reused")
+
+    # Retry budgets (and other per-run provider state) are scoped to this call
+    with run_scope() as scope:
+        if deadline_s:
+            # auto routing spreads generations across providers to finish in time
+            scope.set("deadline", time.monotonic() + deadline_s)
+        heroes, reused = plan()
+        total = sum(len(h.jobs) for h in heroes) + len(reused)
+        for seq, job, entry, source in reused:
+            sink.put(seq, _Outcome(job, None, reused=entry, reused_from=source))
+        # Stages: fetch (async, own thread) -> composite (process pool, or one thread)
+        # -> score + encode (thread pool) -> report (here, in plan order) -> write (writer
+        # pool). The image budget and the writer queue are the backpressure between them.
+        composite_pool: Executor = (
+            ProcessPoolExecutor(max_workers=workers, mp_context=_process_context())
+            if workers > 1
+            else ThreadPoolExecutor(max_workers=1, thread_name_prefix="composite")
+        )
+        encode_pool = ThreadPoolExecutor(max_workers=_encode_threads(), thread_name_prefix="encode")
+        # The fetch thread runs inside this run scope (retry/hedge budgets, deadline)
+        fetcher = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(fetch, heroes, composite_pool, encode_pool),
+            name="fetch",
+            daemon=True,
+        )
+        fetcher.start()
+        try:
+            for out in sink.drain(total):
+                job = out.job
+                if out.reused is not None:
+                    reuse(job, out.reused, out.reused_from)
+                    continue
+                tally = _Tally(reporter)
+                if out.generation is not None:
+                    _record_generation(tally, out.generation, provider, master_render)
+                if out.rendered is None:
+                    reporter.add_shortfall(job.product_id, job.ratio, job.locale, out.shortfall or "not rendered")
+                else:
+                    variant, flushed = write(job, out.rendered, tally)
+                    reporter.add_variant(variant)
+                    files = {variant.path_hero or "": out.rendered.hero_sha256, variant.path_post: out.rendered.post_sha256}
+
+                    def record(job=job, variant=variant, files=files, bumps=tally.bumps) -> None:
+                        if journal is not None:
+                            journal.record(_job_key(job), variant.model_dump(), files, bumps)
+                        if manifest is not None:
+                            manifest.record(_build_key(brief.campaign_id, job), job.inputs, variant.model_dump(), files)
+
+                    pending.append((flushed, record))
+                    settle(block=False)
+                assert out.hero is not None
+                out.hero.left -= 1
+                if out.hero.left == 0:
+                    budget.release(out.hero.tokens)
+            settle(block=True)
+        except BaseException:
+            sink.fail(PipelineAborted())
+            budget.abort()
+            # Whatever did reach the disk is still journaled, for --resume
+            writer.shutdown()
+            while pending:
+                flushed, record = pending.popleft()
+                if flushed.exception() is None:
+                    record()
+            raise
+        finally:
+            fetcher.join()
+            composite_pool.shutdown(wait=True, cancel_futures=True)
+            encode_pool.shutdown(wait=True, cancel_futures=True)
+            writer.shutdown()
+            if manifest is not None:
+                manifest.save()  # also after a failure: what did land stays reusable
+    for k, v in stage_stats(budget, sink, writer).items():
+        reporter.stats.setdefault("pipeline", {})[k] = v
+    _record_hit_rates(reporter.stats.get("compositor_cache", {}))
+    encoding = reporter.stats.get("encoding", {})
+    for k in [k for k in encoding if k.endswith("_encode_s")]:
+        encoding[k] = round(encoding[k], 3)
+
+
+def resolve_output_layout(layout: Optional[str] = None) -> str:
+    layout = layout or os.getenv("CAPE_OUTPUT_LAYOUT") or "legacy"
+    if layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"unknown output layout {layout!r} (expected one of {', '.join(OUTPUT_LAYOUTS)})")
+    return layout
+
+
+def _hero_key(job: _RenderJob, request: Optional[GenerateRequest]) -> Optional[Tuple[str, str, int, Tuple[int, int]]]:
+    # Generated heroes are shared within one product per locale/seed/size; None for base_asset
+    if request is None:
+        return None
+    return (job.product_id, job.locale, request.seed or 0, request.size)
+
+
+def _variant_dir(out_dir: Path, campaign_id: str, job: _RenderJob, layout: str = "legacy") -> Path:
+    if layout == "legacy":
+        return out_dir / campaign_id / job.product_id / _ratio_dirname(job.ratio)
+    # sharded: <campaign>/<first two hex of the inputs hash>/<one folder per variant>, so
+    # no two variants share files and no folder grows past a few hundred entries per
+    # 100k variants
+    name = f"{job.product_id}-{_ratio_dirname(job.ratio)}-{job.locale}-v{job.variant_index}-{job.inputs[:12]}"
+    return out_dir / campaign_id / job.inputs[:2] / name
+
+
+def _build_key(campaign_id: str, job: _RenderJob) -> str:
+    return f"{campaign_id}/{_job_key(job)}"
+
+
+def _common_inputs(
+    brand_rules: Dict,
+    spec: _OverlaySpec,
+    provider_name: str,
+    master_render: bool,
+    layout: str,
+    encoders: Dict[str, Encoder],
+) -> str:
+    # Inputs shared by every variant of a run; per-variant inputs are added in compose_variants
+    payload = {
+        "version": _RENDER_VERSION,
+        "rules": brand_rules,
+        "overlay": [spec.font_path, spec.font_size, spec.area_pct, spec.min_contrast, spec.overlay_style],
+        "font": sha256_file(Path(spec.font_path)),
+        "logo": sha256_file(Path(spec.logo_path)) if spec.logo_path else None,
+        "provider": provider_name,
+        "master_render": master_render,
+        "layout": layout,
+        "encoders": {ch: enc.label for ch, enc in sorted(encoders.items())},
+        "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith(_OUTPUT_ENV_PREFIXES)},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _job_key(job: _RenderJob) -> str:
+    return variant_key(job.product_id, job.ratio, job.locale, job.variant_index)
+
+
+def _encode_threads() -> int:
+    return max(2, min(4, os.cpu_count() or 1))
+
+
+def _process_context() -> Any:
+    # Workers start on the first submit, from the fetch thread while encode, writer and
+    # provider threads are running; forking then can copy a lock some other thread holds.
+    # Start them from a clean process instead (forkserver, or spawn where it is missing).
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
 
 
+def _record_hit_rates(counts: Dict[str, float]) -> None:
+    for cache in ("source", "cover", "logo", "overlay"):
+        hits = counts.get(f"{cache}_hit", 0)
+        total = hits + counts.get(f"{cache}_miss", 0)
+        if total:
+            counts[f"{cache}_hit_rate"] = round(hits / total, 4)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+
+# format -> (Pillow format name, file extension, accepted options)
+_FORMATS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "png": ("PNG", "png", ("compress_level", "optimize")),
+    "webp": ("WEBP", "webp", ("quality", "lossless", "method")),
+    "jpeg": ("JPEG", "jpg", ("quality", "progressive", "optimize", "subsampling")),
+    "avif": ("AVIF", "avif", ("quality", "speed")),
+}
+_ALIASES = {"jpg": "jpeg"}
+_DEFAULTS: Dict[str, Dict[str, object]] = {
+    # progressive JPEG unless asked otherwise; everything else keeps Pillow's defaults
+    "jpeg": {"quality": 90, "progressive": True},
+}
+CHANNELS = ("hero", "post")
+
+
+@dataclass(frozen=True)
+class Encoder:
+    """One output format with its Pillow save options (``png``, ``webp:quality=85``,
+    ``webp:lossless``, ``jpeg:quality=90``, ``png:compress_level=1``, ...)."""
+
+    format: str = "png"
+    options: Tuple[Tuple[str, object], ...] = field(default_factory=tuple)
+
+    @property
+    def ext(self) -> str:
+        return _FORMATS[self.format][1]
+
+    @property
+    def label(self) -> str:
+        opts = ",".join(f"{k}={v}" for k, v in self.options)
+        return f"{self.format}:{opts}" if opts else self.format
+
+    def encode(self, img: Image.Image) -> bytes:
+        if self.format == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format=_FORMATS[self.format][0], **dict(self.options))
+        return buf.getvalue()
+
+
+def _value(raw: str) -> object:
+    if raw.lower() in ("true", "yes", "on"):
+        return True
+    if raw.lower() in ("false", "no", "off"):
+        return False
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def _available(pil_format: str) -> bool:
+    if pil_format == "AVIF":
+        try:
+            import pillow_avif  # type: ignore # noqa: F401  (registers AVIF on Pillow < 11.3)
+        except ImportError:
+            pass
+    Image.init()
+    return pil_format in Image.SAVE
+
+
+def parse_encoder(text: str) -> Encoder:
+    """``format[:key=value,...]``; a bare key means ``key=true``."""
+    name, _, rest = text.strip().partition(":")
+    fmt = _ALIASES.get(name.strip().lower(), name.strip().lower())
+    if fmt not in _FORMATS:
+        raise ValueError(f"unknown output format {name!r} (expected one of {', '.join(_FORMATS)})")
+    pil_format, _, allowed = _FORMATS[fmt]
+    if not _available(pil_format):
+        raise ValueError(f"{fmt} output needs a Pillow build with {pil_format} support")
+    options = dict(_DEFAULTS.get(fmt, {}))
+    for part in filter(None, (p.strip() for p in rest.split(","))):
+        key, eq, raw = part.partition("=")
+        key = key.strip()
+        if key not in allowed:
+            raise ValueError(f"unknown {fmt} option {key!r} (expected one of {', '.join(allowed)})")
+        options[key] = _value(raw.strip()) if eq else True
+    return Encoder(fmt, tuple(sorted(options.items())))
+
+
+def output_encoders(brand_rules: Dict, overrides: Optional[Iterable[str]] = None) -> Dict[str, Encoder]:
+    """Encoder per channel (hero, post): ``output.encoders`` in brand rules, then
+    ``--encode`` overrides, either ``SPEC`` (both channels) or ``channel=SPEC``."""
+    specs: Dict[str, str] = {ch: "png" for ch in CHANNELS}
+    configured = (brand_rules.get("output") or {}).get("encoders") or {}
+    if isinstance(configured, str):
+        configured = {ch: configured for ch in CHANNELS}
+    specs.update({ch: str(v) for ch, v in configured.items() if ch in CHANNELS})
+    for item in overrides or ():
+        channel, eq, spec = item.partition("=")
+        if eq and channel.strip() in CHANNELS:
+            specs[channel.strip()] = spec
+        else:
+            specs.update({ch: item for ch in CHANNELS})
+    return {ch: parse_encoder(spec) for ch, spec in specs.items()}
@@ -1,42 +1,131 @@
 from __future__ import annotations
 
 import os
-from typing import List, Tuple
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
 from app.models import Brief, Product
 from .adapters.base import BaseProvider
 from .adapters.mock import MockProvider
 from .adapters.firefly import FireflyProvider
 from .adapters.openai_images import OpenAIImagesProvider
+from .adapters.sim import SimConfig, SimProvider
+from .breaker import BreakerConfig, CircuitBreakerProvider, FailoverProvider
+from .cache import CachedProvider, default_cache
+from .hedge import HedgeConfig, HedgedProvider
+from .ratelimit import LimitConfig, RateLimitedProvider
+from .router import RoutingConfig, RoutingProvider
 
 
-def select_provider(name: str) -> BaseProvider:
+_ORDER = ["firefly", "openai", "mock"]
+_HEALTH_TTL_S = float(os.getenv("CAPE_HEALTH_TTL", "60"))
+
+# Process-wide: one instance (and pooled HTTP client) per provider + credentials, and
+# its last health_check result, shared by every select_provider call
+_INSTANCES: Dict[Tuple[str, ...], BaseProvider] = {}
+_HEALTH: Dict[int, Tuple[float, bool]] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def select_provider(
+    name: str, use_cache: bool = True, rules: Optional[Dict] = None, hedge: Optional[bool] = None
+) -> BaseProvider:
+    """Provider for ``name`` that fails over along Firefly -> OpenAI -> Mock.
+
+    ``auto`` instead routes every call to whichever allowed provider is currently
+    fastest/cheapest (see RoutingProvider), still with Mock as the last resort.
+
+    Remote providers get limits/retries, a circuit breaker and the generation cache;
+    cache sits outermost so hits never spend rate-limit tokens or touch the breaker.
+    Mock is free and instant, so it is never wrapped and always closes the chain.
+    ``hedge`` (default: ``hedging.enabled`` in the rules) duplicates straggling calls.
+    """
+    auto = (name or "auto").lower() not in _ORDER + ["sim"]
+    routing = RoutingConfig.from_rules(rules)
+    chain: List[BaseProvider] = []
+    for raw in _candidates(name):
+        if auto and routing.allowed and raw.name not in routing.allowed and raw.name != "mock":
+            continue
+        if raw.name == "mock":
+            chain.append(raw)
+            continue
+        if not _healthy(raw):
+            continue
+        p: BaseProvider = RateLimitedProvider(raw, LimitConfig.from_rules(rules, raw.name))
+        p = CircuitBreakerProvider(p, BreakerConfig.from_rules(rules, raw.name))
+        # The simulator exists to exercise the provider path, so it never hits the cache
+        cache = default_cache() if use_cache and raw.name != "sim" else None
+        chain.append(CachedProvider(p, cache) if cache is not None else p)
+    provider: BaseProvider
+    if auto and len(chain) > 1:
+        # auto routes per call on measured latency/cost instead of a fixed order
+        provider = RoutingProvider(chain, routing)
+    else:
+        # Start with a provider whose circuit is closed, if there is one
+        while len(chain) > 1 and not chain[0].health_check():
+            chain.pop(0)
+        provider = chain[0] if len(chain) == 1 else FailoverProvider(chain)
+    hedging = HedgeConfig.from_rules(rules)
+    if provider.name == "mock" or not (hedging.enabled if hedge is None else hedge):
+        return provider
+    remote = [p for p in chain if p.name != "mock"]
+    hedge_to = provider
+    if hedging.target == "fallback" and len(remote) > 1:
+        hedge_to = remote[1] if len(remote) == 2 else FailoverProvider(remote[1:])
+    return HedgedProvider(provider, hedging, hedge_to=hedge_to)
+
+
+def _candidates(name: str) -> List[BaseProvider]:
     name = (name or "auto").lower()
+    if name == "sim":
+        # Load/soak testing: no failover, so injected faults surface as retries/shortfalls
+        return [_instance("sim")]  # type: ignore[list-item]
+    # auto order: Firefly -> OpenAI -> Mock. An explicit name starts the chain there.
+    # if this ever flips, keep the order explicit so future-me remembers why.
+    start = _ORDER.index(name) if name in _ORDER else 0
+    found: List[BaseProvider] = []
+    for n in _ORDER[start:]:
+        p = _instance(n)
+        if p is not None:
+            found.append(p)
+    return found
 
-    candidates: List[BaseProvider]
-    # Placeholders for future: Firefly, OpenAI
-    firefly_key = os.getenv("FIREFLY_API_KEY")
-    firefly_ws = os.getenv("FIREFLY_WORKSPACE_ID")
-    # tiny inconsistency: env var read here, not validated until health_check
-    openai_key = os.getenv("OPENAI_API_KEY")
-    firefly_provider: BaseProvider | None = FireflyProvider(firefly_key, firefly_ws) if firefly_key else None
-    openai_provider: BaseProvider | None = OpenAIImagesProvider(openai_key) if openai_key else None
-    mock_provider = MockProvider()
 
+def _instance(name: str) -> Optional[BaseProvider]:
+    # tiny inconsistency: env vars read here, not validated until health_check
+    factory: Callable[[], BaseProvider]
     if name == "firefly":
-        return mock_provider if not firefly_provider else firefly_provider
-    if name == "openai":
-        return mock_provider if not openai_provider else openai_provider
-    if name == "mock":
-        return mock_provider
-
-    # auto order: Firefly -> OpenAI -> Mock
-    # Note: this is intentionally simple; a bit too simple maybe.
-    # if this ever flips, keep the order explicit so future-me remembers why.
-    for p in [firefly_provider, openai_provider, mock_provider]:
-        if p and p.health_check():
-            return p
-    return mock_provider
+        api_key, workspace = os.getenv("FIREFLY_API_KEY"), os.getenv("FIREFLY_WORKSPACE_ID")
+        if not api_key:
+            return None
+        key: Tuple[str, ...] = (name, api_key, workspace or "", os.getenv("FIREFLY_BASE_URL", ""))
+        factory = lambda: FireflyProvider(api_key, workspace)  # noqa: E731
+    elif name == "openai":
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        key = (name, api_key, os.getenv("OPENAI_BASE_URL", ""))
+        factory = lambda: OpenAIImagesProvider(api_key)  # noqa: E731
+    elif name == "sim":
+        sim = SimConfig.from_env()
+        key, factory = (name, repr(sim)), lambda: SimProvider(sim)  # noqa: E731
+    else:
+        key, factory = (name,), MockProvider
+    with _REGISTRY_LOCK:
+        if key not in _INSTANCES:
+            _INSTANCES[key] = factory()
+        return _INSTANCES[key]
+
+
+def _healthy(p: BaseProvider) -> bool:
+    now = time.monotonic()
+    cached = _HEALTH.get(id(p))
+    if cached and now - cached[0] < _HEALTH_TTL_S:
+        return cached[1]
+    ok = p.health_check()
+    _HEALTH[id(p)] = (now, ok)
+    return ok
 
 
 def build_prompt(brief: Brief, product: Product, locale: str) -> str:
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from .adapters.base import BaseProvider, GenerateRequest, GenerateResult, run_sync
+from .router import ProviderStats, RoutingStats, routing_stats
+from .runscope import Budget, current_scope
+
+
+@dataclass(frozen=True)
+class HedgeConfig:
+    enabled: bool = False
+    quantile: float = 0.9  # hedge once the primary is slower than this rolling percentile
+    delay_s: float = 0.0  # fixed hedge delay instead of the percentile (0 = use quantile)
+    min_samples: int = 10  # no percentile-based hedging until we have this much history
+    budget: int = 20  # duplicate requests allowed per run
+    target: str = "same"  # "same" provider + seed, or "fallback" to the next remote provider
+
+    @classmethod
+    def from_rules(cls, rules: Optional[Dict]) -> "HedgeConfig":
+        section = (rules or {}).get("hedging", {}) or {}
+        return cls(
+            enabled=bool(section.get("enabled", cls.enabled)),
+            quantile=float(section.get("quantile", cls.quantile)),
+            delay_s=float(section.get("delay_s", cls.delay_s)),
+            min_samples=int(section.get("min_samples", cls.min_samples)),
+            budget=int(section.get("budget", cls.budget)),
+            target=str(section.get("target", cls.target)).lower(),
+        )
+
+
+class HedgedProvider(BaseProvider):
+    """Send a duplicate request when the first one runs long; keep whichever lands first.
+
+    The hedge fires once the primary has been out for longer than the rolling p90 of
+    this provider (or ``delay_s``), goes to ``hedge_to`` (the same provider and seed by
+    default), and the loser is cancelled. Duplicates are capped by a per-run budget.
+    Results carry ``hedged`` / ``hedge_won`` so compose_variants can report them.
+    """
+
+    def __init__(
+        self,
+        inner: BaseProvider,
+        config: Optional[HedgeConfig] = None,
+        hedge_to: Optional[BaseProvider] = None,
+        stats: Optional[RoutingStats] = None,
+    ) -> None:
+        self.inner = inner
+        self.hedge_to = hedge_to or inner
+        self.config = config or HedgeConfig(enabled=True)
+        self.name = inner.name
+        self.max_concurrency = inner.max_concurrency
+        self._routing = stats or routing_stats()
+        self.stats: ProviderStats = self._routing.get(f"hedge:{inner.name}")
+
+    def health_check(self) -> bool:
+        return self.inner.health_check()
+
+    def close(self) -> None:
+        self._routing.save()
+        self.inner.close()
+        if self.hedge_to is not self.inner:
+            self.hedge_to.close()
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.config.delay_s > 0:
+            return self.config.delay_s
+        if len(self.stats.latencies) < self.config.min_samples:
+            return None
+        return self.stats.p(self.config.quantile)
+
+    def _budget(self) -> Budget:
+        return current_scope().get(f"hedge:{self.name}", lambda: Budget(self.config.budget))
+
+    def _record(self, latency_s: float) -> None:
+        with self._routing.lock:
+            self.stats.record(latency_s, True)
+
+    @staticmethod
+    def _tag(res: GenerateResult, hedged: bool, won: bool) -> GenerateResult:
+        return GenerateResult(image=res.image, metadata={**res.metadata, "hedged": hedged, "hedge_won": won})
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        return run_sync(
+            self.agenerate_image(prompt, size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt)
+        )
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        req = GenerateRequest(prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt)
+        t0 = time.monotonic()
+        primary = asyncio.ensure_future(_call(self.inner, req))
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._budget().take():
+                    return await self._race(primary, _call(self.hedge_to, req), t0)
+            res = await primary
+        finally:
+            # The caller may be cancelled while we wait; never leave the call behind
+            await _cancel({primary})
+        if res.metadata.get("cache") != "hit":
+            self._record(time.monotonic() - t0)
+        return self._tag(res, hedged=False, won=False)
+
+    async def _race(self, primary: "asyncio.Future[GenerateResult]", dup, t0: float) -> GenerateResult:
+        hedge = asyncio.ensure_future(dup)
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary if both landed together; a failure waits for the other
+                for fut in sorted(done, key=lambda f: f is not primary):
+                    if fut.exception() is None:
+                        if fut is primary:
+                            self._record(time.monotonic() - t0)
+                        return self._tag(fut.result(), hedged=True, won=fut is hedge)
+            # Both failed: surface the primary's error
+            return primary.result()
+        finally:
+            if not primary.done() or primary.cancelled():
+                # Censored sample: the primary took at least this long
+                self._record(time.monotonic() - t0)
+            await _cancel({primary, hedge})
+
+
+async def _cancel(futs: Set["asyncio.Future[GenerateResult]"]) -> None:
+    # Cancel the calls still running and wait for them to unwind, so none of them
+    # (or the limiter slot it holds) outlives the request
+    live = [f for f in futs if not f.done()]
+    for f in live:
+        f.cancel()
+    if live:
+        await asyncio.gather(*live, return_exceptions=True)
+
+
+async def _call(p: BaseProvider, req: GenerateRequest) -> GenerateResult:
+    return await p.agenerate_image(
+        prompt=req.prompt, size=req.size, seed=req.seed, style_ref=req.style_ref, negative_prompt=req.negative_prompt
+    )
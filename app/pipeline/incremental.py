@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .journal import sha256_file
+
+
+class BuildManifest:
+    """Per-output-tree record of what every variant was built from.
+
+    ``<out_dir>/.cape-build.json`` maps each variant to a hash of all of its inputs
+    (brief copy and product, merged brand rules, font, logo, base asset, provider,
+    prompt, seed, overlay style and output-affecting ``CAPE_*`` env) and to the files
+    it wrote. ``generate --incremental`` reuses a variant when that hash is unchanged
+    and its files are intact, so a copy edit only re-renders the variants it touches.
+    """
+
+    FILENAME = ".cape-build.json"
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = Path(out_dir)
+        self.path = self.out_dir / self.FILENAME
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # output file (relative) -> sha256 of the last bytes written to it
+        self.files: Dict[str, str] = {}
+        self._checked: Dict[str, bool] = {}
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.entries, self.files = data.get("variants", {}), data.get("files", {})
+            except ValueError:
+                pass  # unreadable manifest: everything is rebuilt
+
+    def _file_ok(self, rel: str) -> bool:
+        if rel not in self._checked:
+            self._checked[rel] = sha256_file(self.out_dir / rel) == self.files.get(rel)
+        return self._checked[rel]
+
+    def reusable(self, key: str, inputs: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None or entry.get("inputs") != inputs:
+            return None
+        if not all(self._file_ok(rel) for rel in entry.get("files", ())):
+            return None
+        return entry
+
+    def record(
+        self,
+        key: str,
+        inputs: str,
+        variant: Dict[str, Any],
+        files: Dict[str, str],
+    ) -> None:
+        rel = {os.path.relpath(p, self.out_dir): digest for p, digest in files.items()}
+        self.files.update(rel)
+        self._checked.update({r: True for r in rel})
+        self.entries[key] = {"inputs": inputs, "variant": variant, "files": sorted(rel)}
+
+    def save(self) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"version": 1, "files": self.files, "variants": self.entries}), encoding="utf-8")
+        os.replace(tmp, self.path)
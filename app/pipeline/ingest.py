@@ -21,6 +21,10 @@ def _deep_update(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, An
 def load_brief_and_rules(brief_path: Path) -> Tuple[Brief, Dict[str, Any]]:
     raw = json.loads(Path(brief_path).read_text(encoding="utf-8"))
     brief = Brief(**raw)
+    return brief, load_brand_rules()
+
+
+def load_brand_rules() -> Dict[str, Any]:
     # Load default rules, then merge local overrides if present
     base_rules = yaml.safe_load(Path("brand/brand_rules.yaml").read_text(encoding="utf-8")) or {}
     local_path = Path("brand/brand_rules.local.yaml")
@@ -29,6 +33,6 @@ def load_brief_and_rules(brief_path: Path) -> Tuple[Brief, Dict[str, Any]]:
         rules = _deep_update(base_rules, local_rules)
     else:
         rules = base_rules
-    return brief, rules
+    return rules
 
 
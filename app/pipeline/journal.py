@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+
+def sha256_file(path: Path) -> Optional[str]:
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def variant_key(product_id: str, ratio: str, locale: str, variant_index: int) -> str:
+    return f"{product_id}/{ratio}/{locale}/{variant_index}"
+
+
+class RunJournal:
+    """Append-only log of finished variants in ``runs/<run_id>/journal.jsonl``.
+
+    compose_variants adds a line as each variant lands on disk (output hashes, the
+    report row and the stats it contributed), so a run that dies part-way can be
+    resumed: variants whose files still hash to what was journaled are replayed into
+    the report instead of being generated and rendered again.
+    """
+
+    def __init__(self, run_dir: Path) -> None:
+        self.path = Path(run_dir) / "journal.jsonl"
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # output path -> sha256 of the last journaled write to it
+        self._latest: Dict[str, str] = {}
+        self._checked: Dict[str, bool] = {}
+        self._fh: Optional[TextIO] = None
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                self._remember(entry)
+
+    def _remember(self, entry: Dict[str, Any]) -> None:
+        self.entries[entry["key"]] = entry
+        for path, digest in entry.get("files", {}).items():
+            self._latest[path] = digest
+            self._checked.pop(path, None)
+
+    def _file_ok(self, path: str) -> bool:
+        if path not in self._checked:
+            self._checked[path] = sha256_file(Path(path)) == self._latest.get(path)
+        return self._checked[path]
+
+    def reusable(self, key: str) -> Optional[Dict[str, Any]]:
+        """The journaled entry for ``key`` if every file it wrote is still intact."""
+        entry = self.entries.get(key)
+        if entry is None or not all(self._file_ok(p) for p in entry.get("files", {})):
+            return None
+        return entry
+
+    def record(
+        self,
+        key: str,
+        variant: Dict[str, Any],
+        files: Dict[str, str],
+        bumps: List[Tuple[str, str, float]],
+    ) -> None:
+        entry = {"key": key, "variant": variant, "files": files, "bumps": [list(b) for b in bumps]}
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("a", encoding="utf-8")
+        self._fh.write(json.dumps(entry) + "\n")
+        self._fh.flush()
+        self._remember(entry)
+        for path in files:
+            self._checked[path] = True  # we just wrote these bytes
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -1,19 +1,168 @@
 from __future__ import annotations
 
+import unicodedata
+from collections import deque
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from app.models import Brief
 
 
-def scan_legal(brief: Brief, reporter) -> List[str]:
-    words = [w.strip().lower() for w in Path("legal/prohibited_words.txt").read_text(encoding="utf-8").splitlines() if w.strip()]
-    text_blobs = []
-    text_blobs.extend(brief.message.values())
-    text_blobs.extend(brief.call_to_action.values())
-    haystack = "\n".join(text_blobs).lower()
-    hits = sorted({w for w in words if w and w in haystack})
-    reporter.add_legal_flags(hits)
+DEFAULT_WORDS_PATH = Path("legal/prohibited_words.txt")
+
+
+@dataclass(frozen=True)
+class LegalHit:
+    term: str
+    locale: str
+    field: str  # "message" | "cta"
+    start: int  # offsets into the original (un-folded) text
+    end: int
+
+
+def _is_word_char(ch: str) -> bool:
+    # Letters, digits, underscore and combining marks all glue a word together
+    return ch.isalnum() or ch == "_" or unicodedata.category(ch).startswith("M")
+
+
+def _nfc_pieces(text: str) -> List[Tuple[str, int, int]]:
+    """NFC form of ``text`` as (piece, start, end) spans of the original, one per
+    base character plus whatever composes or combines with it."""
+    if unicodedata.is_normalized("NFC", text):
+        return [(ch, i, i + 1) for i, ch in enumerate(text)]
+    pieces: List[Tuple[str, int, int]] = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i < len(text):
+            if unicodedata.combining(text[i]):
+                continue
+            head = unicodedata.normalize("NFC", text[start:i])
+            if len(unicodedata.normalize("NFC", text[start : i + 1])) <= len(head):
+                continue  # composes with what came before (e.g. Hangul jamo)
+        pieces.append((unicodedata.normalize("NFC", text[start:i]), start, i))
+        start = i
+    return pieces
+
+
+class TermMatcher:
+    """Aho-Corasick automaton over casefolded terms.
+
+    One pass over the text finds every term, so cost is O(text + matches) no matter how
+    long the list gets. Matches must sit on word boundaries ("ass" does not fire inside
+    "class"); terms with punctuation at an edge only need the boundary on the word side.
+    """
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.terms: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        seen = set()
+        for t in terms:
+            folded = unicodedata.normalize("NFC", t.strip()).casefold()
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            self._add(folded, len(self.terms))
+            self.terms.append(folded)
+        self._build()
+
+    def _add(self, term: str, idx: int) -> None:
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(idx)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                # depth-1 nodes always fall back to the root
+                self._fail[nxt] = self._goto[f].get(ch, 0) if node else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[str, int, int]]:
+        # NFC like the terms, then casefold per piece, remembering where each folded char
+        # came from so offsets map back to the original text even when normalizing or
+        # folding changes length (e + U+0301 -> é, ß -> ss)
+        folded_chars: List[str] = []
+        origin: List[int] = []
+        origin_end: List[int] = []
+        for piece, i, j in _nfc_pieces(text):
+            f = piece.casefold()
+            folded_chars.append(f)
+            origin.extend([i] * len(f))
+            origin_end.extend([j] * len(f))
+        folded = "".join(folded_chars)
+
+        hits: List[Tuple[str, int, int]] = []
+        node = 0
+        for pos, ch in enumerate(folded):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for idx in self._out[node]:
+                term = self.terms[idx]
+                fstart = pos - len(term) + 1
+                start, end = origin[fstart], origin_end[pos]
+                if _is_word_char(term[0]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if _is_word_char(term[-1]) and end < len(text) and _is_word_char(text[end]):
+                    continue
+                hits.append((term, start, end))
+        hits.sort(key=lambda h: (h[1], h[2]))
+        return hits
+
+
+_MATCHERS: Dict[str, Tuple[float, TermMatcher]] = {}
+
+
+def load_matcher(path: Path = DEFAULT_WORDS_PATH) -> TermMatcher:
+    """Compile the word list once; recompile only when the file's mtime changes."""
+    key = str(Path(path).resolve())
+    mtime = Path(path).stat().st_mtime
+    cached = _MATCHERS.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    words = Path(path).read_text(encoding="utf-8").splitlines()
+    matcher = TermMatcher(words)
+    _MATCHERS[key] = (mtime, matcher)
+    return matcher
+
+
+def scan_text(text: str, locale: str, field: str, matcher: Optional[TermMatcher] = None) -> List[LegalHit]:
+    matcher = matcher or load_matcher()
+    return [LegalHit(term=t, locale=locale, field=field, start=s, end=e) for t, s, e in matcher.find(text)]
+
+
+def scan_variant(headline: str, cta: str, locale: str, reporter=None) -> List[LegalHit]:
+    """Scan the copy a single variant actually renders (e.g. UI headline/CTA overrides)."""
+    matcher = load_matcher()
+    hits = scan_text(headline, locale, "message", matcher) + scan_text(cta, locale, "cta", matcher)
+    if reporter is not None:
+        reporter.add_legal_hits([asdict(h) for h in hits])
     return hits
 
 
+def scan_legal(brief: Brief, reporter) -> List[str]:
+    matcher = load_matcher()
+    hits: List[LegalHit] = []
+    for loc, txt in brief.message.items():
+        hits.extend(scan_text(txt, loc, "message", matcher))
+    for loc, txt in brief.call_to_action.items():
+        hits.extend(scan_text(txt, loc, "cta", matcher))
+    reporter.add_legal_hits([asdict(h) for h in hits])
+    return sorted({h.term for h in hits})
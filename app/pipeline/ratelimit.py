@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+from .adapters.base import BaseProvider, GenerateResult, ProviderError
+from .runscope import Budget, current_scope
+
+
+C = TypeVar("C")
+
+
+@dataclass(frozen=True)
+class LimitConfig:
+    requests_per_minute: float = 0.0  # 0 = no rate cap
+    burst: int = 5
+    max_concurrent: int = 0  # 0 = only the caller's concurrency applies
+    max_retries: int = 4
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 30.0
+    retry_budget: int = 50  # retries allowed per run, across all requests
+
+    @classmethod
+    def from_rules(cls, rules: Optional[Dict], provider_name: str) -> "LimitConfig":
+        """Read ``providers.default`` then ``providers.<name>`` from brand rules."""
+        section = (rules or {}).get("providers", {}) or {}
+        merged = {**(section.get("default") or {}), **(section.get(provider_name) or {})}
+        return config_from_mapping(cls, merged)
+
+
+def config_from_mapping(cls: Type[C], mapping: Dict[str, Any]) -> C:
+    # Numeric dataclass fields only; unknown keys (e.g. a nested ``breaker:``) are ignored
+    types = {f.name: f.type for f in fields(cls)}
+    kwargs: Dict[str, Any] = {}
+    for k, v in mapping.items():
+        if k in types:
+            kwargs[k] = int(v) if types[k] in ("int", int) else float(v)
+    return cls(**kwargs)
+
+
+class TokenBucket:
+    """Requests-per-minute bucket. ``reserve`` hands out a token and says how long to wait."""
+
+    def __init__(self, per_minute: float, burst: int) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going negative queues the caller behind everyone already waiting
+            self.tokens -= 1.0
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds: float) -> None:
+        # Server said Retry-After: hold back every caller, not just the one that got the 429
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class ProviderLimits:
+    """Process-wide limits for one provider: rate bucket + concurrent-request slots."""
+
+    def __init__(self, config: LimitConfig) -> None:
+        self.config = config
+        self.bucket = TokenBucket(config.requests_per_minute, config.burst)
+        self._slots = config.max_concurrent
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _try_slot(self) -> bool:
+        with self._cond:
+            if self._slots and self._in_use >= self._slots:
+                return False
+            self._in_use += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def acquire(self) -> float:
+        t0 = time.monotonic()
+        delay = self.bucket.reserve()
+        if delay:
+            time.sleep(delay)
+        with self._cond:
+            while self._slots and self._in_use >= self._slots:
+                self._cond.wait()
+            self._in_use += 1
+        return time.monotonic() - t0
+
+    async def aacquire(self) -> float:
+        t0 = time.monotonic()
+        delay = self.bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        # Slots are shared with sync callers, so poll instead of blocking the loop
+        while not self._try_slot():
+            await asyncio.sleep(0.01)
+        return time.monotonic() - t0
+
+
+_LIMITS: Dict[str, ProviderLimits] = {}
+_LIMITS_LOCK = threading.Lock()
+
+
+def provider_limits(name: str, config: LimitConfig) -> ProviderLimits:
+    # Shared by every wrapper of the same provider in this process; rebuilt if rules change
+    with _LIMITS_LOCK:
+        cur = _LIMITS.get(name)
+        if cur is None or cur.config != config:
+            cur = _LIMITS[name] = ProviderLimits(config)
+        return cur
+
+
+class RateLimitedProvider(BaseProvider):
+    """Token-bucket + concurrency limits with retry/backoff around another provider.
+
+    Retries only ``ProviderError.retryable`` failures, sleeps for Retry-After when the
+    server sends it (otherwise exponential backoff with full jitter), and stops early
+    once the run's retry budget is spent. Wait/backoff/retry counts ride along in the
+    result metadata so compose_variants can put them in the report.
+    """
+
+    def __init__(self, inner: BaseProvider, config: Optional[LimitConfig] = None) -> None:
+        self.inner = inner
+        self.config = config or LimitConfig()
+        self.name = inner.name
+        self.max_concurrency = inner.max_concurrency
+        self.limits = provider_limits(inner.name, self.config)
+
+    def health_check(self) -> bool:
+        return self.inner.health_check()
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def _budget(self) -> Budget:
+        return current_scope().get(f"retry:{self.name}", lambda: Budget(self.config.retry_budget))
+
+    def _next_delay(self, err: ProviderError, attempt: int) -> Optional[float]:
+        if not err.retryable or attempt >= self.config.max_retries or not self._budget().take():
+            return None
+        if err.retry_after is not None:
+            self.limits.bucket.penalize(err.retry_after)
+            return err.retry_after + random.uniform(0, 0.25)
+        cap = min(self.config.backoff_max_s, self.config.backoff_base_s * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def _annotate(res: GenerateResult, waited: float, backoff: float, retries: int) -> GenerateResult:
+        meta = {
+            **res.metadata,
+            "limiter_wait_ms": round(waited * 1000.0, 1),
+            "backoff_ms": round(backoff * 1000.0, 1),
+            "retries": retries,
+        }
+        return GenerateResult(image=res.image, metadata=meta)
+
+    def generate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        waited = backoff = 0.0
+        attempt = 0
+        while True:
+            waited += self.limits.acquire()
+            try:
+                res = self.inner.generate_image(
+                    prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+                )
+            except ProviderError as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    e.retries = attempt  # type: ignore[attr-defined]
+                    raise
+            else:
+                return self._annotate(res, waited, backoff, attempt)
+            finally:
+                self.limits.release()
+            attempt += 1
+            backoff += delay
+            time.sleep(delay)
+
+    async def agenerate_image(
+        self,
+        prompt: str,
+        size: Tuple[int, int],
+        seed: Optional[int] = None,
+        style_ref: Optional[bytes] = None,
+        negative_prompt: Optional[str] = None,
+    ) -> GenerateResult:
+        waited = backoff = 0.0
+        attempt = 0
+        while True:
+            waited += await self.limits.aacquire()
+            try:
+                res = await self.inner.agenerate_image(
+                    prompt=prompt, size=size, seed=seed, style_ref=style_ref, negative_prompt=negative_prompt
+                )
+            except ProviderError as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    e.retries = attempt  # type: ignore[attr-defined]
+                    raise
+            else:
+                return self._annotate(res, waited, backoff, attempt)
+            finally:
+                self.limits.release()
+            attempt += 1
+            backoff += delay
+            await asyncio.sleep(delay)
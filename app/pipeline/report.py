@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 import csv
+import json
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 
 from app.models import RunReport, VariantResult
 from .utils import write_json
 
 
+# Per-run output manifests live under <out>/_manifests/
+MANIFEST_DIR = "_manifests"
+
+
 @dataclass
 class RunContext:
     run_id: str
@@ -21,31 +26,62 @@ class RunReporter:
         self.variants: List[VariantResult] = []
         self.compliance: Dict[str, float] = {}
         self.legal_flags: List[str] = []
+        self.legal_hits: List[Dict[str, Any]] = []
+        self.shortfalls: List[Dict[str, str]] = []
         self.timings_ms: Dict[str, float] = {}
         # tiny nit: timings_ms is not fully populated yet — left for later
+        # Free-form counters grouped by subsystem, e.g. {"generation_cache": {"hit": 3, "miss": 1}}
+        self.stats: Dict[str, Dict[str, float]] = {}
 
     def add_variant(self, v: VariantResult) -> None:
         self.variants.append(v)
 
+    def bump(self, section: str, key: str, n: float = 1) -> None:
+        bucket = self.stats.setdefault(section, {})
+        bucket[key] = bucket.get(key, 0) + n
+
+    def add_shortfall(self, product: str, ratio: str, locale: str, reason: str) -> None:
+        self.shortfalls.append({"product": product, "ratio": ratio, "locale": locale, "reason": reason})
+
     def add_legal_flags(self, flags: List[str]) -> None:
-        self.legal_flags.extend(flags)
+        for f in flags:
+            if f not in self.legal_flags:
+                self.legal_flags.append(f)
+
+    def add_legal_hits(self, hits: List[Dict[str, Any]]) -> None:
+        # Brief-level and per-variant scans can report the same span; keep one copy
+        for h in hits:
+            if h not in self.legal_hits:
+                self.legal_hits.append(h)
+        self.add_legal_flags(sorted({h["term"] for h in hits}))
 
     def set_compliance(self, scores: Dict[str, float]) -> None:
         self.compliance = scores
 
-    def finalize(self, out_root: Path) -> None:
+    def _build(self) -> RunReport:
         totals = {
             "variants": len(self.variants),
+            "shortfalls": len(self.shortfalls),
         }
-        self._report = RunReport(
+        return RunReport(
             run_id=self.ctx.run_id,
             provider=self.ctx.provider,
             totals=totals,
             variants=self.variants,
             compliance=self.compliance,
             legal_flags=self.legal_flags,
+            legal_hits=self.legal_hits,
+            shortfalls=self.shortfalls,
+            stats=self.stats,
         )
 
+    def finalize(self, out_root: Optional[Path]) -> None:
+        """Build the report and write report.csv; with ``out_root``, also the run's
+        output manifest under it (None when the output tree is unknown)."""
+        self._report = self._build()
+        if out_root is not None:
+            self._write_output_manifest(Path(out_root))
+
         # CSV
         csv_path = Path("runs") / self.ctx.run_id / "report.csv"
         csv_path.parent.mkdir(parents=True, exist_ok=True)
@@ -57,17 +93,66 @@ class RunReporter:
                     "product_id",
                     "ratio",
                     "locale",
+                    "variant_index",
                     "seed",
                     "path_post",
                     "path_hero",
                     "provider",
+                    "master",
+                    "compliance_score",
+                    "reused",
                 ],
             )
             writer.writeheader()
             for v in self.variants:
                 writer.writerow(v.model_dump())
 
+    def _write_output_manifest(self, out_root: Path) -> None:
+        # <out>/_manifests/<run_id>.json: every file this run produced (or reused), with
+        # paths relative to <out>, so readers never have to walk the output tree
+        def rel(path: str | None) -> str | None:
+            if not path:
+                return None
+            try:
+                return Path(path).relative_to(out_root).as_posix()
+            except ValueError:
+                return path  # written outside out_root; keep as is
+
+        entries = [
+            {
+                "campaign_id": v.campaign_id,
+                "product_id": v.product_id,
+                "ratio": v.ratio,
+                "locale": v.locale,
+                "variant_index": v.variant_index,
+                "post": rel(v.path_post),
+                "hero": rel(v.path_hero),
+                "sidecar": rel(f"{v.path_post}.prov.json"),
+                "reused": v.reused,
+            }
+            for v in self.variants
+        ]
+        path = out_root / MANIFEST_DIR / f"{self.ctx.run_id}.json"
+        write_json(path.with_name(f".{path.name}.tmp"), {"run_id": self.ctx.run_id, "variants": entries})
+        path.with_name(f".{path.name}.tmp").replace(path)
+
+    @classmethod
+    def load(cls, run_dir: Path) -> "RunReporter":
+        """Rebuild a reporter from a saved report.json (for re-scoring old runs)."""
+        report = RunReport(**json.loads((run_dir / "report.json").read_text(encoding="utf-8")))
+        reporter = cls(RunContext(run_id=report.run_id, provider=report.provider))
+        reporter.variants = list(report.variants)
+        reporter.compliance = dict(report.compliance)
+        reporter.legal_flags = list(report.legal_flags)
+        reporter.legal_hits = list(report.legal_hits)
+        reporter.shortfalls = list(report.shortfalls)
+        reporter.stats = {k: dict(v) for k, v in report.stats.items()}
+        return reporter
+
     def save(self, run_dir: Path) -> None:
-        write_json(run_dir / "report.json", self._report.model_dump())
+        # An interrupted run never reached finalize; save what it has (the journal in
+        # run_dir is what --resume relies on)
+        report = getattr(self, "_report", None) or self._build()
+        write_json(run_dir / "report.json", report.model_dump())
 
 
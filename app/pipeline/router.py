@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .adapters.base import BaseProvider, GenerateRequest, GenerateResult, ProviderError
+from .breaker import CircuitOpenError, FailoverProvider
+from .runscope import current_scope
+
+
+DEFAULT_STATS_PATH = Path("runs") / "provider_stats.json"
+_WINDOW = 200  # calls per provider kept for percentiles / error rate
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    # Nearest-rank; good enough for a 200-sample window
+    idx = max(0, math.ceil(q * len(sorted_vals)) - 1)
+    return sorted_vals[idx]
+
+
+class ProviderStats:
+    """Rolling latency / error window for one provider."""
+
+    def __init__(self, latencies: Optional[List[float]] = None, outcomes: Optional[List[bool]] = None) -> None:
+        self.latencies: Deque[float] = deque(latencies or [], maxlen=_WINDOW)
+        self.outcomes: Deque[bool] = deque(outcomes or [], maxlen=_WINDOW)
+        self.in_flight = 0
+
+    def record(self, latency_s: float, ok: bool) -> None:
+        if ok:
+            self.latencies.append(latency_s)
+        self.outcomes.append(ok)
+
+    def p(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return _percentile(sorted(self.latencies), q)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95 = self.p(0.5), self.p(0.95)
+        return {
+            "calls": len(self.outcomes),
+            "p50_s": None if p50 is None else round(p50, 3),
+            "p95_s": None if p95 is None else round(p95, 3),
+            "error_rate": round(self.error_rate(), 4),
+        }
+
+
+class RoutingStats:
+    """Per-provider windows shared by every router in the process, persisted under runs/."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.providers: Dict[str, ProviderStats] = {}
+        self.lock = threading.Lock()
+        self._saved_at = time.monotonic()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        for name, d in (data.get("providers") or {}).items():
+            self.providers[name] = ProviderStats(d.get("latencies"), d.get("outcomes"))
+
+    def get(self, name: str) -> ProviderStats:
+        with self.lock:
+            return self.providers.setdefault(name, ProviderStats())
+
+    def save(self) -> None:
+        with self.lock:
+            payload = {
+                "providers": {
+                    name: {**st.summary(), "latencies": [round(x, 4) for x in st.latencies], "outcomes": list(st.outcomes)}
+                    for name, st in self.providers.items()
+                }
+            }
+            self._saved_at = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def maybe_save(self, every_s: float = 30.0) -> None:
+        if time.monotonic() - self._saved_at >= every_s:
+            self.save()
+
+
+_STATS: Dict[str, RoutingStats] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def routing_stats(path: Optional[Path] = None) -> RoutingStats:
+    path = Path(path or os.getenv("CAPE_ROUTER_STATS", str(DEFAULT_STATS_PATH)))
+    with _STATS_LOCK:
+        key = str(path.resolve())
+        if key not in _STATS:
+            _STATS[key] = RoutingStats(path)
+        return _STATS[key]
+
+
+@dataclass(frozen=True)
+class RoutingConfig:
+    target_p95_s: float = 60.0
+    allowed: Tuple[str, ...] = ()  # empty = every configured provider
+    cost_per_image: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_rules(cls, rules: Optional[Dict]) -> "RoutingConfig":
+        section = (rules or {}).get("routing", {}) or {}
+        return cls(
+            target_p95_s=float(section.get("target_p95_s", cls.target_p95_s)),
+            allowed=tuple(str(n).lower() for n in section.get("allowed") or ()),
+            cost_per_image={str(k).lower(): float(v) for k, v in (section.get("cost_per_image") or {}).items()},
+        )
+
+
+class RoutingProvider(FailoverProvider):
+    """Route each call to the remote provider most likely to answer within the target p95.
+
+    A provider's expected latency is its rolling p95, stretched by its error rate and by
+    how many calls it already has in flight relative to its concurrency. That makes a
+    big batch spill over to the next provider once the preferred one is saturated, and
+    a run deadline (``compose_variants(deadline_s=...)``) tightens the target as time
+    runs out. Among providers that fit, the cheapest wins. Providers with no history
+    are tried first so they get measured. Mock only ever serves as the last resort,
+    and whatever is picked still fails over down the rest of the list.
+    """
+
+    def __init__(
+        self,
+        chain: List[BaseProvider],
+        config: Optional[RoutingConfig] = None,
+        stats: Optional[RoutingStats] = None,
+    ) -> None:
+        super().__init__(chain)
+        self.name = "auto"
+        self.config = config or RoutingConfig()
+        self.stats = stats or routing_stats()
+        self.remote = [p for p in chain if p.name != "mock"]
+        self.fallback = [p for p in chain if p.name == "mock"]
+        # Let enough calls in flight that every remote provider can be kept busy
+        self.max_concurrency = max(1, sum(p.max_concurrency for p in self.remote) or chain[0].max_concurrency)
+
+    def close(self) -> None:
+        self.stats.save()
+        super().close()
+
+    def expected_latency(self, p: BaseProvider) -> float:
+        st = self.stats.get(p.name)
+        p95 = st.p(0.95)
+        if p95 is None:
+            return 0.0
+        waves = math.ceil((st.in_flight + 1) / max(1, p.max_concurrency))
+        return p95 * waves / max(0.05, 1.0 - st.error_rate())
+
+    def _budget_s(self) -> float:
+        deadline = current_scope().get("deadline", lambda: None)
+        if deadline is None:
+            return self.config.target_p95_s
+        return min(self.config.target_p95_s, max(0.0, deadline - time.monotonic()))
+
+    def _order(self) -> List[BaseProvider]:
+        budget = self._budget_s()
+        fits: List[Tuple[float, float, BaseProvider]] = []
+        slow: List[Tuple[float, float, BaseProvider]] = []
+        tripped: List[BaseProvider] = []
+        for p in self.remote:
+            if not p.health_check():
+                tripped.append(p)
+                continue
+            est = self.expected_latency(p)
+            cost = self.config.cost_per_image.get(p.name, 0.0)
+            (fits if est <= budget else slow).append((cost, est, p))
+        fits.sort(key=lambda t: (t[0], t[1]))
+        slow.sort(key=lambda t: t[1])
+        return [t[2] for t in fits] + [t[2] for t in slow] + tripped + self.fallback
+
+    def _start(self, p: BaseProvider) -> Tuple[ProviderStats, float]:
+        st = self.stats.get(p.name)
+        with self.stats.lock:
+            st.in_flight += 1
+        return st, time.monotonic()
+
+    def _finish(
+        self, st: ProviderStats, t0: float, res: Optional[GenerateResult], err: Optional[BaseException]
+    ) -> None:
+        with self.stats.lock:
+            st.in_flight -= 1
+            if res is None and not isinstance(err, ProviderError):
+                pass  # cancelled / crashed: nothing learned about the provider
+            elif isinstance(err, CircuitOpenError):
+                pass  # never reached the provider
+            elif res is not None and res.metadata.get("cache") == "hit":
+                pass  # says nothing about the provider's latency
+            elif res is not None:
+                meta = res.metadata
+                waited = (float(meta.get("limiter_wait_ms", 0.0)) + float(meta.get("backoff_ms", 0.0))) / 1000.0
+                st.record(max(0.0, time.monotonic() - t0 - waited), True)
+            else:
+                st.record(time.monotonic() - t0, False)
+        self.stats.maybe_save()
+
+    def _call(self, p: BaseProvider, req: GenerateRequest) -> GenerateResult:
+        if p.name == "mock":
+            return super()._call(p, req)
+        st, t0 = self._start(p)
+        try:
+            res = super()._call(p, req)
+        except BaseException as e:
+            self._finish(st, t0, None, e)
+            raise
+        self._finish(st, t0, res, None)
+        return res
+
+    async def _acall(self, p: BaseProvider, req: GenerateRequest) -> GenerateResult:
+        if p.name == "mock":
+            return await super()._acall(p, req)
+        st, t0 = self._start(p)
+        try:
+            res = await super()._acall(p, req)
+        except BaseException as e:
+            self._finish(st, t0, None, e)
+            raise
+        self._finish(st, t0, res, None)
+        return res
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class Budget:
+    """Thread-safe countdown, e.g. retries or hedged requests allowed in one run."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.used >= self.total:
+                return False
+            self.used += 1
+            return True
+
+
+class RunScope:
+    """Per-run state for provider wrappers that outlive a single run.
+
+    Providers are shared across briefs (orchestrator, UI), but budgets are per run.
+    compose_variants opens a scope; wrappers fetch their slot with ``get``. The scope
+    travels through asyncio tasks and ``asyncio.to_thread`` via contextvars.
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, factory: Callable[[], T]) -> T:
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = factory()
+            return self._items[key]  # type: ignore[return-value]
+
+    def set(self, key: str, value: object) -> None:
+        with self._lock:
+            self._items[key] = value
+
+
+_CURRENT: ContextVar[Optional[RunScope]] = ContextVar("cape_run_scope", default=None)
+# Calls made outside any run (ad-hoc provider use, tests) share one long-lived scope
+_FALLBACK = RunScope()
+
+
+def current_scope() -> RunScope:
+    return _CURRENT.get() or _FALLBACK
+
+
+@contextmanager
+def run_scope() -> Iterator[RunScope]:
+    scope = RunScope()
+    token = _CURRENT.set(scope)
+    try:
+        yield scope
+    finally:
+        _CURRENT.reset(token)
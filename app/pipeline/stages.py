@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Generic, Iterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class PipelineAborted(Exception):
+    """Raised in a stage that was waiting when another stage failed."""
+
+
+class ImageBudget:
+    """Caps how many decoded images the pipeline holds at once.
+
+    The fetch stage takes tokens before it asks for a hero and the writer hands them back
+    once every variant of that hero is on disk, so a slow stage stalls the ones upstream
+    of it instead of piling images up in memory. Tokens are only taken by one thread, in
+    plan order, and each hero's variants must be consecutive in that order: then every
+    token held belongs to the hero being written or to ones after it, so the hero the
+    writer waits for can always be fetched. (Spread-out variants can deadlock: a hero
+    keeps its tokens until its last variant is written.)
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.used = 0
+        self.peak = 0
+        self.waited_s = 0.0
+        self._aborted = False
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int) -> int:
+        n = max(1, min(n, self.limit))
+        t0 = time.monotonic()
+        with self._cond:
+            self._cond.wait_for(lambda: self._aborted or self.used + n <= self.limit)
+            if self._aborted:
+                raise PipelineAborted()
+            self.used += n
+            self.peak = max(self.peak, self.used)
+        self.waited_s += time.monotonic() - t0
+        return n
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+    def abort(self) -> None:
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+
+
+class OrderedSink(Generic[T]):
+    """Collects stage outputs that finish in any order and yields them in plan order."""
+
+    def __init__(self) -> None:
+        self._ready: Dict[int, T] = {}
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        self.waited_s = 0.0
+
+    def put(self, seq: int, item: T) -> None:
+        with self._cond:
+            self._ready[seq] = item
+            self._cond.notify_all()
+
+    def fail(self, exc: BaseException) -> None:
+        with self._cond:
+            if self._error is None:
+                self._error = exc
+            self._cond.notify_all()
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def drain(self, total: int) -> Iterator[T]:
+        for seq in range(total):
+            t0 = time.monotonic()
+            with self._cond:
+                self._cond.wait_for(lambda: self._error is not None or seq in self._ready)
+                if self._error is not None:
+                    raise self._error
+                item = self._ready.pop(seq)
+            self.waited_s += time.monotonic() - t0
+            yield item
+
+
+class WriterPool:
+    """Flushes finished variants to disk on a few background threads.
+
+    ``submit`` blocks once ``max_pending`` writes are queued, so encoded bytes cannot
+    pile up behind a slow disk. Writes sharing a key (an output folder) still run in
+    submission order, so the file left on a shared path is the last one submitted.
+    A task only waits for keys submitted before it, so a FIFO pool never deadlocks.
+    """
+
+    def __init__(self, threads: int, max_pending: int) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="write")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._last: Dict[Any, Future] = {}
+        self.waited_s = 0.0
+
+    def submit(self, key: Any, fn: Callable[[], None]) -> "Future[None]":
+        t0 = time.monotonic()
+        self._slots.acquire()
+        self.waited_s += time.monotonic() - t0
+        before = self._last.get(key)
+
+        def run() -> None:
+            try:
+                if before is not None:
+                    wait([before])  # its error, if any, is raised to whoever settles it
+                fn()
+            finally:
+                self._slots.release()
+
+        fut = self._pool.submit(run)
+        self._last[key] = fut
+        return fut
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+        self._last.clear()
+
+
+def inflight_limit(concurrency: int, workers: int) -> int:
+    """Default image budget: enough to keep the provider and every render worker busy
+    with one batch queued behind each; ``CAPE_MAX_INFLIGHT_IMAGES`` overrides it."""
+    try:
+        env = int(os.getenv("CAPE_MAX_INFLIGHT_IMAGES", "0"))
+    except ValueError:
+        env = 0
+    return env if env > 0 else 2 * max(1, concurrency) + 2 * max(1, workers)
+
+
+def stage_stats(budget: ImageBudget, sink: OrderedSink[Any], writer: Optional[WriterPool] = None) -> Dict[str, float]:
+    # fetch_wait_s: fetch stalled on the image budget (render/write is the bottleneck);
+    # write_wait_s: the writer sat idle (fetch/render is the bottleneck);
+    # flush_wait_s: the writer stalled on a full disk-write queue (the disk is)
+    stats = {
+        "image_budget": budget.limit,
+        "peak_images_in_flight": budget.peak,
+        "fetch_wait_s": round(budget.waited_s, 3),
+        "write_wait_s": round(sink.waited_s, 3),
+    }
+    if writer is not None:
+        stats["flush_wait_s"] = round(writer.waited_s, 3)
+    return stats
@@ -9,6 +9,16 @@ from app.pipeline.compositor import compose_variants, RATIO_TO_SIZE
 from app.pipeline.report import RunContext, RunReporter
 
 st.set_page_config(page_title="Creative Automation", layout="wide")
+
+
+@st.cache_resource
+def _provider(name: str):
+    # Kept across reruns so the pooled HTTP client is reused between generations
+    from app.pipeline.ingest import load_brand_rules
+
+    return select_provider(name, rules=load_brand_rules())
+
+
 st.markdown(
     "<style> .stMarkdown p { word-wrap: break-word; } .stCaption { white-space: normal; } </style>",
     unsafe_allow_html=True,
@@ -22,18 +32,20 @@ with st.sidebar:
         "Brief file",
         options=sorted([str(p) for p in Path("briefs").glob("*.json")]),
     )
-    provider_name = st.selectbox("Provider", options=["auto", "mock", "firefly", "openai"], index=0)
+    provider_name = st.selectbox("Provider", options=["auto", "mock", "firefly", "openai", "sim"], index=0)
     ratios = st.multiselect("Ratios", options=list(RATIO_TO_SIZE.keys()), default=list(RATIO_TO_SIZE.keys()))
     locales_input = st.text_input("Locales (comma)", value="en-US,es-MX")
     max_variants = st.number_input("Max variants", min_value=1, max_value=5, value=1)
     seed = st.number_input("Seed", min_value=0, value=1234)
+    workers = st.number_input("Workers", min_value=1, max_value=16, value=1, help="Render processes")
+    master_render = st.checkbox("Master render", value=False, help="Generate one hero per product and crop every ratio from it")
     run_btn = st.button("Run generation")
 
 status = st.empty()
 
 if run_btn and brief_file:
     brief, rules = load_brief_and_rules(Path(brief_file))
-    provider = select_provider(provider_name)
+    provider = _provider(provider_name)
     reporter = RunReporter(RunContext(run_id="ui", provider=provider.name))
     out_dir = Path("outputs")
 
@@ -48,6 +60,8 @@ if run_btn and brief_file:
         reporter,
         max_variants=max_variants,
         seed=int(seed),
+        workers=int(workers),
+        master_render=master_render,
     )
     reporter.finalize(out_dir)
     status.success(f"Generated {len(reporter.variants)} variants with provider {provider.name}")
@@ -0,0 +1,19 @@
+import pytest
+
+from app.pipeline.adapters.mock import MockProvider
+
+
+class CountingMock(MockProvider):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def generate_image(self, *args, **kwargs):
+        self.calls += 1
+        return super().generate_image(*args, **kwargs)
+
+
+@pytest.fixture
+def counting_mock():
+    """Factory for mock providers that count their generate_image calls."""
+    return CountingMock
@@ -0,0 +1,39 @@
+import threading
+import time
+
+import pytest
+
+from app.agents.watcher import InotifyWatcher, ScanWatcher
+
+
+def _make(kind, path):
+    if kind == "scan":
+        return ScanWatcher(path, debounce_s=0.15, interval_s=0.05)
+    try:
+        return InotifyWatcher(path, debounce_s=0.15)
+    except OSError:
+        pytest.skip("inotify unavailable")
+
+
+@pytest.mark.parametrize("kind", ["inotify", "scan"])
+def test_watcher_debounces_partial_write_and_picks_up_fast(tmp_path, kind):
+    (tmp_path / "old.json").write_text("{}")
+    with _make(kind, tmp_path) as watcher:
+
+        def slow_write():
+            with open(tmp_path / "new.json", "w") as f:
+                f.write('{"campaign_id": ')
+                f.flush()
+                time.sleep(0.08)
+                f.write('"c1"}')
+
+        t0 = time.monotonic()
+        threading.Thread(target=slow_write).start()
+        ready = watcher.wait(timeout=3)
+        elapsed = time.monotonic() - t0
+        assert [p.name for p in ready] == ["new.json"]
+        assert (tmp_path / "new.json").read_text() == '{"campaign_id": "c1"}'
+        assert elapsed < 1.0
+        # One settled write is handed out once; existing briefs are not re-reported
+        (tmp_path / ".new.json.tmp").write_text("x")
+        assert watcher.wait(timeout=0.4) == []
@@ -45,3 +45,79 @@ def test_logo_area_within_bounds(tmp_path):
     assert min_pct <= prov["logo_area_pct"] <= max_pct
 
 
+
+
+def test_vectorized_coverage_matches_scalar_mask():
+    import random
+    from colorsys import rgb_to_hsv
+
+    from PIL import Image
+
+    from app.pipeline.compliance import _pct_primary_coverage
+
+    rnd = random.Random(7)
+    img = Image.new("RGB", (60, 40))
+    img.putdata([(rnd.randint(0, 255), rnd.randint(0, 80), rnd.randint(0, 80)) for _ in range(60 * 40)])
+    tol = {"h": 10, "s": 35, "v": 35}
+    th, ts, tv = rgb_to_hsv(1.0, 58 / 255.0, 46 / 255.0)
+
+    def in_tol(r, g, b):
+        h, s, v = rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
+        dh = abs(h * 360 - th * 360)
+        return min(dh, 360 - dh) <= 10 and abs(s - ts) <= 0.35 and abs(v - tv) <= 0.35
+
+    expected = sum(in_tol(*px) for px in img.getdata()) / (60 * 40) * 100
+    assert abs(_pct_primary_coverage(img, "#FF3A2E", tol, full_res=True) - expected) < 1e-9
+    # Feathering only ever adds partial credit near the window edge
+    assert _pct_primary_coverage(img, "#FF3A2E", tol, full_res=True, feather=0.25) >= expected
+    # Brands that do not set brand.hsv_feather keep the hard mask
+    from app.pipeline.compliance import compliance_config
+
+    assert compliance_config({"brand": {"primary_hex": "#FF3A2E"}}).hsv_feather == 0.0
+
+
+def test_inline_scores_match_post_hoc_rescore(tmp_path):
+    from app.pipeline.compliance import score_compliance
+
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="t3", provider=provider.name))
+    compose_variants(brief, rules, provider, ["1:1", "16:9"], [brief.locales[0]], tmp_path, reporter, seed=1234)
+    inline = [v.compliance_score for v in reporter.variants]
+    assert all(s is not None for s in inline)
+    summary = score_compliance(brief, rules, reporter)
+    assert score_compliance(brief, rules, reporter, rescore=True) == summary
+    assert [v.compliance_score for v in reporter.variants] == inline
+
+
+def test_term_matcher_word_boundaries_casefold_and_offsets():
+    from app.pipeline.legal import TermMatcher
+
+    m = TermMatcher(["ass", "no risk", "straße"])
+    assert m.find("First class seating") == []
+    text = "NO RISK, all STRASSE fun"
+    hits = m.find(text)
+    assert [h[0] for h in hits] == ["no risk", "strasse"]
+    assert [text[s:e] for _, s, e in hits] == ["NO RISK", "STRASSE"]
+
+
+def test_term_matcher_matches_across_unicode_normal_forms():
+    import unicodedata
+
+    from app.pipeline.legal import TermMatcher
+
+    m = TermMatcher([unicodedata.normalize("NFD", "garantía")])  # decomposed in the list
+    for form in ("NFC", "NFD"):
+        text = unicodedata.normalize(form, "¡Garantía total! Sin garantías")
+        hits = m.find(text)
+        assert [h[0] for h in hits] == ["garantía"]
+        assert [text[s:e] for _, s, e in hits] == [unicodedata.normalize(form, "Garantía")]
+
+
+def test_scan_variant_reports_locale_and_field():
+    from app.pipeline.legal import scan_variant
+
+    reporter = RunReporter(RunContext(run_id="t", provider="mock"))
+    hits = scan_variant("A miracle drink", "Shop now", "en-US", reporter)
+    assert [(h.term, h.field, h.start) for h in hits] == [("miracle", "message", 2)]
+    assert reporter.legal_flags == ["miracle"]
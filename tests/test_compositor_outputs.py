@@ -31,3 +31,243 @@ def test_outputs_dimensions(tmp_path):
                 assert im.size == (w, h)
 
 
+
+
+def test_workers_match_serial_output(tmp_path):
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    runs = {}
+    for workers in (1, 2):
+        out = tmp_path / f"w{workers}"
+        reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+        compose_variants(
+            brief,
+            rules,
+            provider,
+            ["1:1", "16:9"],
+            brief.locales,
+            out,
+            reporter,
+            max_variants=2,
+            seed=1234,
+            workers=workers,
+        )
+        order = [(v.product_id, v.ratio, v.locale) for v in reporter.variants]
+        files = {p.relative_to(out): p.read_bytes() for p in sorted(out.rglob("*.png"))}
+        runs[workers] = (order, files)
+    assert runs[1] == runs[2]
+
+
+def test_master_render_calls_provider_once_per_product_locale(tmp_path):
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+    compose_variants(
+        brief,
+        rules,
+        provider,
+        ["1:1", "9:16", "16:9"],
+        brief.locales,
+        tmp_path,
+        reporter,
+        max_variants=1,
+        seed=1234,
+        master_render=True,
+    )
+    generated = [p for p in brief.products if not (p.base_asset and Path(p.base_asset).exists())]
+    assert reporter.stats["generation"]["provider_calls"] == len(generated) * len(brief.locales)
+    masters = {v.master for v in reporter.variants if v.product_id == generated[0].id}
+    assert len(masters) == len(brief.locales)
+
+
+def test_master_render_with_more_heroes_than_the_image_budget_finishes(tmp_path, monkeypatch):
+    import threading
+
+    monkeypatch.setenv("CAPE_MAX_INFLIGHT_IMAGES", "2")
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+    ratios = ["1:1", "9:16", "16:9"]
+    run = threading.Thread(
+        target=compose_variants,
+        args=(brief, rules, provider, ratios, brief.locales, tmp_path, reporter),
+        kwargs={"max_variants": 4, "seed": 1234, "master_render": True},
+        daemon=True,
+    )
+    run.start()
+    run.join(timeout=120)
+    assert not run.is_alive(), "pipeline deadlocked"
+    assert len(reporter.variants) == len(brief.products) * len(ratios) * len(brief.locales) * 4
+    # Per output folder the last variant written is still the serial loop's last one
+    last = {}
+    for v in reporter.variants:
+        last[(v.product_id, v.ratio)] = (v.locale, v.variant_index)
+    assert set(last.values()) == {(brief.locales[-1], 3)}
+
+
+def test_repeated_ratio_with_a_tiny_image_budget_finishes(tmp_path, monkeypatch):
+    import threading
+
+    monkeypatch.setenv("CAPE_MAX_INFLIGHT_IMAGES", "1")
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+    ratios = ["1:1", "1:1"]  # each hero feeds one variant per repeat
+    run = threading.Thread(
+        target=compose_variants,
+        args=(brief, rules, provider, ratios, ["en-US", "es-MX"], tmp_path, reporter),
+        kwargs={"max_variants": 4, "seed": 1234},
+        daemon=True,
+    )
+    run.start()
+    run.join(timeout=120)
+    assert not run.is_alive(), "pipeline deadlocked"
+    assert len(reporter.variants) == len(brief.products) * len(ratios) * 2 * 4
+
+
+def test_base_asset_decoded_once_per_process(tmp_path):
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    src = tmp_path / "photo.png"
+    Image.new("RGB", (640, 480), (200, 40, 40)).save(src)
+    brief = brief.model_copy(update={"products": [brief.products[0].model_copy(update={"base_asset": str(src)})]})
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+    compose_variants(
+        brief,
+        rules,
+        provider,
+        ["1:1", "16:9"],
+        brief.locales,
+        tmp_path / "out",
+        reporter,
+        max_variants=2,
+        seed=1234,
+    )
+    stats = reporter.stats["compositor_cache"]
+    assert stats["source_miss"] == 1
+    assert stats["cover_miss"] == 2
+    assert stats["cover_hit"] == 2 * len(brief.locales) * 2 - 2
+
+
+def test_image_budget_caps_decoded_images_in_flight(tmp_path, monkeypatch):
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    runs = {}
+    for budget in ("2", "0"):  # 0 = default budget
+        monkeypatch.setenv("CAPE_MAX_INFLIGHT_IMAGES", budget)
+        out = tmp_path / f"b{budget}"
+        reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+        compose_variants(brief, rules, provider, ["1:1", "9:16"], brief.locales, out, reporter, max_variants=2, seed=7)
+        order = [(v.product_id, v.ratio, v.locale) for v in reporter.variants]
+        files = {p.relative_to(out): p.read_bytes() for p in sorted(out.rglob("*.png"))}
+        runs[budget] = (order, files, reporter.stats["pipeline"])
+    assert runs["2"][2]["peak_images_in_flight"] <= 2 < runs["0"][2]["peak_images_in_flight"]
+    assert runs["2"][:2] == runs["0"][:2]  # backpressure changes timing, never output
+
+
+def test_sharded_layout_keeps_every_variant_and_lists_it(tmp_path):
+    import json
+
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="t-report", provider=provider.name))
+    compose_variants(
+        brief, rules, provider, ["1:1", "16:9"], brief.locales, tmp_path, reporter,
+        max_variants=2, seed=1234, layout="sharded",
+    )
+    reporter.finalize(tmp_path)
+    posts = {v.path_post for v in reporter.variants}
+    assert len(posts) == len(reporter.variants) == 16  # nothing overwritten
+    manifest = json.loads((tmp_path / "_manifests" / "t-report.json").read_text(encoding="utf-8"))
+    listed = {tmp_path / e["post"] for e in manifest["variants"]}
+    assert listed == {Path(p) for p in posts} and all(p.exists() for p in listed)
+    assert {(e["locale"], e["variant_index"]) for e in manifest["variants"]} == {
+        (loc, i) for loc in brief.locales for i in range(2)
+    }
+    # one shard level below the campaign folder
+    assert all(Path(p).relative_to(tmp_path / brief.campaign_id).parts[0] == Path(p).parent.name[-12:][:2] for p in posts)
+
+
+def test_encoders_per_channel_and_lossless_webp_matches_png(tmp_path):
+    import pytest
+    from app.pipeline.encoders import output_encoders, parse_encoder
+
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    provider = select_provider("mock")
+    posts = {}
+    for name, encode in (("png", None), ("webp", ["post=webp:lossless", "hero=jpeg:quality=80"])):
+        reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+        compose_variants(
+            brief, rules, provider, ["1:1"], ["en-US"], tmp_path / name, reporter,
+            seed=1234, encoders=output_encoders(rules, encode),
+        )
+        posts[name] = [Path(v.path_post) for v in reporter.variants]
+    stats = reporter.stats["encoding"]
+    assert stats["webp_files"] == stats["jpeg_files"] == 2 and stats["webp_bytes"] > 0
+    assert all(p.suffix == ".webp" and Path(f"{p}.prov.json").exists() for p in posts["webp"])
+    with Image.open(posts["webp"][0].with_name("hero.jpg")) as im:
+        assert im.format == "JPEG" and im.info.get("progressive")
+    for png, webp in zip(posts["png"], posts["webp"]):
+        with Image.open(png) as a, Image.open(webp) as b:
+            assert a.convert("RGB").tobytes() == b.convert("RGB").tobytes()
+    with pytest.raises(ValueError):
+        parse_encoder("webp:qualty=80")
+
+
+def test_overlay_masks_are_reused_and_match_direct_drawing(tmp_path):
+    from PIL import ImageDraw
+    from app.pipeline import compositor
+
+    _, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    spec = compositor._overlay_spec(rules, "center-card")
+    lines = ["Card headline", "Shop now"]
+    events = {}
+    for shade in (40, 200):
+        job = compositor._RenderJob(
+            product_id="p", ratio="1:1", locale="en-US", variant_index=0, size=(1080, 1080),
+            hero_src=Image.new("RGB", (1080, 1080), (shade, 90, 30)), lines=lines, spec=spec,
+        )
+        comp = compositor._composite_variant(job)
+        for k, n in comp.cache_events.items():
+            events[k] = events.get(k, 0) + n
+        # What the compositor used to draw straight onto every post
+        ref = job.hero_src.convert("RGBA")
+        font = compositor._load_font(spec.font_path, spec.font_size)
+        draw = ImageDraw.Draw(ref, "RGBA")
+        text_w, text_h, heights = compositor._text_metrics(tuple(lines), font)
+        card_w, card_h = min(1080 - 48, text_w + 72), text_h + 48
+        x, y = (1080 - card_w) // 2, (1080 - card_h) // 2
+        draw.rounded_rectangle((x, y, x + card_w, y + card_h), radius=16, fill=(0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            draw.text((x + 24, y + 24 + sum(heights[:i]) + 8 * i), line, fill=(255, 255, 255), font=font)
+        if spec.logo_path is None:
+            assert comp.post.tobytes() == ref.convert("RGB").tobytes()
+    assert events.get("overlay_hit", 0) >= 2  # second hero: text and card masks both reused
+
+
+def test_banner_contrast_uses_worst_case_background_and_lands_in_sidecar(tmp_path):
+    import json
+    from app.pipeline import compositor
+
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    spec = compositor._overlay_spec(rules, "banner")
+    # Half white, half black under the headline: the mean is a mid grey either colour
+    # would "pass" against, but one half of the text would be unreadable
+    split = Image.new("RGB", (1080, 1080), (255, 255, 255))
+    split.paste((0, 0, 0), (0, 0, 200, 1080))
+    for hero, backdrop, ratio in ((split, True, 21.0), (Image.new("RGB", (1080, 1080), (20, 20, 20)), False, None)):
+        job = compositor._RenderJob(
+            product_id="p", ratio="1:1", locale="en-US", variant_index=0, size=(1080, 1080),
+            hero_src=hero, lines=["Headline", "CTA"], spec=spec,
+        )
+        comp = compositor._composite_variant(job)
+        plan = compositor._overlay_plan(("Headline", "CTA"), spec.font_path, spec.font_size, (1080, 1080), "banner")
+        corner = comp.post.getpixel((plan.backdrop[2] - 1, plan.backdrop[1] + 1))
+        assert (corner == (0, 0, 0)) == backdrop
+        assert comp.contrast_ratio >= spec.min_contrast and (ratio is None or comp.contrast_ratio == ratio)
+
+    provider = select_provider("mock")
+    reporter = RunReporter(RunContext(run_id="test", provider=provider.name))
+    compose_variants(brief, rules, provider, ["1:1"], ["en-US"], tmp_path, reporter, seed=1234)
+    prov = json.loads(Path(f"{reporter.variants[0].path_post}.prov.json").read_text(encoding="utf-8"))
+    assert isinstance(prov["contrast_ok"], bool) and prov["contrast_ratio"] > 0
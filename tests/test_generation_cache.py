@@ -0,0 +1,41 @@
+from app.pipeline.adapters.mock import MockProvider
+from app.pipeline.cache import CachedProvider, GenerationCache
+
+
+def test_second_identical_generation_is_a_hit(tmp_path, counting_mock):
+    inner = counting_mock()
+    provider = CachedProvider(inner, GenerationCache(tmp_path))
+    a = provider.generate_image(prompt="p", size=(64, 64), seed=7)
+    b = provider.generate_image(prompt="p", size=(64, 64), seed=7)
+    c = provider.generate_image(prompt="p", size=(64, 64), seed=8)
+    assert inner.calls == 2
+    assert (a.metadata["cache"], b.metadata["cache"], c.metadata["cache"]) == ("miss", "hit", "miss")
+    assert a.image.tobytes() == b.image.tobytes()
+
+
+def test_eviction_keeps_cache_under_cap(tmp_path):
+    cache = GenerationCache(tmp_path, max_bytes=1)
+    provider = CachedProvider(MockProvider(), cache)
+    provider.generate_image(prompt="p", size=(64, 64), seed=1)
+    provider.generate_image(prompt="p", size=(64, 64), seed=2)
+    assert len(list(tmp_path.glob("*/*.png"))) == 0
+
+
+def test_hits_do_not_replay_the_first_calls_limiter_stats(tmp_path):
+    from app.pipeline.compositor import _record_generation
+    from app.pipeline.report import RunContext, RunReporter
+
+    class Throttled(MockProvider):
+        def generate_image(self, *args, **kwargs):
+            res = super().generate_image(*args, **kwargs)
+            res.metadata.update({"retries": 2, "limiter_wait_ms": 150.0, "backoff_ms": 800.0})
+            return res
+
+    provider = CachedProvider(Throttled(), GenerationCache(tmp_path))
+    reporter = RunReporter(RunContext(run_id="t", provider=provider.name))
+    for _ in range(3):
+        _record_generation(reporter, provider.generate_image(prompt="p", size=(64, 64), seed=7), provider, False)
+    assert reporter.stats["generation_cache"] == {"miss": 1, "hit": 2}
+    assert reporter.stats["provider_limits"] == {"retries": 2, "limiter_wait_ms": 150.0, "backoff_ms": 800.0}
+    stored = [p.read_text(encoding="utf-8") for p in tmp_path.glob("*/*.json")]
+    assert stored and not any("retries" in s for s in stored)
@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from app.pipeline.compositor import compose_variants
+from app.pipeline.incremental import BuildManifest
+from app.pipeline.ingest import load_brief_and_rules
+from app.pipeline.report import RunContext, RunReporter
+
+
+def _run(brief_path, out, provider_factory, incremental=True):
+    brief, rules = load_brief_and_rules(brief_path)
+    provider = provider_factory()
+    reporter = RunReporter(RunContext(run_id="t", provider=provider.name))
+    compose_variants(
+        brief, rules, provider, ["1:1", "9:16"], brief.locales, out, reporter, seed=5,
+        manifest=BuildManifest(out), incremental=incremental,
+    )
+    files = {p.relative_to(out): p.read_bytes() for p in sorted(out.rglob("*.png"))}
+    return provider.calls, files, reporter
+
+
+def test_incremental_rebuild_only_renders_changed_variants(tmp_path, counting_mock):
+    brief_path = tmp_path / "brief.json"
+    data = json.loads(Path("briefs/sample_brief.json").read_text(encoding="utf-8"))
+    brief_path.write_text(json.dumps(data), encoding="utf-8")
+    out = tmp_path / "out"
+    _run(brief_path, out, counting_mock, incremental=False)
+
+    calls, _, reporter = _run(brief_path, out, counting_mock)
+    assert calls == 0 and reporter.stats["incremental"]["reused"] == 8
+    assert all(v.reused for v in reporter.variants)
+
+    data["products"][1]["prompt_hints"] = "lime wedge, dark slate background"
+    brief_path.write_text(json.dumps(data), encoding="utf-8")
+    calls, files, reporter = _run(brief_path, out, counting_mock)
+    assert calls == 4 and reporter.stats["incremental"]["reused"] == 4
+    assert {v.product_id for v in reporter.variants if not v.reused} == {"cool-lime"}
+    _, clean, _ = _run(brief_path, tmp_path / "clean", counting_mock, incremental=False)
+    assert files == clean
@@ -0,0 +1,147 @@
+import json
+import time
+
+from app.agents.jobstore import DONE, FAILED, QUEUED, JobStore
+
+
+def test_same_content_is_one_job_and_edits_are_new_jobs(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    brief = tmp_path / "a.json"
+    brief.write_text('{"campaign_id": "a"}')
+    first = store.enqueue(brief)
+    assert first and store.enqueue(brief) is None
+    brief.write_text('{"campaign_id": "a", "v": 2}')
+    assert store.enqueue(brief) not in (None, first)
+    assert store.counts()[QUEUED] == 2
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(tmp_path):
+    store = JobStore(tmp_path / "jobs.db", lease_s=0.05, max_attempts=2)
+    brief = tmp_path / "a.json"
+    brief.write_text("{}")
+    store.enqueue(brief)
+    job = store.claim("host:1")
+    assert job and store.claim("host:2") is None  # leased
+    time.sleep(0.1)  # worker 1 "died"
+    again = store.claim("host:2")
+    assert again and again.id == job.id and again.attempts == 2
+    store.complete(job.id, "host:1", "a", 1)  # stale owner cannot complete it
+    assert store.counts()["running"] == 1
+    assert store.fail(again.id, "host:2", "boom") == FAILED
+
+
+def test_restart_resumes_only_outstanding_work(tmp_path, monkeypatch):
+    import app.agents.orchestrator as orch_mod
+    from app.agents.orchestrator import Orchestrator, OrchestratorConfig
+
+    ran = []
+
+    def fake_run(self, job):
+        ran.append(job.brief_name)
+        self.jobs.complete(job.id, self.owner, job.brief_name, 1)
+        return job.brief_name, {"variants": 1}
+
+    monkeypatch.setattr(orch_mod.Orchestrator, "_run_job", fake_run)
+    briefs = tmp_path / "briefs"
+    briefs.mkdir()
+    for name in ("a", "b"):
+        (briefs / f"{name}.json").write_text(json.dumps({"campaign_id": name}))
+    cfg = OrchestratorConfig(briefs_dir=briefs, runs_dir=tmp_path / "runs")
+
+    Orchestrator(cfg).run_once()
+    assert ran == ["a.json", "b.json"]
+    # A "deploy": new process state, one brief edited, one added
+    (briefs / "b.json").write_text(json.dumps({"campaign_id": "b", "rev": 2}))
+    (briefs / "c.json").write_text(json.dumps({"campaign_id": "c"}))
+    Orchestrator(cfg).run_once()
+    assert ran == ["a.json", "b.json", "b.json", "c.json"]
+    status = json.loads((tmp_path / "runs" / "status.json").read_text())
+    assert status["queue"][DONE] == 4 and status["queue"][QUEUED] == 0
+
+
+def test_claim_prefers_priority_and_caps_each_campaign(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    for name, campaign, prio in (("big1", "big", 0), ("big2", "big", 0), ("small", "small", 0), ("vip", "vip", 5)):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"campaign_id": campaign, "n": name}))
+        store.enqueue(tmp_path / f"{name}.json", campaign_id=campaign, priority=prio)
+    order = [store.claim("w", max_per_campaign=1) for _ in range(4)]
+    # big2 waits behind its own campaign's running job instead of blocking "small"
+    assert [j.brief_name if j else None for j in order] == ["vip.json", "big1.json", "small.json", None]
+
+
+def test_fair_share_serves_small_campaign_ahead_of_backlog():
+    import threading
+
+    from app.agents.scheduler import FairShare
+
+    share = FairShare(2)
+    share.acquire("big")
+    share.acquire("big")
+    served = []
+
+    def worker(tenant):
+        share.acquire(tenant)
+        served.append(tenant)
+
+    threads = [threading.Thread(target=worker, args=("big",)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while share.snapshot()["waiting"].get("big") != 3:
+        time.sleep(0.01)
+    small = threading.Thread(target=worker, args=("small",))
+    small.start()
+    while not share.snapshot()["waiting"].get("small"):
+        time.sleep(0.01)
+    share.release("big")  # first freed slot goes to the campaign with nothing in flight
+    small.join(timeout=2)
+    assert served == ["small"]
+    for tenant in ("small", "big", "big"):
+        share.release(tenant)
+    for t in threads:
+        t.join(timeout=2)
+    assert sorted(served) == ["big", "big", "big", "small"]
+
+
+def test_fair_share_waiter_that_gives_up_leaves_no_trace(monkeypatch):
+    import asyncio
+    import threading
+
+    from app.agents import scheduler
+    from app.agents.scheduler import FairShare
+
+    share = FairShare(1)
+    share.acquire("a")
+
+    class Interrupted(threading.Event):
+        grant_first = False
+
+        def wait(self, timeout=None):
+            if self.grant_first:
+                share.release("a")  # hands the slot to this waiter...
+                assert self.is_set()
+            raise KeyboardInterrupt  # ...which is interrupted before it returns
+
+    monkeypatch.setattr(scheduler.threading, "Event", Interrupted)
+    for grant_first in (False, True):
+        Interrupted.grant_first = grant_first
+        try:
+            share.acquire("b")
+        except KeyboardInterrupt:
+            pass
+        assert share.snapshot()["waiting"] == {}
+    monkeypatch.undo()
+    # Interrupted after the grant: the slot went back instead of to nobody
+    assert share.snapshot()["in_use"] == 0
+
+    async def cancelled_waiter():
+        share.acquire("a")
+        task = asyncio.ensure_future(share.aacquire("b"))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert share.snapshot()["waiting"] == {}
+        share.release("a")
+        await asyncio.wait_for(share.aacquire("c"), timeout=1)
+
+    asyncio.run(cancelled_waiter())
+    assert share.snapshot()["in_flight"] == {"c": 1}
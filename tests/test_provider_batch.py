@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+from app.pipeline.adapters.base import GenerateRequest
+from app.pipeline.adapters.mock import MockProvider
+
+
+class SlowProvider(MockProvider):
+    name = "slow"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def agenerate_image(self, prompt, size, seed=None, style_ref=None, negative_prompt=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        return self.generate_image(prompt, size, seed=seed)
+
+
+def test_generate_images_respects_concurrency_and_order():
+    provider = SlowProvider()
+    reqs = [GenerateRequest(prompt="p", size=(32, 32), seed=i) for i in range(8)]
+    t0 = time.perf_counter()
+    results = provider.generate_images(reqs, concurrency=4)
+    elapsed = time.perf_counter() - t0
+    assert provider.peak == 4
+    assert [r.metadata["seed"] for r in results] == list(range(8))
+    assert elapsed < 0.05 * 8
+
+
+def test_generate_images_inside_running_loop():
+    async def inner():
+        return MockProvider().generate_images([GenerateRequest(prompt="p", size=(16, 16), seed=1)])
+
+    assert asyncio.run(inner())[0].image.size == (16, 16)
+
+
+class _Remote(SlowProvider):
+    max_concurrency = 1
+
+    def __init__(self, name: str) -> None:
+        super().__init__()
+        self.name = name
+
+
+def test_router_spills_over_when_preferred_provider_is_busy(tmp_path):
+    from app.pipeline.router import RoutingConfig, RoutingProvider, RoutingStats
+
+    stats = RoutingStats(tmp_path / "provider_stats.json")
+    stats.get("firefly").latencies.extend([0.1] * 5)
+    stats.get("openai").latencies.extend([0.15] * 5)
+    fast, slower = _Remote("firefly"), _Remote("openai")
+    router = RoutingProvider([fast, slower, MockProvider()], RoutingConfig(target_p95_s=1.0), stats)
+    assert router.max_concurrency == 2
+
+    reqs = [GenerateRequest(prompt="p", size=(32, 32), seed=i) for i in range(6)]
+    with router:
+        used = [r.metadata["provider"] for r in router.generate_images(reqs)]
+    # firefly is preferred, but a second call in flight there would wait a whole p95
+    assert used.count("firefly") == 3 and used.count("openai") == 3
+    saved = RoutingStats(tmp_path / "provider_stats.json")
+    assert len(saved.get("firefly").latencies) == 5 + 3
+
+
+def test_router_prefers_cheapest_provider_within_target(tmp_path):
+    from app.pipeline.router import RoutingConfig, RoutingProvider, RoutingStats
+
+    stats = RoutingStats(tmp_path / "provider_stats.json")
+    stats.get("firefly").latencies.extend([0.1] * 5)
+    stats.get("openai").latencies.extend([0.3] * 5)
+    cfg = RoutingConfig(target_p95_s=1.0, cost_per_image={"firefly": 0.04, "openai": 0.02})
+    router = RoutingProvider([_Remote("firefly"), _Remote("openai"), MockProvider()], cfg, stats)
+    assert router.generate_image("p", (32, 32), seed=1).metadata["provider"] == "openai"
+    # Too slow for a tight target: the faster, pricier one wins
+    router.config = RoutingConfig(target_p95_s=0.2, cost_per_image=cfg.cost_per_image)
+    assert router.generate_image("p", (32, 32), seed=1).metadata["provider"] == "firefly"
+
+
+class _Straggler(MockProvider):
+    name = "straggler"
+
+    def __init__(self, delays) -> None:
+        super().__init__()
+        self.delays = list(delays)
+        self.cancelled = 0
+
+    async def agenerate_image(self, prompt, size, seed=None, style_ref=None, negative_prompt=None):
+        try:
+            await asyncio.sleep(self.delays.pop(0))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.generate_image(prompt, size, seed=seed)
+
+
+def test_hedged_request_beats_straggler_within_budget(tmp_path):
+    from app.pipeline.hedge import HedgeConfig, HedgedProvider
+    from app.pipeline.router import RoutingStats
+    from app.pipeline.runscope import run_scope
+
+    inner = _Straggler([1.0, 0.01, 0.2])
+    cfg = HedgeConfig(enabled=True, delay_s=0.05, budget=1)
+    provider = HedgedProvider(inner, cfg, stats=RoutingStats(tmp_path / "s.json"))
+    with run_scope():
+        t0 = time.perf_counter()
+        res = provider.generate_image("p", (32, 32), seed=7)
+        assert time.perf_counter() - t0 < 0.5
+        assert res.metadata["hedged"] and res.metadata["hedge_won"] and res.metadata["seed"] == 7
+        assert inner.cancelled == 1
+        # Budget spent: the next straggler is simply waited out
+        res = provider.generate_image("p", (32, 32), seed=8)
+        assert not res.metadata["hedged"]
+
+
+def test_cancelled_caller_cancels_the_primary_before_the_hedge_fires(tmp_path):
+    from app.pipeline.hedge import HedgeConfig, HedgedProvider
+    from app.pipeline.router import RoutingStats
+
+    inner = _Straggler([5.0])
+    provider = HedgedProvider(inner, HedgeConfig(enabled=True, delay_s=1.0), stats=RoutingStats(tmp_path / "s.json"))
+
+    async def caller():
+        task = asyncio.ensure_future(provider.agenerate_image("p", (32, 32), seed=1))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # Checked inside the loop: asyncio.run would cancel leftovers on its way out
+        assert inner.cancelled == 1
+        assert all(t.done() for t in asyncio.all_tasks() if t is not asyncio.current_task())
+
+    asyncio.run(caller())
@@ -0,0 +1,183 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from app.pipeline.adapters.base import GenerateRequest
+from app.pipeline.adapters.firefly import FireflyProvider
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 18), (10, 20, 30)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    bodies: list = []
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, ctype: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).bodies.append((self.headers.get("x-api-key"), data))
+        url = f"http://127.0.0.1:{self.server.server_port}/img.png"
+        self._send(json.dumps({"outputs": [{"seed": 1, "image": {"url": url}}]}).encode(), "application/json")
+
+    def do_GET(self):
+        self._send(_png(), "image/png")
+
+
+def test_firefly_reuses_pooled_connections():
+    _Stub.connections = 0
+    _Stub.bodies = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with FireflyProvider("k", base_url=f"http://127.0.0.1:{server.server_port}") as provider:
+            for seed in range(3):
+                assert provider.generate_image("p", (1920, 1080), seed=seed).image.size == (32, 18)
+            sync_conns = _Stub.connections
+            reqs = [GenerateRequest(prompt="p", size=(1024, 1024), seed=s) for s in range(4)]
+            provider.generate_images(reqs, concurrency=1)
+            provider.generate_images(reqs, concurrency=1)
+        assert sync_conns == 1
+        # One more keep-alive connection for the async client, reused across batches
+        assert _Stub.connections == 2
+        key, body = _Stub.bodies[0]
+        assert key == "k"
+        assert body["size"] == {"width": 2688, "height": 1536} and body["seeds"] == [0]
+    finally:
+        server.shutdown()
+
+
+class _Throttling(_Stub):
+    plan: list = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        status = type(self).plan.pop(0) if type(self).plan else 200
+        if status != 200:
+            body = b"slow down"
+            self.send_response(status)
+            self.send_header("Retry-After", "0.05")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        url = f"http://127.0.0.1:{self.server.server_port}/img.png"
+        self._send(json.dumps({"outputs": [{"image": {"url": url}}]}).encode(), "application/json")
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_rate_limited_provider_retries_throttling():
+    from app.pipeline.ratelimit import LimitConfig, RateLimitedProvider
+    from app.pipeline.runscope import run_scope
+
+    _Throttling.plan = [429, 503]
+    server = _serve(_Throttling)
+    try:
+        inner = FireflyProvider("k", base_url=f"http://127.0.0.1:{server.server_port}")
+        with RateLimitedProvider(inner, LimitConfig(max_retries=3)) as provider, run_scope():
+            res = provider.generate_images([GenerateRequest(prompt="p", size=(64, 64), seed=1)])[0]
+        assert res.metadata["retries"] == 2
+        assert res.metadata["backoff_ms"] >= 100
+    finally:
+        server.shutdown()
+
+
+def test_retry_budget_exhaustion_becomes_shortfall(tmp_path):
+    from pathlib import Path
+
+    from app.pipeline.compositor import compose_variants
+    from app.pipeline.ingest import load_brief_and_rules
+    from app.pipeline.ratelimit import LimitConfig, RateLimitedProvider
+    from app.pipeline.report import RunContext, RunReporter
+
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    _Throttling.plan = [429] * 10
+    server = _serve(_Throttling)
+    try:
+        inner = FireflyProvider("k", base_url=f"http://127.0.0.1:{server.server_port}")
+        provider = RateLimitedProvider(inner, LimitConfig(max_retries=5, retry_budget=2))
+        reporter = RunReporter(RunContext(run_id="t", provider=provider.name))
+        with provider:
+            compose_variants(brief, rules, provider, ["1:1"], ["en-US"], tmp_path, reporter, seed=1, concurrency=1)
+        # The first product spends the 2-retry budget; the second fails on its first 429.
+        # Neither takes the run down.
+        assert reporter.stats["generation"]["failed"] == 2
+        assert len(reporter.shortfalls) == 2 and reporter.variants == []
+        assert reporter.shortfalls[0]["reason"].startswith("generation failed")
+        assert reporter.stats["provider_limits"]["retries"] == 2
+    finally:
+        server.shutdown()
+
+
+def test_open_circuit_fails_over_to_mock_without_calling_provider(monkeypatch, tmp_path):
+    from app.pipeline.breaker import breaker_states
+    from app.pipeline.generator import select_provider
+
+    _Throttling.plan = [503] * 10
+    server = _serve(_Throttling)
+    monkeypatch.setenv("FIREFLY_API_KEY", "k")
+    monkeypatch.setenv("FIREFLY_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("CAPE_ROUTER_STATS", str(tmp_path / "provider_stats.json"))
+    rules = {"providers": {"default": {"max_retries": 0, "breaker": {"failure_threshold": 2, "cooldown_s": 60}}}}
+    try:
+        with select_provider("auto", use_cache=False, rules=rules) as provider:
+            results = [provider.generate_image("p", (64, 64), seed=s) for s in range(5)]
+        assert [r.metadata["provider"] for r in results] == ["mock"] * 5
+        assert all(r.metadata["failover_from"] == ["firefly"] for r in results)
+        # Two failures trip the breaker; the other three never reach the server
+        assert len(_Throttling.plan) == 8
+        assert breaker_states()["firefly"]["state"] == "open"
+    finally:
+        server.shutdown()
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_breaker():
+    import asyncio
+
+    from app.pipeline.adapters.mock import MockProvider
+    from app.pipeline.breaker import HALF_OPEN, BreakerConfig, CircuitBreakerProvider
+
+    class Slow(MockProvider):
+        name = "slow-probe"
+
+        async def agenerate_image(self, *args, **kwargs):
+            await asyncio.sleep(10)
+
+    provider = CircuitBreakerProvider(Slow(), BreakerConfig(failure_threshold=1, cooldown_s=0))
+    provider.breaker.record_failure("down")  # open; cooldown 0 lets the next call probe
+
+    async def cancel_probe() -> None:
+        probe = asyncio.create_task(provider.agenerate_image(prompt="p", size=(64, 64), seed=1))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+    asyncio.run(cancel_probe())
+    assert provider.breaker.state == HALF_OPEN
+    assert provider.breaker.allow()  # the slot came back
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pytest
+
+from app.pipeline.adapters.mock import MockProvider
+from app.pipeline.compositor import compose_variants
+from app.pipeline.ingest import load_brief_and_rules
+from app.pipeline.journal import RunJournal
+from app.pipeline.report import RunContext, RunReporter
+
+
+class CrashingMock(MockProvider):
+    def __init__(self, crash_at: int = 0) -> None:
+        super().__init__()
+        self.calls = 0
+        self.crash_at = crash_at
+
+    def generate_image(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == self.crash_at:
+            raise RuntimeError("host went away")
+        return super().generate_image(*args, **kwargs)
+
+
+def _run(out, provider, journal=None):
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    reporter = RunReporter(RunContext(run_id="t", provider=provider.name))
+    compose_variants(brief, rules, provider, ["1:1", "9:16"], brief.locales, out, reporter, seed=5, journal=journal)
+    files = {p.relative_to(out): p.read_bytes() for p in sorted(out.rglob("*.png"))}
+    return [v.model_dump() for v in reporter.variants], files, reporter
+
+
+def test_resume_renders_only_what_the_crashed_run_missed(tmp_path, monkeypatch):
+    clean_variants, clean_files, _ = _run(tmp_path / "clean", MockProvider())
+    monkeypatch.setenv("CAPE_MAX_INFLIGHT_IMAGES", "1")  # one hero at a time: the crash point is exact
+    out = tmp_path / "out"
+    with pytest.raises(RuntimeError):
+        _run(out, CrashingMock(crash_at=5), RunJournal(tmp_path / "run"))
+    monkeypatch.delenv("CAPE_MAX_INFLIGHT_IMAGES")
+    again = CrashingMock()
+    variants, files, reporter = _run(out, again, RunJournal(tmp_path / "run"))
+    assert reporter.stats["resume"]["reused"] == 4 and again.calls == 4
+    assert files == clean_files
+
+    def strip(vs):
+        return [{k: v for k, v in d.items() if k not in ("path_post", "path_hero")} for d in vs]
+
+    assert strip(variants) == strip(clean_variants)  # full report, same order
+
+
+def test_damaged_output_is_rendered_again(tmp_path):
+    out = tmp_path / "out"
+    _, files, _ = _run(out, MockProvider(), RunJournal(tmp_path / "run"))
+    victim = next(p for p in sorted(out.rglob("post.png")))
+    victim.write_bytes(b"not a png")
+    again = CrashingMock()
+    _, repaired, reporter = _run(out, again, RunJournal(tmp_path / "run"))
+    assert again.calls >= 1 and reporter.stats["resume"]["reused"] == 8 - again.calls
+    assert repaired == files
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+from app.pipeline.adapters.base import ProviderError
+from app.pipeline.adapters.sim import SimConfig, SimProvider
+
+
+def _outcomes(cfg):
+    provider = SimProvider(cfg)
+    out = []
+    for seed in range(4):
+        try:
+            res = provider.generate_image("p", (1080, 1920), seed=seed)
+            out.append((res.metadata["sim_latency_s"], res.image.size, res.image.tobytes()[:4096]))
+        except ProviderError as e:
+            out.append((e.status, e.retry_after))
+    return out
+
+
+def test_sim_is_deterministic_per_seed_and_injects_faults():
+    cfg = SimConfig(
+        latency="lognormal", latency_s=0.002, error_rate=0.3, throttle_rate=0.2, profile="openai", texture=True
+    )
+    first = _outcomes(cfg)
+    assert first == _outcomes(cfg)
+    assert any(o[0] == 429 for o in first) or any(o[0] == 503 for o in first)
+    ok = [o for o in first if len(o) == 3]
+    assert ok and all(o[1] == (1024, 1536) for o in ok)
+
+
+def test_sim_faults_flow_through_retries(tmp_path, monkeypatch):
+    from app.pipeline.compositor import compose_variants
+    from app.pipeline.generator import select_provider
+    from app.pipeline.ingest import load_brief_and_rules
+    from app.pipeline.report import RunContext, RunReporter
+
+    monkeypatch.setenv("CAPE_SIM_THROTTLE_RATE", "0.4")
+    monkeypatch.setenv("CAPE_SIM_RETRY_AFTER", "0.01")
+    brief, rules = load_brief_and_rules(Path("briefs/sample_brief.json"))
+    with select_provider("sim", rules=rules) as provider:
+        assert provider.name == "sim"
+        reporter = RunReporter(RunContext(run_id="t", provider=provider.name))
+        compose_variants(brief, rules, provider, ["1:1", "9:16"], ["en-US"], tmp_path, reporter, max_variants=2, seed=3)
+    assert reporter.stats["provider_limits"]["retries"] > 0
+    assert len(reporter.variants) + len(reporter.shortfalls) == len(brief.products) * 2 * 2
+
+
+def test_cached_sim_instance_replays_each_run(monkeypatch):
+    from app.pipeline.generator import _instance
+    from app.pipeline.runscope import run_scope
+
+    monkeypatch.setenv("CAPE_SIM_LATENCY", "lognormal")
+    monkeypatch.setenv("CAPE_SIM_LATENCY_S", "0.001")
+    monkeypatch.setenv("CAPE_SIM_ERROR_RATE", "0.3")
+    monkeypatch.setenv("CAPE_SIM_THROTTLE_RATE", "0.3")
+
+    def run():
+        provider = _instance("sim")
+        out = []
+        with run_scope():
+            for seed in (1, 1, 1, 2, 2, 3):  # repeats stand in for retries of one request
+                try:
+                    out.append(provider.generate_image("p", (256, 256), seed=seed).metadata["sim_latency_s"])
+                except ProviderError as e:
+                    out.append(e.status)
+        return provider, out
+
+    first_provider, first = run()
+    second_provider, second = run()
+    assert first_provider is second_provider
+    assert first == second
+    assert any(o in (429, 503) for o in first)
@@ -0,0 +1,51 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from app.agents.leases import LeaseDir
+from app.agents.worker import work_units
+
+_NODE = """
+import json, sys
+from app.agents.leases import LeaseDir
+root, units = sys.argv[1], int(sys.argv[2])
+leases = LeaseDir(root, lease_s=30)
+for i in range(units):
+    lease = leases.claim(f"u{i}")
+    if lease:
+        leases.complete(lease, {"n": i})
+        print(f"u{i}")
+"""
+
+
+def test_local_processes_split_units_without_overlap(tmp_path):
+    root = tmp_path / "leases"
+    nodes = [
+        subprocess.Popen([sys.executable, "-c", _NODE, str(root), "40"], stdout=subprocess.PIPE, text=True)
+        for _ in range(3)
+    ]
+    claimed = [u for p in nodes for u in p.communicate(timeout=60)[0].split()]
+    assert sorted(claimed) == sorted(f"u{i}" for i in range(40))  # each unit exactly once
+    assert all(LeaseDir(root).is_done(f"u{i}") for i in range(40))
+
+
+def test_expired_lease_is_reclaimed_and_old_holder_notices(tmp_path):
+    dead = LeaseDir(tmp_path, lease_s=0.2, owner="other-host:1")
+    lease = dead.claim("u")
+    live = LeaseDir(tmp_path, lease_s=0.2, owner="other-host:2")
+    assert live.claim("u") is None  # fresh lease
+    time.sleep(0.3)  # no heartbeat
+    taken = live.claim("u")
+    assert taken and taken.attempt == 2
+    assert not dead.heartbeat(lease) and lease.lost
+
+
+def test_shard_units_cover_products_and_ratios():
+    data = Path("briefs/sample_brief.json").read_bytes()
+    brief = json.loads(data)
+    units = work_units("sample_brief.json", data, shard=True)
+    assert len(units) == len(brief["products"]) * len(brief["aspect_ratios"])
+    assert len({u.id for u in units}) == len(units)
+    assert work_units("sample_brief.json", data)[0].id != work_units("sample_brief.json", data + b" ")[0].id